@@ -7,7 +7,13 @@ import supabase
 from supabase.client import Client, ClientOptions
 import uuid
 import vecs
-import psycopg2
+import sys
+
+# Embedding provider config and local embedder shared with the agent endpoint
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "studio-integration-version"))
+from memory_config import collection_for_dimension, embedder_config, embedding_dims
+from embeddings import install_embedder
+from db_pool import PoolSettings, use_sync_pool
 
 # Load environment variables
 load_dotenv()
@@ -41,28 +47,15 @@ def get_openai_client():
 @st.cache_resource
 def get_memory():
     try:
-        # Kết nối trực tiếp để tăng timeout
         conn_str = os.environ['DATABASE_URL']
-        
-        # Tăng statement_timeout cho toàn bộ phiên
-        try:
-            direct_conn = psycopg2.connect(conn_str)
-            with direct_conn.cursor() as cur:
-                # Tăng statement_timeout lên 5 phút
-                cur.execute("SET statement_timeout = 300000")  # 5 phút
-                direct_conn.commit()
-            
-            # Sửa đổi chuỗi kết nối để thêm options
-            if "?" in conn_str:
-                conn_str += "&options=--statement_timeout=300000"
-            else:
-                conn_str += "?options=--statement_timeout=300000"
-                
-            direct_conn.close()
-        except Exception as e:
-            st.warning(f"Không thể cấu hình timeout: {str(e)}")
+        # Pool kết nối dùng chung (db_pool.py): statement_timeout 5 phút được đặt cho mỗi kết nối của pool,
+        # không cần kết nối tạm hay sửa chuỗi kết nối
+        pool_settings = PoolSettings.from_env(statement_timeout_ms=300000, max_size=5)
         
         # Tạo config cho Memory - loại bỏ create_collection
+        # EMBEDDING_PROVIDER=local dùng model chạy trên CPU; model khác 1536 chiều dùng collection riêng
+        dims = embedding_dims()
+        collection_name = collection_for_dimension("memories_new", dims)
         config = {
             "llm": {
                 "provider": "openai",
@@ -70,12 +63,13 @@ def get_memory():
                     "model": MODEL_CHOICE
                 }
             },
+            "embedder": embedder_config(),
             "vector_store": {
                 "provider": "supabase",
                 "config": {
                     "connection_string": conn_str,
-                    "collection_name": "memories_new",
-                    "embedding_model_dims": 1536  # Số chiều của OpenAI text-embedding-ada-002
+                    "collection_name": collection_name,
+                    "embedding_model_dims": dims
                 }
             }    
         }
@@ -84,12 +78,13 @@ def get_memory():
         try:
             import vecs
             db = vecs.create_client(conn_str)
+            use_sync_pool(db, pool_settings)
             # Kiểm tra nếu collection đã tồn tại
             try:
                 # Sử dụng get_or_create_collection thay vì create_collection
                 db.get_or_create_collection(
-                    name="memories_new",
-                    dimension=1536
+                    name=collection_name,
+                    dimension=dims
                 )
                 st.success("Collection đã được tạo/truy cập thành công!")
             except Exception as e:
@@ -97,7 +92,9 @@ def get_memory():
         except Exception as e:
             st.warning(f"Không thể kết nối với vecs: {str(e)}")
         
-        return Memory.from_config(config)
+        memory = install_embedder(Memory.from_config(config), dims)
+        use_sync_pool(memory.vector_store.db, pool_settings)
+        return memory
     except Exception as e:
         st.error(f"Lỗi khởi tạo Memory: {str(e)}")
         # Trả về đối tượng giả
@@ -4,9 +4,13 @@ from dotenv import load_dotenv
 import supabase
 import pandas as pd
 import time
-import psycopg2
+import sys
 from psycopg2 import sql
 
+# Shared connection pool (db_pool.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "studio-integration-version"))
+from db_pool import PoolSettings, sync_pool
+
 # Load environment variables
 load_dotenv()
 
@@ -52,87 +56,96 @@ try:
 except Exception as e:
     st.error(f"Failed to connect to Supabase: {str(e)}")
 
+@st.cache_resource
+def get_pool():
+    # One small pool per Streamlit server, instead of a new connection on every rerun
+    return sync_pool(DB_URL, PoolSettings.from_env(max_size=2))
+
 # Direct PostgreSQL connection
 try:
     if DB_URL:
-        conn = psycopg2.connect(DB_URL)
+        conn = get_pool().engine.raw_connection()
         st.success("Direct PostgreSQL connection established!")
         
-        # Find all tables in all schemas
-        with conn.cursor() as cur:
-            # Query to get all tables from all schemas
-            cur.execute("""
-                SELECT table_schema, table_name 
-                FROM information_schema.tables 
-                WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
-                ORDER BY table_schema, table_name
-            """)
-            tables = cur.fetchall()
+        try:
+            # Find all tables in all schemas
+            with conn.cursor() as cur:
+                # Query to get all tables from all schemas
+                cur.execute("""
+                    SELECT table_schema, table_name 
+                    FROM information_schema.tables 
+                    WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+                    ORDER BY table_schema, table_name
+                """)
+                tables = cur.fetchall()
             
-            if tables:
-                st.subheader("All Tables in Database")
-                table_options = [f"{schema}.{table}" for schema, table in tables]
-                selected_table = st.selectbox("Select a table to view", table_options)
+                if tables:
+                    st.subheader("All Tables in Database")
+                    table_options = [f"{schema}.{table}" for schema, table in tables]
+                    selected_table = st.selectbox("Select a table to view", table_options)
                 
-                if selected_table:
-                    schema, table = selected_table.split('.')
+                    if selected_table:
+                        schema, table = selected_table.split('.')
                     
-                    # Get data from the selected table
-                    cur.execute(
-                        sql.SQL("SELECT * FROM {}.{} LIMIT 100").format(
-                            sql.Identifier(schema),
-                            sql.Identifier(table)
+                        # Get data from the selected table
+                        cur.execute(
+                            sql.SQL("SELECT * FROM {}.{} LIMIT 100").format(
+                                sql.Identifier(schema),
+                                sql.Identifier(table)
+                            )
                         )
-                    )
                     
-                    # Get column names
-                    columns = [desc[0] for desc in cur.description]
+                        # Get column names
+                        columns = [desc[0] for desc in cur.description]
                     
-                    # Fetch data
-                    data = cur.fetchall()
+                        # Fetch data
+                        data = cur.fetchall()
                     
-                    # Convert to DataFrame
-                    df = pd.DataFrame(data, columns=columns)
+                        # Convert to DataFrame
+                        df = pd.DataFrame(data, columns=columns)
                     
-                    # Display the data
-                    st.subheader(f"Contents of {selected_table}")
-                    st.write(f"Found {len(df)} records")
-                    st.dataframe(df, use_container_width=True)
+                        # Display the data
+                        st.subheader(f"Contents of {selected_table}")
+                        st.write(f"Found {len(df)} records")
+                        st.dataframe(df, use_container_width=True)
                     
-                    # Look for vecs collections
-                    if "metadata" in df.columns:
-                        st.subheader("Extracted Metadata")
+                        # Look for vecs collections
+                        if "metadata" in df.columns:
+                            st.subheader("Extracted Metadata")
                         
-                        # Process metadata
-                        formatted_data = []
-                        for _, row in df.iterrows():
-                            try:
-                                metadata = row.get("metadata")
-                                if metadata:
-                                    formatted_row = {"id": row.get("id", "")}
+                            # Process metadata
+                            formatted_data = []
+                            for _, row in df.iterrows():
+                                try:
+                                    metadata = row.get("metadata")
+                                    if metadata:
+                                        formatted_row = {"id": row.get("id", "")}
                                     
-                                    # Try to extract fields from metadata
-                                    if isinstance(metadata, dict):
-                                        formatted_row["user_id"] = metadata.get("user_id", "")
-                                        formatted_row["memory"] = metadata.get("memory", "")
+                                        # Try to extract fields from metadata
+                                        if isinstance(metadata, dict):
+                                            formatted_row["user_id"] = metadata.get("user_id", "")
+                                            formatted_row["memory"] = metadata.get("memory", "")
                                     
-                                    formatted_data.append(formatted_row)
-                            except Exception as e:
-                                st.error(f"Error processing row: {str(e)}")
+                                        formatted_data.append(formatted_row)
+                                except Exception as e:
+                                    st.error(f"Error processing row: {str(e)}")
                         
-                        if formatted_data:
-                            formatted_df = pd.DataFrame(formatted_data)
-                            st.dataframe(formatted_df, use_container_width=True)
+                            if formatted_data:
+                                formatted_df = pd.DataFrame(formatted_data)
+                                st.dataframe(formatted_df, use_container_width=True)
                     
-                    # Check for special vecs tables
-                    vecs_tables = [t for t in table_options if 'vecs' in t.lower()]
-                    if vecs_tables:
-                        st.subheader("Vector Collection Tables")
-                        st.write("These tables might be used by mem0:")
-                        for vt in vecs_tables:
-                            st.write(f"- {vt}")
-            else:
-                st.warning("No tables found in database")
+                        # Check for special vecs tables
+                        vecs_tables = [t for t in table_options if 'vecs' in t.lower()]
+                        if vecs_tables:
+                            st.subheader("Vector Collection Tables")
+                            st.write("These tables might be used by mem0:")
+                            for vt in vecs_tables:
+                                st.write(f"- {vt}")
+                else:
+                    st.warning("No tables found in database")
+        finally:
+            # Returns the connection to the pool
+            conn.close()
     else:
         st.error("DATABASE_URL environment variable is missing")
 except Exception as e:
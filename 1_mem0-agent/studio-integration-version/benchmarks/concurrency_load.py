@@ -0,0 +1,67 @@
+"""Concurrency load test for the mem0 agent endpoint.
+
+Fires batches of simultaneous requests at a running endpoint and compares the
+wall-clock time of each batch with the sum of its request latencies. If the
+event loop is blocked by synchronous I/O, requests serialize and the
+concurrency factor (sum of latencies / wall time) stays close to 1. With
+non-blocking I/O it approaches the number of in-flight requests.
+
+Usage:
+    python benchmarks/concurrency_load.py --url http://localhost:8001 --concurrency 1 8 32
+    python benchmarks/concurrency_load.py --path /api/history --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+async def timed_request(client: httpx.AsyncClient, args) -> float:
+    session_id = str(uuid.uuid4())
+    started = time.perf_counter()
+    if args.path == "/api/mem0-agent":
+        response = await client.post(args.path, json={
+            "query": args.query,
+            "user_id": f"load-{session_id[:8]}",
+            "session_id": session_id,
+            "request_id": str(uuid.uuid4())
+        })
+    else:
+        response = await client.get(args.path, params={"session_id": session_id})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def run_batch(client: httpx.AsyncClient, concurrency: int, args):
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(timed_request(client, args) for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return wall, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--path", default="/api/mem0-agent", choices=["/api/mem0-agent", "/api/history"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--query", default="What do you remember about me?")
+    parser.add_argument("--token", default=os.getenv("API_BEARER_TOKEN", "mem0-secret-token"))
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=120) as client:
+        print(f"{'in-flight':>9} {'wall (s)':>9} {'p50 (s)':>8} {'max (s)':>8} {'concurrency factor':>19}")
+        for concurrency in args.concurrency:
+            wall, latencies = await run_batch(client, concurrency, args)
+            factor = sum(latencies) / wall if wall else 0.0
+            print(f"{concurrency:>9} {wall:>9.2f} {statistics.median(latencies):>8.2f} "
+                  f"{max(latencies):>8.2f} {factor:>19.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,473 @@
+"""Retrieval benchmark for LOCOMO and the robot_pika search set, through the endpoint's memory stack.
+
+Each conversation is written to its own benchmark user with the same write
+path as the endpoint (MemoryStack.write: memory.add, plus consolidation if
+enabled), or with `--ingest raw` as one memory per turn (bulk_ingest raw
+mode, keeping LOCOMO dia_ids). Its questions are then answered by the same
+retrieval chain (MemoryStack.search), so every stage enabled in the
+environment (hybrid, MMR, rerank, ...) is measured.
+
+- Questions run concurrently, up to `--in-flight` searches at once
+- Finished conversations are checkpointed (`--checkpoint`), so an
+  interrupted run resumes with the next one; a conversation that was not
+  finished is re-ingested from scratch
+- The output JSON has the schema of results/retrieval_results_*.json plus
+  `latency_histograms` for each stage (add, llm, embed, vector_search,
+  search) and the run configuration
+
+Retrieved memories are mapped to gold ids from their `dia_id` metadata, or
+otherwise to the source turn (LOCOMO) or expected fact (robot_pika) they
+share the most words with.
+
+With `--offline`, the OpenAI embedder and LLM are replaced by deterministic
+stand-ins (benchmarks/fakes.py) and nothing leaves the machine; point
+DATABASE_URL at a local pgvector (docker compose --profile bench up -d pgvector).
+
+Usage:
+    python benchmarks/evaluate_retrieval.py locomo locomo10.json --offline --checkpoint locomo.ckpt
+    python benchmarks/evaluate_retrieval.py locomo locomo10.json --test          # first conversation, real OpenAI
+    python benchmarks/evaluate_retrieval.py xlsx ../../3_dataset/robot_pika/search/MECE_search_api_test_final.xlsx --offline
+"""
+import argparse
+import ast
+import asyncio
+import bisect
+import json
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from blocking_io import run_blocking
+from bulk_ingest import BulkIngestor, IngestItem, load_locomo
+
+LOCOMO_CATEGORIES = {1: "Single-hop", 2: "Temporal", 3: "Multi-hop", 4: "Open-domain"}
+RESULTS_DIR = Path(__file__).resolve().parents[3] / "3_dataset" / "utils" / "results"
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+
+@dataclass
+class Question:
+    question: str
+    category: Any
+    gold_ids: List[str]
+
+
+@dataclass
+class Conversation:
+    key: str
+    user_id: str
+    sessions: List[IngestItem]
+    questions: List[Question]
+    # Gold id -> source text, to map extracted memories back to ids
+    sources: Dict[str, str] = field(default_factory=dict)
+
+
+def words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def containment(memory: set, source: set) -> float:
+    return len(memory & source) / min(len(memory), len(source)) if memory and source else 0.0
+
+
+def load_locomo_conversations(path: str, user_prefix: str) -> List[Conversation]:
+    sessions: Dict[str, List[IngestItem]] = {}
+    for item in load_locomo(path, user_prefix):
+        sessions.setdefault(item.user_id, []).append(item)
+    with open(path, encoding="utf-8") as f:
+        samples = json.load(f)
+    conversations = []
+    for sample in samples:
+        user_id = f"{user_prefix}{sample['sample_id']}"
+        items = sessions.get(user_id, [])
+        sources = {
+            meta["dia_id"]: message["content"]
+            for item in items
+            for message, meta in zip(item.messages, item.message_metadata or [])
+            if meta.get("dia_id")
+        }
+        questions = [
+            Question(qa["question"], qa["category"], list(qa["evidence"]))
+            for qa in sample.get("qa", [])
+            if qa.get("category") in LOCOMO_CATEGORIES and qa.get("evidence")
+        ]
+        conversations.append(Conversation(sample["sample_id"], user_id, items, questions, sources))
+    return conversations
+
+
+def load_pika_search(path: str, user_prefix: str) -> List[Conversation]:
+    """robot_pika search cases: memories are seeded from init_message_for_memories, gold facts are those in expected_output."""
+    import pandas as pd
+
+    conversations = []
+    for _, row in pd.read_excel(path).iterrows():
+        if not isinstance(row.get("init_message_for_memories"), str) or not isinstance(row.get("query"), str):
+            continue
+        key = str(row["test_case_id"])
+        user_id = f"{user_prefix}{key}"
+        facts = [entry["fact"] for entry in ast.literal_eval(row["memories"])] if isinstance(row.get("memories"), str) else []
+        sources = {f"F{index + 1}": fact for index, fact in enumerate(facts)}
+        expected = words(str(row.get("expected_output", "")))
+        gold = [fact_id for fact_id, fact in sources.items() if containment(words(fact), expected) >= 0.6]
+        messages = json.loads(row["init_message_for_memories"])
+        item = IngestItem(
+            key=key,
+            user_id=user_id,
+            messages=[{"role": message["role"], "content": message["content"]} for message in messages],
+            metadata={"source": Path(path).stem}
+        )
+        questions = [Question(row["query"], str(row.get("query_intent", "")), gold)] if gold else []
+        conversations.append(Conversation(key, user_id, [item], questions, sources))
+    return conversations
+
+
+class LatencyRecorder:
+    """Thread-safe per-stage latency samples (seconds)."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def histograms(self) -> Dict[str, Dict[str, Any]]:
+        histograms = {}
+        for stage, values in sorted(self.samples.items()):
+            counts = [0] * (len(BUCKETS_MS) + 1)
+            for value in values:
+                counts[bisect.bisect_left(BUCKETS_MS, value * 1000)] += 1
+            histograms[stage] = {
+                **latency_stats(values),
+                "count": len(values),
+                "buckets": [
+                    {"le_ms": bound, "count": count}
+                    for bound, count in zip(BUCKETS_MS + ["+Inf"], counts)
+                ],
+            }
+        return histograms
+
+
+class Timed:
+    """Proxy recording the latency of the named methods of `target` under `stage`."""
+
+    def __init__(self, target: Any, stage: str, recorder: LatencyRecorder, methods: Iterable[str]):
+        self.target = target
+        self.stage = stage
+        self.recorder = recorder
+        self.methods = set(methods)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.target, name)
+        if name not in self.methods:
+            return attribute
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self.recorder.record(self.stage, time.perf_counter() - started)
+
+        return timed
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def latency_stats(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    return {
+        "mean": statistics.mean(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+    }
+
+
+class ResultCheckpoint:
+    """JSON lines of finished conversations and their results."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.done[entry["sample_id"]] = entry
+
+    def save(self, result: Dict[str, Any]):
+        with self._lock:
+            self.done[result["sample_id"]] = result
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+class RetrievalBenchmark:
+    """Ingests conversations and scores their questions through a MemoryStack."""
+
+    def __init__(self, stack: Any, args, recorder: LatencyRecorder, checkpoint: ResultCheckpoint):
+        self.stack = stack
+        self.args = args
+        self.recorder = recorder
+        self.checkpoint = checkpoint
+        self.searches = asyncio.Semaphore(args.in_flight)
+        self.ingests = asyncio.Semaphore(args.ingest_concurrency)
+
+    async def run(self, conversations: List[Conversation]) -> List[Dict[str, Any]]:
+        pending = [conversation for conversation in conversations if conversation.key not in self.checkpoint.done]
+        if len(pending) < len(conversations):
+            print(f"Resuming: {len(conversations) - len(pending)} conversations already done")
+        await asyncio.gather(*(self.run_conversation(conversation) for conversation in pending))
+        return [self.checkpoint.done[conversation.key] for conversation in conversations if conversation.key in self.checkpoint.done]
+
+    async def run_conversation(self, conversation: Conversation):
+        if not conversation.questions:
+            return
+        async with self.ingests:
+            if self.args.ingest != "none":
+                await self.ingest(conversation)
+        results = await asyncio.gather(*(self.ask(conversation, question) for question in conversation.questions))
+        summary = {
+            "sample_id": conversation.key,
+            "total_questions": len(results),
+            "avg_recall": statistics.mean(result["recall"] for result in results),
+            "results": results,
+        }
+        found = sum(result["found"] for result in results)
+        print(f"Conversation {conversation.key}: Recall@{self.args.k} {summary['avg_recall']:.2%}, found {found}/{len(results)}")
+        self.checkpoint.save(summary)
+
+    async def ingest(self, conversation: Conversation):
+        """Write a conversation from scratch to its benchmark user."""
+        memory = self.stack.memory
+        await run_blocking(memory.delete_all, user_id=conversation.user_id)
+        if self.args.ingest == "raw":
+            await BulkIngestor(memory, mode="raw", concurrency=1).run(conversation.sessions)
+            return
+        step = self.args.messages_per_add
+        consolidate = os.getenv("CONSOLIDATION_ENABLED", "false").lower() == "true"
+        for session in conversation.sessions:
+            for start in range(0, len(session.messages), step):
+                chunk = session.messages[start:start + step]
+                started = time.perf_counter()
+                await run_blocking(self.stack.write, chunk, conversation.user_id, consolidate)
+                self.recorder.record("add", time.perf_counter() - started)
+
+    async def ask(self, conversation: Conversation, question: Question) -> Dict[str, Any]:
+        async with self.searches:
+            latency, response = await run_blocking(self.timed_search, question.question, conversation.user_id)
+        retrieved = [self.gold_id(entry, conversation) for entry in response["results"]]
+        return {
+            "question": question.question,
+            "category": question.category,
+            "gold_ids": question.gold_ids,
+            "retrieved_ids": retrieved,
+            **score(question.gold_ids, retrieved, self.args.k),
+            "latency": latency,
+        }
+
+    def timed_search(self, query: str, user_id: str) -> Tuple[float, Dict[str, Any]]:
+        # Timed in the worker thread, so waiting for a free thread is not counted
+        started = time.perf_counter()
+        response = self.stack.search(query, user_id, self.args.search_limit)
+        latency = time.perf_counter() - started
+        self.recorder.record("search", latency)
+        return latency, response
+
+    @staticmethod
+    def gold_id(entry: Dict[str, Any], conversation: Conversation) -> str:
+        """The gold id a retrieved memory stands for: its dia_id, else the source it shares most words with."""
+        dia_id = (entry.get("metadata") or {}).get("dia_id")
+        if dia_id:
+            return dia_id
+        memory = words(entry.get("memory", ""))
+        best, best_score = "?", 0.0
+        for source_id, text in conversation.sources.items():
+            overlap = containment(memory, words(text))
+            if overlap > best_score:
+                best, best_score = source_id, overlap
+        return best
+
+
+def score(gold: List[str], retrieved: List[str], k: int) -> Dict[str, Any]:
+    hits = set(gold) & set(retrieved[:k])
+    rank = next((position for position, memory_id in enumerate(retrieved, 1) if memory_id in gold), None)
+    return {
+        "recall": len(hits) / len(gold),
+        "precision": len(hits) / k,
+        "mrr": 1 / rank if rank else 0.0,
+        "found": bool(hits),
+    }
+
+
+def category_breakdown(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    by_category: Dict[str, List[float]] = {}
+    for result in results:
+        by_category.setdefault(str(result["category"]), []).append(result["recall"])
+    return {
+        category: {
+            "category_name": LOCOMO_CATEGORIES.get(int(category), category) if category.isdigit() else category,
+            "questions": len(recalls),
+            "avg_recall": statistics.mean(recalls),
+        }
+        for category, recalls in sorted(by_category.items())
+    }
+
+
+def report(conversations: List[Dict[str, Any]], recorder: LatencyRecorder, config: Dict[str, Any]) -> Dict[str, Any]:
+    results = [result for conversation in conversations for result in conversation["results"]]
+    return {
+        "total_conversations": len(conversations),
+        "total_questions": len(results),
+        "retrieval_metrics": {
+            "recall_at_k": statistics.mean(result["recall"] for result in results) if results else 0.0,
+            "precision_at_k": statistics.mean(result["precision"] for result in results) if results else 0.0,
+            "mrr": statistics.mean(result["mrr"] for result in results) if results else 0.0,
+        },
+        "category_breakdown": category_breakdown(results),
+        "latency_stats": latency_stats([result["latency"] for result in results]),
+        "latency_histograms": recorder.histograms(),
+        "config": config,
+        "per_conversation_results": conversations,
+    }
+
+
+def print_report(data: Dict[str, Any], k: int):
+    metrics = data["retrieval_metrics"]
+    print("\n" + "=" * 80)
+    print(" 📊 FINAL RETRIEVAL RESULTS")
+    print("=" * 80)
+    print("\nOverall Metrics:")
+    print(f"   Recall@{k}:    {metrics['recall_at_k']:.2%}")
+    print(f"   Precision@{k}: {metrics['precision_at_k']:.2%}")
+    print(f"   MRR:               {metrics['mrr']:.3f}")
+    print(f"\nPer-Category Recall@{k}:")
+    for category in data["category_breakdown"].values():
+        print(f"   {category['category_name']:<15}: {category['avg_recall']:>6.2%} ({category['questions']} questions)")
+    print("\nLatency Statistics:")
+    for name, value in data["latency_stats"].items():
+        print(f"   {name.upper() + ':':<6} {value:.2f}s")
+    print("\nPer-stage latency (ms):")
+    for stage, histogram in data["latency_histograms"].items():
+        print(
+            f"   {stage:<14} n={histogram['count']:<6} mean={histogram['mean'] * 1000:8.1f} "
+            f"p50={histogram['p50'] * 1000:8.1f} p95={histogram['p95'] * 1000:8.1f} p99={histogram['p99'] * 1000:8.1f}"
+        )
+    print("\n" + "=" * 80)
+
+
+def base_memory(args) -> Any:
+    """Mem0 on the benchmark collection, with the offline stand-ins if requested."""
+    if args.offline:
+        # No OpenAI calls are made; the client only needs a key to be constructed
+        os.environ.setdefault("OPENAI_API_KEY", "offline")
+        os.environ["MEM0_TELEMETRY"] = "False"
+        os.environ["EMBEDDING_PROVIDER"] = "openai"
+        os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+    from mem0 import Memory
+    from memory_config import embedding_dims, mem0_config
+
+    base = Memory.from_config(mem0_config(args.collection))
+    if args.offline:
+        from fakes import install_fakes
+
+        install_fakes(base, embedding_dims())
+    return base
+
+
+def instrument(stack: Any, recorder: LatencyRecorder) -> Any:
+    """Time the LLM, embedder and vector store calls made inside Mem0 (outermost wrappers, as Mem0 sees them)."""
+    base = stack.memory.memory
+    base.llm = Timed(base.llm, "llm", recorder, ["generate_response"])
+    base.embedding_model = Timed(base.embedding_model, "embed", recorder, ["embed", "embed_batch"])
+    base.vector_store = Timed(base.vector_store, "vector_search", recorder, ["search"])
+    return stack
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", choices=["locomo", "xlsx"])
+    parser.add_argument("path")
+    parser.add_argument("--offline", action="store_true", help="fake embedder and LLM; needs a local pgvector in DATABASE_URL")
+    parser.add_argument("--collection", default="memories_bench")
+    parser.add_argument("--user-prefix", default="bench-")
+    parser.add_argument("--ingest", choices=["add", "raw", "none"], default="add",
+                        help="add: memory.add like the endpoint; raw: one memory per turn; none: reuse stored memories")
+    parser.add_argument("--messages-per-add", type=int, default=2, help="messages per memory.add call (a turn pair, as the endpoint)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--search-limit", type=int, default=100, help="memories retrieved per question (for MRR)")
+    parser.add_argument("--in-flight", type=int, default=8, help="concurrent searches")
+    parser.add_argument("--ingest-concurrency", type=int, default=2, help="conversations ingested in parallel")
+    parser.add_argument("--checkpoint", help="file of finished conversations, for resuming")
+    parser.add_argument("--conversations", type=int, help="only the first N conversations")
+    parser.add_argument("--test", action="store_true", help="first conversation only")
+    parser.add_argument("--output-dir", default=str(RESULTS_DIR))
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if args.source == "locomo":
+        conversations = load_locomo_conversations(args.path, args.user_prefix)
+    else:
+        conversations = load_pika_search(args.path, args.user_prefix)
+    limit = 1 if args.test else args.conversations
+    conversations = conversations[:limit] if limit else conversations
+    print(f"{len(conversations)} conversations, {sum(len(c.questions) for c in conversations)} questions")
+
+    from memory_stack import MemoryStack
+
+    recorder = LatencyRecorder()
+    stack = instrument(MemoryStack(base_memory(args)), recorder)
+    checkpoint = ResultCheckpoint(args.checkpoint)
+    started = time.perf_counter()
+    try:
+        finished = await RetrievalBenchmark(stack, args, recorder, checkpoint).run(conversations)
+    finally:
+        stack.shutdown()
+
+    config = {
+        "source": args.source,
+        "path": args.path,
+        "offline": args.offline,
+        "ingest": args.ingest,
+        "k": args.k,
+        "search_limit": args.search_limit,
+        "in_flight": args.in_flight,
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+        "stages": {
+            name: os.getenv(name, "false")
+            for name in ("HYBRID_SEARCH_ENABLED", "DIVERSIFY_ENABLED", "RERANK_ENABLED", "MEMORY_TIERING_ENABLED", "CONSOLIDATION_ENABLED")
+        },
+    }
+    data = report(finished, recorder, config)
+    print_report(data, args.k)
+    os.makedirs(args.output_dir, exist_ok=True)
+    output = os.path.join(args.output_dir, f"retrieval_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
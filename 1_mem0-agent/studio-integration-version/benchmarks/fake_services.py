@@ -0,0 +1,246 @@
+"""Local HTTP stand-ins for the services the endpoint calls, for load tests.
+
+One FastAPI app serving:
+- /v1/chat/completions: OpenAI-compatible chat, streaming included. Mem0's
+  JSON prompts (fact extraction, memory update) are answered by
+  fakes.FakeLLM; agent turns get a short deterministic reply built from the
+  user's message and the memories in the prompt
+- /v1/embeddings: OpenAI-compatible embeddings from fakes.HashEmbedder
+  (float or base64, any `dimensions`)
+- /rest/v1/...: the Supabase REST gateway, proxied to a PostgREST on a local
+  Postgres (docker compose --profile bench up -d pgvector postgrest)
+
+Chat and embedding calls get injected latency and errors (HTTP 500, which
+the OpenAI client retries) from their own fakes.FaultInjector, so runs with
+the same seed see the same faults in the same order.
+
+Usage:
+    python benchmarks/fake_services.py --port 18080 --llm-latency 0.3 --llm-jitter 0.5 --llm-error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:18080/v1 SUPABASE_URL=http://127.0.0.1:18080 ...
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import uuid
+from array import array
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fakes import FakeLLM, FaultInjector, HashEmbedder, words
+
+# Must match PGRST_JWT_SECRET of the postgrest service in docker-compose.yml
+DEFAULT_JWT_SECRET = "local-load-test-secret-0123456789abcdef"
+POSTGREST_URL = "http://localhost:3000"
+JWT_HEADER = {"alg": "HS256", "typ": "JWT"}
+# Request headers not forwarded to PostgREST (httpx sets its own)
+HOP_HEADERS = {"host", "content-length", "connection", "accept-encoding"}
+
+
+def service_key(secret: str = DEFAULT_JWT_SECRET, role: str = "postgres") -> str:
+    """An HS256 JWT accepted by the local PostgREST, used as SUPABASE_SERVICE_KEY."""
+    def encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    signing_input = f"{encode(json.dumps(JWT_HEADER).encode())}.{encode(json.dumps({'role': role}).encode())}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{encode(signature)}"
+
+
+def text_of(message: Dict[str, Any]) -> str:
+    """Text of a chat message whose content is a string or a list of parts."""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def agent_reply(messages: List[Dict[str, Any]], length: int) -> str:
+    """A deterministic reply acknowledging the last user message and the number of memories the agent was given."""
+    last = next((text_of(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    memories = sum(
+        1 for m in messages if m.get("role") == "system"
+        for line in text_of(m).splitlines() if line.startswith("- ")
+    )
+    echo = " ".join(words(last)[:12])
+    filler = " ".join(["noted"] * max(0, length - 16))
+    return f"You said: {echo}. I have {memories} memories about you. {filler}".strip()
+
+
+def completion(body: Dict[str, Any], content: str) -> Dict[str, Any]:
+    prompt_tokens = sum(len(words(text_of(m))) for m in body.get("messages", []))
+    completion_tokens = len(words(content))
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+            "logprobs": None,
+        }],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def chunk(body: Dict[str, Any], chat_id: str, delta: Optional[Dict[str, Any]], finish_reason: Optional[str] = None,
+          usage: Optional[Dict[str, int]] = None) -> str:
+    """One server-sent event of a streamed completion; the usage chunk has no choices."""
+    data = {
+        "id": chat_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}],
+    }
+    if usage is not None:
+        data["usage"] = usage
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def error_response(what: str) -> JSONResponse:
+    return JSONResponse({"error": {"message": f"Injected {what} failure", "type": "server_error", "code": None}}, status_code=500)
+
+
+def create_app(
+    llm_faults: FaultInjector,
+    embedding_faults: FaultInjector,
+    postgrest_url: str = POSTGREST_URL,
+    reply_words: int = 40,
+    token_interval: float = 0.005,
+) -> FastAPI:
+    proxy = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=200, max_keepalive_connections=200))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await proxy.aclose()
+
+    app = FastAPI(lifespan=lifespan)
+    fake_llm = FakeLLM()
+    embedders: Dict[int, HashEmbedder] = {}
+    app.state.stats = {"chat": 0, "chat_errors": 0, "embeddings": 0, "embedding_errors": 0, "rest": 0}
+
+    async def inject(faults: FaultInjector) -> bool:
+        delay, fail = faults.draw()
+        if delay:
+            await asyncio.sleep(delay)
+        return fail
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.stats["chat"] += 1
+        if await inject(llm_faults):
+            app.state.stats["chat_errors"] += 1
+            return error_response("LLM")
+        messages = body.get("messages", [])
+        if body.get("response_format"):
+            # Mem0's fact extraction and memory update prompts ask for JSON
+            content = fake_llm.generate_response([{"role": m["role"], "content": text_of(m)} for m in messages])
+        else:
+            content = agent_reply(messages, reply_words)
+        if not body.get("stream"):
+            return completion(body, content)
+
+        async def stream():
+            chat_id = f"chatcmpl-{uuid.uuid4().hex}"
+            yield chunk(body, chat_id, {"role": "assistant", "content": ""})
+            for index, piece in enumerate(content.split(" ")):
+                if token_interval:
+                    await asyncio.sleep(token_interval)
+                yield chunk(body, chat_id, {"content": piece if index == 0 else " " + piece})
+            yield chunk(body, chat_id, {}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(body, chat_id, None, usage=completion(body, content)["usage"])
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.stats["embeddings"] += 1
+        if await inject(embedding_faults):
+            app.state.stats["embedding_errors"] += 1
+            return error_response("embedding")
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dims = int(body.get("dimensions") or 1536)
+        embedder = embedders.setdefault(dims, HashEmbedder(dims))
+        data = []
+        for index, text in enumerate(texts):
+            vector = embedder.vector(text if isinstance(text, str) else " ".join(map(str, text)))
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(words(text)) for text in texts if isinstance(text, str))
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.api_route("/rest/v1/{path:path}", methods=["GET", "POST", "PATCH", "PUT", "DELETE"])
+    async def rest(path: str, request: Request):
+        app.state.stats["rest"] += 1
+        url = f"{postgrest_url}/{path}" + (f"?{request.url.query}" if request.url.query else "")
+        upstream = await proxy.request(
+            request.method,
+            url,
+            content=await request.body(),
+            headers={key: value for key, value in request.headers.items() if key.lower() not in HOP_HEADERS},
+        )
+        headers = {key: value for key, value in upstream.headers.items()
+                   if key.lower() in {"content-type", "content-range", "preference-applied", "location"}}
+        return Response(upstream.content, status_code=upstream.status_code, headers=headers)
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--postgrest-url", default=POSTGREST_URL)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds before an LLM reply (or its first token)")
+    parser.add_argument("--llm-jitter", type=float, default=0.3)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    parser.add_argument("--embedding-jitter", type=float, default=0.03)
+    parser.add_argument("--embedding-error-rate", type=float, default=0.0)
+    parser.add_argument("--reply-words", type=int, default=40)
+    parser.add_argument("--token-interval", type=float, default=0.005, help="seconds between streamed tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app(
+        FaultInjector(args.llm_latency, args.llm_jitter, args.llm_error_rate, seed=args.seed),
+        FaultInjector(args.embedding_latency, args.embedding_jitter, args.embedding_error_rate, seed=args.seed + 1),
+        postgrest_url=args.postgrest_url,
+        reply_words=args.reply_words,
+        token_interval=args.token_interval,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Deterministic offline stand-ins for the OpenAI embedder and LLM used by Mem0.
+
+- HashEmbedder: signed feature hashing of word tokens, so texts sharing
+  words get similar vectors; the same text always gets the same vector
+- FakeLLM: answers Mem0's two prompts without a model. Fact extraction
+  returns each user line as a fact; the memory update step adds every new
+  fact that is not already stored word for word
+
+Both can inject latency and errors, to exercise timeouts and retries. Nothing
+here touches the network, so benchmarks built on them measure the memory
+stack itself (Postgres, indexes, retrieval stages) and are repeatable.
+"""
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class FaultInjector:
+    """Sleeps `latency` seconds (plus up to `jitter`) per call and fails a share `error_rate` of calls."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, bool]:
+        """Delay and failure decision for one call (for callers that wait asynchronously)."""
+        with self._lock:
+            return self.latency + self._random.random() * self.jitter, self._random.random() < self.error_rate
+
+    def __call__(self, what: str):
+        delay, fail = self.draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"Injected {what} failure")
+
+
+def words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class HashEmbedder:
+    """Mem0 embedder interface over deterministic hashed bag-of-words vectors (unit length)."""
+
+    def __init__(self, dims: int = 1536, faults: Optional[FaultInjector] = None):
+        self.dims = dims
+        self.faults = faults
+
+    def vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dims
+        for token in words(text) or [""]:
+            digest = int.from_bytes(hashlib.md5(token.encode("utf-8")).digest()[:8], "little")
+            vector[digest % self.dims] += 1.0 if (digest >> 63) & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        if self.faults:
+            self.faults("embedding")
+        return self.vector(text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.faults:
+            self.faults("embedding")
+        return [self.vector(text) for text in texts]
+
+
+def code_blocks(prompt: str) -> List[Any]:
+    """Python or JSON literals found between triple backticks."""
+    values = []
+    for block in re.findall(r"```(.*?)```", prompt, re.S):
+        block = block.strip()
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                values.append(parse(block))
+                break
+            except (ValueError, SyntaxError):
+                continue
+    return values
+
+
+class FakeLLM:
+    """Mem0 LLM interface answering the fact-extraction and memory-update prompts deterministically."""
+
+    def __init__(self, faults: Optional[FaultInjector] = None):
+        self.faults = faults
+        self.calls = 0
+
+    def generate_response(self, messages: List[Dict[str, str]], response_format=None, tools=None, tool_choice="auto") -> str:
+        self.calls += 1
+        if self.faults:
+            self.faults("LLM")
+        if messages and messages[0]["role"] == "system":
+            return json.dumps({"facts": self.extract_facts(messages[-1]["content"])}, ensure_ascii=False)
+        return json.dumps({"memory": self.update_memory(messages[-1]["content"])}, ensure_ascii=False)
+
+    @staticmethod
+    def extract_facts(prompt: str) -> List[str]:
+        """Every user line of the parsed conversation ("user: ...") is a fact."""
+        return [
+            line.split(":", 1)[1].strip()
+            for line in prompt.splitlines()
+            if line.startswith("user:") and line.split(":", 1)[1].strip()
+        ]
+
+    @staticmethod
+    def update_memory(prompt: str) -> List[Dict[str, str]]:
+        """ADD each new fact unless an existing memory has the same words; keep existing memories."""
+        old: List[Dict[str, Any]] = []
+        new: List[str] = []
+        for value in code_blocks(prompt.split("You must return your response")[0]):
+            if isinstance(value, list) and all(isinstance(item, dict) and "text" in item for item in value):
+                old = value
+            elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+                new = value
+        known = {tuple(words(item["text"])) for item in old}
+        actions = [{"id": str(item["id"]), "text": item["text"], "event": "NONE"} for item in old]
+        for index, fact in enumerate(new):
+            if tuple(words(fact)) not in known:
+                known.add(tuple(words(fact)))
+                actions.append({"id": str(len(old) + index), "text": fact, "event": "ADD"})
+        return actions
+
+
+def install_fakes(memory: Any, dims: int, faults: Optional[FaultInjector] = None) -> Any:
+    """Replace a Mem0 instance's embedder and LLM with the offline stand-ins."""
+    memory.embedding_model = HashEmbedder(dims, faults)
+    memory.llm = FakeLLM(faults)
+    return memory
@@ -0,0 +1,170 @@
+"""Offline micro-benchmarks of the pure building blocks, no services needed.
+
+- dedup:     consolidation.duplicate_groups (blockwise float32) against the
+             dense float64 similarity matrix it replaced
+- quantized: in-process int8 / binary first pass + float32 re-scoring
+             (QuantizedMatrix) against an exact float32 scan
+- mmr:       diversify.mmr over a candidate list
+- writer:    MessageWriter group commit against one insert per message,
+             with a simulated insert round trip
+- telemetry: cost of Histogram.record and of one traced span
+
+Vectors are clustered random unit vectors, as in ann_recall_latency.py.
+
+Usage:
+    python benchmarks/offline_micro.py
+    python benchmarks/offline_micro.py --only quantized --vectors 100000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from consolidation import duplicate_groups
+from diversify import mmr
+from message_writer import MessageWriter
+from quantization import QuantizedMatrix
+from telemetry import Histogram, Tracer
+
+
+def make_vectors(count: int, dimension: int, clusters: int, seed: int, noise: float = 0.5) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dimension))
+    vectors = centroids[rng.integers(0, clusters, count)] + noise * rng.normal(size=(count, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """Median wall time of `fn()` in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def bench_dedup(args):
+    vectors = make_vectors(args.memories, args.dimension, args.memories // 4, args.seed, noise=0.15)
+    dense = vectors.astype(np.float64)
+
+    def dense_groups():
+        # The previous implementation: full N x N float64 matrix
+        return np.nonzero(np.triu(dense @ dense.T >= args.threshold, 1))
+
+    blockwise_ms = timed(lambda: duplicate_groups(vectors, args.threshold), repeat=3)
+    dense_ms = timed(dense_groups, repeat=3)
+    print(f"dedup {args.memories} x {args.dimension}: blockwise float32 {blockwise_ms:.0f}ms "
+          f"(peak matrix {256 * args.memories * 4 / 2**20:.1f} MiB), "
+          f"dense float64 {dense_ms:.0f}ms (matrix {args.memories ** 2 * 8 / 2**20:.0f} MiB), "
+          f"{len(duplicate_groups(vectors, args.threshold))} groups")
+
+
+def bench_quantized(args):
+    vectors = make_vectors(args.vectors, args.dimension, 200, args.seed)
+    queries = make_vectors(args.queries, args.dimension, 200, args.seed)
+    truths = [set(np.argsort(-(vectors @ query))[:args.k].tolist()) for query in queries]
+    exact_ms = timed(lambda: [np.argpartition(-(vectors @ query), args.k)[:args.k] for query in queries], repeat=3)
+    print(f"quantized {args.vectors} x {args.dimension}, k={args.k}: "
+          f"float32 {vectors.nbytes / 2**20:.0f} MiB, {exact_ms / args.queries:.2f}ms/query, recall 1.0")
+    for mode in ("int8", "binary"):
+        matrix = QuantizedMatrix(vectors, mode, full_precision=lambda rows: vectors[rows])
+        for candidates in args.candidates:
+            recall = statistics.mean(
+                len(truth & {row for row, _ in matrix.search(query, args.k, candidates)}) / args.k
+                for query, truth in zip(queries, truths)
+            )
+            ms = timed(lambda: [matrix.search(query, args.k, candidates) for query in queries], repeat=3)
+            print(f"  {mode:6s} candidates={candidates:<4d} {matrix.nbytes / 2**20:.0f} MiB, "
+                  f"{ms / args.queries:.2f}ms/query, recall {recall:.3f}")
+
+
+def bench_mmr(args):
+    candidates = make_vectors(args.mmr_candidates, args.dimension, 10, args.seed)
+    query = candidates[0]
+    ms = timed(lambda: mmr(query, candidates, args.k), repeat=50)
+    print(f"mmr {args.mmr_candidates} candidates -> {args.k}: {ms:.3f}ms")
+
+
+def bench_writer(args):
+    async def insert_many(rows):
+        await asyncio.sleep(args.insert_ms / 1000)
+        return [{"id": index, **row} for index, row in enumerate(rows)]
+
+    async def run(group_commit: bool):
+        writer = MessageWriter(insert_many, max_rows=100, max_delay=0.005)
+        if group_commit:
+            await writer.start()
+        # Concurrent requests share one connection in turn, as a pool of one would
+        lock = asyncio.Lock()
+
+        async def write(index):
+            if group_commit:
+                return await writer.write(f"s{index % 50}", {"content": str(index)})
+            async with lock:
+                return await writer.write(f"s{index % 50}", {"content": str(index)})
+
+        started = time.perf_counter()
+        await asyncio.gather(*(write(index) for index in range(args.messages)))
+        elapsed = (time.perf_counter() - started) * 1000
+        await writer.drain()
+        return elapsed, writer.batches if group_commit else args.messages
+
+    for group_commit in (False, True):
+        elapsed, statements = asyncio.run(run(group_commit))
+        print(f"writer {args.messages} concurrent messages, {args.insert_ms}ms insert, "
+              f"group commit {'on ' if group_commit else 'off'}: {elapsed:.0f}ms, {statements} statements")
+
+
+def bench_telemetry(args):
+    histogram = Histogram()
+    values = np.random.default_rng(args.seed).lognormal(-4, 1, 100_000).tolist()
+    ms = timed(lambda: [histogram.record(value) for value in values], repeat=3)
+    print(f"histogram record: {ms * 1000 / len(values):.2f}us")
+    tracer = Tracer()
+
+    def spans():
+        for _ in range(10_000):
+            with tracer.span("bench"):
+                pass
+
+    ms = timed(spans, repeat=3)
+    print(f"traced span (SDK span, processor, context attach): {ms * 1000 / 10_000:.1f}us")
+
+
+BENCHMARKS = {
+    "dedup": bench_dedup,
+    "quantized": bench_quantized,
+    "mmr": bench_mmr,
+    "writer": bench_writer,
+    "telemetry": bench_telemetry,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), nargs="+")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--memories", type=int, default=5000, help="memories of one user for dedup")
+    parser.add_argument("--threshold", type=float, default=0.92)
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 50, 200])
+    parser.add_argument("--mmr-candidates", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--insert-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    for name in args.only or BENCHMARKS:
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Footprint, latency and Recall@5 of float32 vs int8 vs binary vectors on LOCOMO.
+
+Every LOCOMO turn is stored as one memory (as `bulk_ingest.py locomo --mode
+raw` does) and each question searches its own conversation, like a per-user
+memory.search. Recall@k is the share of a question's evidence dia_ids found
+in the top k, as in results/retrieval_results_*.json.
+
+Compared:
+- float32: exact cosine over the full-precision matrix
+- int8 / binary: first pass over quantized codes, then exact re-scoring of
+  the top `candidates` rows read from a float32 memmap on disk
+
+Embeddings are cached in an .npy file next to the dataset, so OpenAI is
+called once per dataset. `--embedder hash` uses a deterministic offline
+bag-of-words embedding instead (absolute recall is lower, but the loss from
+quantization is still visible).
+
+Usage:
+    python benchmarks/quantized_locomo.py locomo10.json --embedder openai --candidates 5 20 50
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bulk_ingest import load_locomo
+from quantization import QuantizedMatrix
+
+
+def hash_embed(texts, dimension: int) -> np.ndarray:
+    """Deterministic offline embedding: signed feature hashing of lowercase tokens."""
+    vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = int.from_bytes(hashlib.md5(token.encode()).digest()[:8], "little")
+            vectors[row, digest % dimension] += 1.0 if (digest >> 63) & 1 else -1.0
+    return vectors
+
+
+def openai_embed(texts, model: str, batch_size: int = 500) -> np.ndarray:
+    from openai import OpenAI
+
+    client = OpenAI()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        response = client.embeddings.create(input=texts[start:start + batch_size], model=model)
+        vectors.extend(item.embedding for item in response.data)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def embed(texts, args, cache_path: str) -> np.ndarray:
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+    vectors = hash_embed(texts, args.dimension) if args.embedder == "hash" else openai_embed(texts, args.model)
+    np.save(cache_path, vectors)
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="LOCOMO json (e.g. locomo10.json)")
+    parser.add_argument("--embedder", choices=["openai", "hash"], default="openai")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--dimension", type=int, default=1536, help="hash embedder dimension")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[5, 20, 50], help="rows re-scored in float32")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    memories, owners, dia_ids = [], [], []
+    for item in load_locomo(args.path):
+        for message, meta in zip(item.messages, item.message_metadata):
+            memories.append(message["content"])
+            owners.append(item.user_id)
+            dia_ids.append(meta["dia_id"])
+    with open(args.path, encoding="utf-8") as f:
+        questions = [
+            (sample["sample_id"], qa["question"], set(qa.get("evidence", [])))
+            for sample in json.load(f)
+            for qa in sample.get("qa", [])
+            if qa.get("category") in (1, 2, 3, 4) and qa.get("evidence")
+        ]
+    print(f"{len(memories):,} memories, {len(questions):,} questions")
+
+    stem = os.path.splitext(args.path)[0]
+    suffix = f"hash{args.dimension}" if args.embedder == "hash" else args.model
+    vectors = embed(memories, args, f"{stem}.memories.{suffix}.npy")
+    query_vectors = embed([question for _, question, _ in questions], args, f"{stem}.questions.{suffix}.npy")
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+    owners = np.asarray(owners)
+    rows_by_owner = {owner: np.flatnonzero(owners == owner) for owner in set(owners.tolist())}
+
+    # Full-precision vectors for re-scoring live on disk, not in the in-memory index
+    memmap_path = os.path.join(tempfile.mkdtemp(), "vectors.npy")
+    np.save(memmap_path, vectors)
+    on_disk = np.load(memmap_path, mmap_mode="r")
+
+    def exact_search(query, rows, limit):
+        query = query / np.linalg.norm(query)
+        scores = vectors[rows] @ query
+        return [int(rows[index]) for index in np.argsort(-scores)[:limit]]
+
+    methods = [("float32", None, exact_search, vectors.nbytes)]
+    for mode in ("int8", "binary"):
+        matrix = QuantizedMatrix(vectors, mode, lambda rows: np.asarray(on_disk[rows]))
+        for candidates in args.candidates:
+            search = lambda query, rows, limit, matrix=matrix, candidates=candidates: [
+                row for row, _ in matrix.search(query, limit, candidates, rows)
+            ]
+            methods.append((mode, candidates, search, matrix.nbytes))
+
+    results = []
+    print(f"{'method':>8} {'rescore':>8} {'bytes':>12} {'Recall@' + str(args.k):>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for name, candidates, search, footprint in methods:
+        recalls, latencies = [], []
+        for (sample_id, _, evidence), query in zip(questions, query_vectors):
+            started = time.perf_counter()
+            found = search(query, rows_by_owner[sample_id], args.k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len(evidence & {dia_ids[row] for row in found}) / len(evidence))
+        latencies.sort()
+        result = {
+            "method": name,
+            "rescore_candidates": candidates,
+            "footprint_bytes": int(footprint),
+            "bytes_per_memory": round(footprint / len(memories), 1),
+            f"recall_at_{args.k}": round(statistics.mean(recalls), 4),
+            "p50_ms": round(latencies[len(latencies) // 2], 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 3),
+        }
+        results.append(result)
+        print(
+            f"{name:>8} {candidates or '-':>8} {footprint:>12,} {result[f'recall_at_{args.k}']:>9.2%} "
+            f"{result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"memories": len(memories), "questions": len(questions), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
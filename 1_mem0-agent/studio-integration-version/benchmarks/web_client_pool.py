@@ -0,0 +1,101 @@
+"""Requests/sec of the web front end's backend calls: new client per call vs a shared pool.
+
+Starts a stub of the agent API on localhost and replays the calls that
+post_message makes per chat turn (POST /api/mem0-agent, then GET
+/api/history) with the two client strategies:
+
+- per-call: a new httpx.AsyncClient for every backend call (the old behaviour)
+- pooled:   the keep-alive client from mem0_agent_web.create_backend_client
+
+Usage:
+    python benchmarks/web_client_pool.py --turns 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+STUB_HISTORY = [
+    {"id": i, "message": {"type": "human" if i % 2 == 0 else "ai", "content": f"message {i}"}}
+    for i in range(10)
+]
+
+stub = FastAPI()
+
+
+@stub.post("/api/mem0-agent")
+async def stub_agent():
+    return {"success": True}
+
+
+@stub.get("/api/history")
+async def stub_history():
+    return STUB_HISTORY
+
+
+def start_stub(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def turn_per_call(base_url: str):
+    async with httpx.AsyncClient() as client:
+        await client.post(f"{base_url}/api/mem0-agent", json={"query": "hi"})
+    async with httpx.AsyncClient() as client:
+        await client.get(f"{base_url}/api/history", params={"session_id": "bench"})
+
+
+async def turn_pooled(client: httpx.AsyncClient):
+    await client.post("/api/mem0-agent", json={"query": "hi"})
+    await client.get("/api/history", params={"session_id": "bench"})
+
+
+async def measure(name: str, make_turn, turns: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await make_turn()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(turns)))
+    elapsed = time.perf_counter() - started
+    rps = turns * 2 / elapsed
+    print(f"{name:>9}: {turns} turns in {elapsed:.2f}s -> {rps:,.0f} backend requests/sec")
+    return rps
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--port", type=int, default=18001)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    os.environ["API_BASE_URL"] = base_url
+    server = start_stub(args.port)
+
+    from mem0_agent_web import create_backend_client
+
+    before = await measure("per-call", lambda: turn_per_call(base_url), args.turns, args.concurrency)
+    async with create_backend_client() as client:
+        after = await measure("pooled", lambda: turn_pooled(client), args.turns, args.concurrency)
+    print(f"speedup: {after / before:.1f}x")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
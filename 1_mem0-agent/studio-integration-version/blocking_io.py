@@ -0,0 +1,42 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool used for blocking Mem0 and database calls.
+
+    Sized by BLOCKING_IO_WORKERS so a burst of slow OpenAI or Postgres calls
+    cannot exhaust the event loop's default executor.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BLOCKING_IO_WORKERS", "32")),
+            thread_name_prefix="blocking-io"
+        )
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking callable in the shared executor without stalling the event loop.
+
+    The call runs in a copy of the caller's context, so it stays inside the
+    caller's trace span (as asyncio.to_thread does).
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, fn, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True):
+    """Shut down the shared executor, waiting for in-flight calls by default."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,311 @@
+"""Bulk memory ingestion for backfilling historical conversations.
+
+Instead of one memory.add per conversation turn (one extraction, one
+embedding call and one insert per fact), facts are buffered per user,
+embedded in batches and upserted into the vector store in multi-row
+statements. Users are ingested in parallel up to a concurrency cap, and
+completed conversations are checkpointed so an interrupted run resumes
+where it stopped. In the endpoint, each batch upsert runs on the user's
+memory queue worker, so it never interleaves with a live memory.add for
+the same user.
+
+Modes:
+- extract: facts are extracted from each conversation with Mem0's LLM and
+  fact-retrieval prompt, as memory.add does (without its update/delete pass)
+- raw:     every message is stored as a memory as-is, keeping per-message
+  metadata such as LOCOMO dia_ids
+
+Usage:
+    python bulk_ingest.py locomo locomo10.json --mode raw --checkpoint locomo.ckpt
+    python bulk_ingest.py xlsx ../../3_dataset/robot_pika/memories/data1.xlsx \\
+        --messages-column messages_formatted --id-column id --user-prefix pika
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from blocking_io import run_blocking
+from embeddings import embed_batch
+
+INGEST_NAMESPACE = uuid.UUID("6f1c9a52-0d4e-4c1b-9a57-3b0f3c2d7e11")
+
+
+@dataclass
+class IngestItem:
+    """One conversation to ingest for a user."""
+    key: str
+    user_id: str
+    messages: List[Dict[str, str]]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    message_metadata: Optional[List[Dict[str, Any]]] = None
+
+
+def load_xlsx(
+    path: str,
+    messages_column: str = "messages",
+    id_column: Optional[str] = None,
+    user_column: Optional[str] = None,
+    user_prefix: Optional[str] = None,
+) -> Iterator[IngestItem]:
+    """Load conversations from a spreadsheet whose messages column holds a JSON message list.
+
+    Accepts both a bare list and {"messages": [...]} (robot_pika data1.xlsx). Rows
+    without a user column become one user each.
+    """
+    import pandas as pd
+
+    stem = Path(path).stem
+    frame = pd.read_excel(path)
+    for index, row in frame.iterrows():
+        raw = row.get(messages_column)
+        if not isinstance(raw, str) or not raw.strip():
+            continue
+        parsed = json.loads(raw)
+        messages = parsed["messages"] if isinstance(parsed, dict) else parsed
+        row_id = str(row[id_column]) if id_column else str(index)
+        user_id = str(row[user_column]) if user_column else f"{user_prefix or stem}-{row_id}"
+        yield IngestItem(
+            key=f"{stem}:{row_id}",
+            user_id=user_id,
+            messages=[{"role": message["role"], "content": message["content"]} for message in messages],
+            metadata={"source": stem}
+        )
+
+
+def locomo_sessions(conversation: Dict[str, Any]) -> List[str]:
+    """Session keys of a LOCOMO conversation (session_1, session_2, ...) in order."""
+    names = [name for name in conversation if re.fullmatch(r"session_\d+", name)]
+    return sorted(names, key=lambda name: int(name.split("_")[1]))
+
+
+def load_locomo(path: str, user_prefix: str = "") -> Iterator[IngestItem]:
+    """Load LOCOMO samples as one user per sample and one conversation per session.
+
+    Both speakers are people, so both are sent as the user role (prefixed with
+    their name) and facts are extracted from either side.
+    """
+    with open(path, encoding="utf-8") as f:
+        samples = json.load(f)
+    for sample in samples:
+        sample_id = sample["sample_id"]
+        conversation = sample["conversation"]
+        for name in locomo_sessions(conversation):
+            turns = conversation[name]
+            session_date = conversation.get(f"{name}_date_time")
+            yield IngestItem(
+                key=f"{sample_id}:{name}",
+                user_id=f"{user_prefix}{sample_id}",
+                messages=[{"role": "user", "content": f"{turn['speaker']}: {turn['text']}"} for turn in turns],
+                metadata={"source": "locomo", "session": name, "session_date": session_date},
+                message_metadata=[{"dia_id": turn.get("dia_id")} for turn in turns]
+            )
+
+
+class Checkpoint:
+    """Append-only file of completed item keys."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def mark(self, keys: Iterable[str]):
+        keys = [key for key in keys if key not in self.done]
+        self.done.update(keys)
+        if self.path and keys:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{key}\n" for key in keys))
+
+
+def extract_facts(memory: Any, messages: List[Dict[str, str]]) -> List[str]:
+    """Extract facts from a conversation with Mem0's own LLM and fact-retrieval prompt."""
+    from mem0.memory.utils import get_fact_retrieval_messages, parse_messages
+
+    system_prompt, user_prompt = get_fact_retrieval_messages(parse_messages(messages))
+    response = memory.llm.generate_response(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        response_format={"type": "json_object"}
+    )
+    response = re.sub(r"^```(?:json)?\s*|\s*```$", "", response.strip())
+    try:
+        return [fact for fact in json.loads(response).get("facts", []) if fact]
+    except json.JSONDecodeError:
+        print(f"Could not parse extracted facts: {response[:100]}")
+        return []
+
+
+class BulkIngestor:
+    """Ingests conversations into a Mem0 vector store with batched embeddings and upserts."""
+
+    def __init__(
+        self,
+        memory: Any,
+        mode: str = "extract",
+        batch_size: int = 100,
+        concurrency: int = 4,
+        checkpoint: Optional[Checkpoint] = None,
+        run_for_user: Optional[Callable[[str, Callable[[], Awaitable[Any]]], Awaitable[Any]]] = None,
+    ):
+        if mode not in ("extract", "raw"):
+            raise ValueError(f"Unknown ingestion mode: {mode}")
+        self.memory = memory
+        self.mode = mode
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint or Checkpoint(None)
+        # e.g. MemoryWriteQueue.run_for_user, to order the upserts with the user's other memory writes
+        self.run_for_user = run_for_user
+        self.stats: Dict[str, Any] = {
+            "status": "pending", "users": 0, "items": 0, "skipped": 0,
+            "memories": 0, "embedding_requests": 0, "failed_users": 0, "elapsed_seconds": 0.0,
+        }
+
+    async def run(self, items: Iterable[IngestItem]) -> Dict[str, Any]:
+        by_user: "OrderedDict[str, List[IngestItem]]" = OrderedDict()
+        for item in items:
+            if item.key in self.checkpoint:
+                self.stats["skipped"] += 1
+                continue
+            by_user.setdefault(item.user_id, []).append(item)
+        self.stats["status"] = "running"
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self._ingest_user(semaphore, user_id, user_items) for user_id, user_items in by_user.items()))
+            self.stats["status"] = "done"
+        except asyncio.CancelledError:
+            self.stats["status"] = "cancelled"
+            raise
+        except BaseException:
+            self.stats["status"] = "failed"
+            raise
+        finally:
+            self.stats["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+        return self.stats
+
+    async def _ingest_user(self, semaphore: asyncio.Semaphore, user_id: str, items: List[IngestItem]):
+        async with semaphore:
+            buffer: List[Tuple[str, Dict[str, Any]]] = []
+            keys: List[str] = []
+            try:
+                # Items of one user are processed in order; the buffer is flushed once a batch is full
+                for item in items:
+                    buffer.extend(await self._records(item))
+                    keys.append(item.key)
+                    if len(buffer) >= self.batch_size:
+                        await self._flush(user_id, buffer, keys)
+                        buffer, keys = [], []
+                if keys:
+                    await self._flush(user_id, buffer, keys)
+                self.stats["users"] += 1
+            except Exception as e:
+                self.stats["failed_users"] += 1
+                print(f"Bulk ingestion failed for user {user_id}: {str(e)}")
+            finally:
+                if hasattr(self.memory, "invalidate"):
+                    self.memory.invalidate(user_id)
+
+    async def _records(self, item: IngestItem) -> List[Tuple[str, Dict[str, Any]]]:
+        """Texts to store for an item, each with its payload metadata."""
+        if self.mode == "raw":
+            extra = item.message_metadata or [{} for _ in item.messages]
+            return [
+                (message["content"], {**item.metadata, **meta, "source_key": item.key})
+                for message, meta in zip(item.messages, extra)
+                if message["content"].strip()
+            ]
+        facts = await run_blocking(extract_facts, self.memory, item.messages)
+        return [(fact, {**item.metadata, "source_key": item.key}) for fact in facts]
+
+    async def _flush(self, user_id: str, records: List[Tuple[str, Dict[str, Any]]], keys: List[str]):
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            texts = [text for text, _ in chunk]
+            vectors = await run_blocking(embed_batch, self.memory.embedding_model, texts)
+            self.stats["embedding_requests"] += 1
+            created_at = datetime.now(timezone.utc).isoformat()
+            ids, payloads = [], []
+            for text, metadata in chunk:
+                # Deterministic ids make a replayed batch an upsert rather than a duplicate
+                ids.append(str(uuid.uuid5(INGEST_NAMESPACE, f"{user_id}\x00{metadata['source_key']}\x00{text}")))
+                payloads.append({
+                    **metadata,
+                    "data": text,
+                    "hash": hashlib.md5(text.encode()).hexdigest(),
+                    "created_at": created_at,
+                    "user_id": user_id,
+                })
+            insert = functools.partial(run_blocking, self.memory.vector_store.insert, vectors=vectors, ids=ids, payloads=payloads)
+            if self.run_for_user is not None:
+                await self.run_for_user(user_id, insert)
+            else:
+                await insert()
+            self.stats["memories"] += len(chunk)
+        self.checkpoint.mark(keys)
+        self.stats["items"] += len(keys)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", choices=["xlsx", "locomo"])
+    parser.add_argument("path")
+    parser.add_argument("--mode", choices=["extract", "raw"], default="extract")
+    parser.add_argument("--collection", default="memories_api_new")
+    parser.add_argument("--batch-size", type=int, default=100, help="texts per embedding request and upsert")
+    parser.add_argument("--concurrency", type=int, default=4, help="users ingested in parallel")
+    parser.add_argument("--checkpoint", help="file recording completed conversations, for resuming")
+    parser.add_argument("--messages-column", default="messages")
+    parser.add_argument("--id-column")
+    parser.add_argument("--user-column")
+    parser.add_argument("--user-prefix", default="")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from mem0 import Memory
+    from embeddings import install_embedder
+    from memory_config import mem0_config
+    from partitioned_store import partitioned_store_from_env
+
+    load_dotenv()
+    memory = install_embedder(Memory.from_config(mem0_config(args.collection)))
+    # Write into the same layout the endpoint reads from
+    store = partitioned_store_from_env(memory.vector_store.db, memory.vector_store.collection.name, memory.vector_store.collection.dimension)
+    if store is not None:
+        memory.vector_store = store
+    if args.source == "xlsx":
+        items = load_xlsx(args.path, args.messages_column, args.id_column, args.user_column, args.user_prefix or None)
+    else:
+        items = load_locomo(args.path, args.user_prefix)
+
+    ingestor = BulkIngestor(
+        memory,
+        mode=args.mode,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint=Checkpoint(args.checkpoint)
+    )
+    stats = await ingestor.run(items)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
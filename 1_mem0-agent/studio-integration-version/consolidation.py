@@ -0,0 +1,276 @@
+"""Write-time memory consolidation: merge near-duplicate memories per user.
+
+memory.add runs after every turn, so the same fact is extracted again and
+again in slightly different words. The consolidator groups a user's
+memories by embedding similarity and keeps one memory per group (the most
+recently written, so a newer fact wins over an older, contradicting one),
+deleting the rest through Mem0 so its history is kept.
+
+It runs:
+- incrementally: after each memory.add, new memories are compared with
+  their nearest neighbours and merged right away
+- periodically: users with writes since their last pass are fully
+  re-clustered by a compaction job
+
+Deletes are rate limited (token bucket); work that does not fit the budget
+marks the user for the next compaction. Every pass can run as a dry run
+that only reports what would be merged.
+
+Usage:
+    python consolidation.py --user-id alice            # dry-run report
+    python consolidation.py --user-id alice --apply
+    python consolidation.py --all --apply --threshold 0.93
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from diversify import fetch_vectors, unit_rows
+from vector_index import fetch_user_records, stored_user_ids, user_collection
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` operations per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, count: int = 1) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < count:
+                return False
+            self._tokens -= count
+            return True
+
+    def acquire(self, count: int = 1):
+        """Block until `count` operations are allowed."""
+        while not self.try_acquire(count):
+            time.sleep(count / self.rate)
+
+
+def written_at(payload: Dict[str, Any]) -> str:
+    return payload.get("updated_at") or payload.get("created_at") or ""
+
+
+def duplicate_groups(vectors: np.ndarray, threshold: float, block: int = 256) -> List[List[int]]:
+    """Connected groups of rows whose cosine similarity is at least the threshold (rows unit-normalized).
+
+    Similarities are computed `block` rows at a time in float32, against the
+    rows from the block on, so memory stays at block x N instead of N x N.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    count = len(vectors)
+    parent = list(range(count))
+
+    def root(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for start in range(0, count, block):
+        rows, columns = np.nonzero(vectors[start:start + block] @ vectors[start:].T >= threshold)
+        for left, right in zip(rows + start, columns + start):
+            if right > left:
+                parent[root(int(left))] = root(int(right))
+    groups: Dict[int, List[int]] = {}
+    for index in range(count):
+        groups.setdefault(root(index), []).append(index)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class Consolidator:
+    """Merges near-duplicate memories of a user, incrementally and as periodic compaction.
+
+    `memory` is the Mem0 Memory instance; `invalidate(user_id)` is called after
+    a user's memories change so cached search results are dropped.
+    """
+
+    def __init__(
+        self,
+        memory: Any,
+        threshold: float = 0.92,
+        ops_per_second: float = 5.0,
+        burst: int = 20,
+        cooldown: float = 300.0,
+        max_memories: int = 5000,
+        invalidate: Optional[Callable[[str], None]] = None,
+    ):
+        self.memory = memory
+        self.threshold = threshold
+        self.limiter = RateLimiter(ops_per_second, burst)
+        self.cooldown = cooldown
+        self.max_memories = max_memories
+        self.invalidate = invalidate
+        self.dirty: Dict[str, float] = {}
+        self._last_pass: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.merged = 0
+        self.deferred = 0
+
+    def plan(self, user_id: str) -> Dict[str, Any]:
+        """Dry-run report of the merges a full pass over the user's memories would make."""
+        collection = user_collection(self.memory.vector_store, user_id)
+        records = fetch_user_records(collection, user_id, with_vectors=True, limit=self.max_memories) \
+            if collection is not None else []
+        report = {"user_id": user_id, "memories": len(records), "groups": [], "removable": 0}
+        if len(records) < 2:
+            return report
+        vectors = unit_rows(np.asarray([record.vector for record in records], dtype=np.float32))
+        for group in duplicate_groups(vectors, self.threshold):
+            keep = max(group, key=lambda index: written_at(records[index].payload))
+            similarity = vectors[group] @ vectors[keep]
+            report["groups"].append({
+                "keep": {"id": str(records[keep].id), "memory": records[keep].payload.get("data")},
+                "remove": [
+                    {"id": str(records[index].id), "memory": records[index].payload.get("data"), "similarity": round(float(score), 4)}
+                    for index, score in zip(group, similarity) if index != keep
+                ],
+            })
+            report["removable"] += len(group) - 1
+        return report
+
+    def apply(self, report: Dict[str, Any], wait: bool = False) -> int:
+        """Delete the duplicates in a report, as far as the rate limit allows (or waiting for it)."""
+        user_id = report["user_id"]
+        removed = 0
+        try:
+            for group in report["groups"]:
+                for duplicate in group["remove"]:
+                    if wait:
+                        self.limiter.acquire()
+                    elif not self.limiter.try_acquire():
+                        self.deferred += 1
+                        self.mark_dirty(user_id)
+                        return removed
+                    self.memory.delete(memory_id=duplicate["id"])
+                    removed += 1
+        finally:
+            self.merged += removed
+            if removed and self.invalidate:
+                self.invalidate(user_id)
+        return removed
+
+    def consolidate_user(self, user_id: str, dry_run: bool = False, wait: bool = False) -> Dict[str, Any]:
+        report = self.plan(user_id)
+        report["dry_run"] = dry_run
+        report["removed"] = 0 if dry_run else self.apply(report, wait)
+        if not dry_run:
+            with self._lock:
+                self._last_pass[user_id] = time.monotonic()
+                if report["removed"] == report["removable"]:
+                    self.dirty.pop(user_id, None)
+        return report
+
+    def on_write(self, user_id: str, result: Dict[str, Any]):
+        """Merge memories just written by memory.add into their near duplicates."""
+        new_ids = [entry["id"] for entry in (result or {}).get("results", []) if entry.get("event") in ("ADD", "UPDATE")]
+        if not new_ids:
+            return
+        self.mark_dirty(user_id)
+        store = self.memory.vector_store
+        removed = set()
+        for memory_id, vector in fetch_vectors(store, new_ids, user_id).items():
+            if memory_id in removed:
+                continue
+            neighbours = [str(neighbour.id) for neighbour in store.search(query=vector, limit=5, filters={"user_id": user_id})]
+            # Similarity is computed from the stored vectors: store wrappers differ in what `score` means
+            stored = fetch_vectors(store, [neighbour_id for neighbour_id in neighbours if neighbour_id != memory_id], user_id)
+            query = unit_rows(np.asarray(vector, dtype=np.float32))
+            for neighbour_id in neighbours:
+                if neighbour_id == memory_id or neighbour_id in removed or neighbour_id not in stored:
+                    continue
+                if float(unit_rows(np.asarray(stored[neighbour_id], dtype=np.float32)) @ query) < self.threshold:
+                    continue
+                # The memory just written is the newest statement of the fact, so it is kept
+                if not self.limiter.try_acquire():
+                    self.deferred += 1
+                    break
+                self.memory.delete(memory_id=neighbour_id)
+                removed.add(neighbour_id)
+        self.merged += len(removed)
+        if removed and self.invalidate:
+            self.invalidate(user_id)
+
+    def mark_dirty(self, user_id: str):
+        with self._lock:
+            self.dirty.setdefault(user_id, time.monotonic())
+
+    def compact(self, max_users: int = 50) -> List[Dict[str, Any]]:
+        """Full pass over users written to since their last pass, oldest first, respecting the cooldown."""
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                user_id for user_id, _ in sorted(self.dirty.items(), key=lambda item: item[1])
+                if now - self._last_pass.get(user_id, float("-inf")) >= self.cooldown
+            ][:max_users]
+        reports = []
+        for user_id in due:
+            try:
+                reports.append(self.consolidate_user(user_id))
+            except Exception as e:
+                print(f"Error consolidating memories for {user_id}: {str(e)}")
+        return reports
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "dirty_users": len(self.dirty),
+            "merged": self.merged,
+            "deferred": self.deferred,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user-id")
+    target.add_argument("--all", action="store_true", help="every user found in the collection")
+    parser.add_argument("--apply", action="store_true", help="delete duplicates instead of only reporting them")
+    parser.add_argument("--collection", default="memories_api_new")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("CONSOLIDATION_THRESHOLD", "0.92")))
+    parser.add_argument("--ops-per-second", type=float, default=float(os.getenv("CONSOLIDATION_OPS_PER_SECOND", "5")))
+    args = parser.parse_args()
+
+    from db_pool import notify_memory_changed
+    from dotenv import load_dotenv
+    from mem0 import Memory
+    from memory_config import mem0_config
+    from partitioned_store import partitioned_store_from_env
+
+    load_dotenv()
+    memory = Memory.from_config(mem0_config(args.collection))
+    store = partitioned_store_from_env(memory.vector_store.db, memory.vector_store.collection.name, memory.vector_store.collection.dimension)
+    if store is not None:
+        memory.vector_store = store
+    engine = memory.vector_store.db.engine
+    # Merges made here are announced to the endpoint processes, which cache the deleted memories
+    consolidator = Consolidator(
+        memory,
+        threshold=args.threshold,
+        ops_per_second=args.ops_per_second,
+        invalidate=lambda user_id: notify_memory_changed(engine, user_id)
+    )
+    if args.all:
+        user_ids = stored_user_ids(memory.vector_store)
+    else:
+        user_ids = [args.user_id]
+    for user_id in user_ids:
+        report = consolidator.consolidate_user(user_id, dry_run=not args.apply, wait=True)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
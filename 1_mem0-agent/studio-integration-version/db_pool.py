@@ -0,0 +1,537 @@
+"""Shared Postgres connection pools for every database access path.
+
+- sync:  one SQLAlchemy engine (QueuePool) per database, installed into the
+         vecs client behind Mem0's vector store, so vector search, the
+         archive and access tables and the Streamlit apps all draw from it
+- async: an asyncpg pool for the endpoint's messages table (history fetch,
+         messages after a cursor, message insert), which takes PostgREST and
+         its HTTP round trip off the chat hot path
+
+Both pools are configured from the same DB_* settings:
+- statement_timeout and idle_in_transaction_session_timeout are startup
+  parameters of every pooled connection, not options in DATABASE_URL.
+  Index builds would hit the timeout on any real table, so they run through
+  ddl_collection, on a separate unpooled engine without it
+- health check: a connection idle for longer than DB_POOL_PING_AFTER seconds
+  is pinged before it is handed out, and replaced if the ping fails
+- prepared statements: the history, message insert and vector search queries
+  are prepared once per connection and only executed afterwards
+- metrics: size, in use, acquire waits, timeouts, connections opened and
+  failed health checks, at /api/db-pool and in /metrics
+
+Poolers in transaction mode (Supabase port 6543, PgBouncer) neither accept
+startup parameters nor keep prepared statements between transactions: point
+DATABASE_URL at the database or the session pooler (port 5432).
+
+Offline jobs that change memories in another process (tiering,
+consolidation) announce it with notify_memory_changed; endpoint processes
+run listen_memory_changed and drop what they cache for that user.
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+from telemetry import QUANTILES, Histogram, current_span
+
+
+@dataclass
+class PoolSettings:
+    """Size, timeouts and health checking of a connection pool."""
+    min_size: int = 1
+    max_size: int = 10
+    acquire_timeout: float = 5.0
+    statement_timeout_ms: int = 15000
+    idle_in_transaction_timeout_ms: int = 60000
+    ping_after: float = 30.0
+    max_idle: float = 300.0
+    max_lifetime: float = 1800.0
+    prepared_statements: bool = True
+
+    @classmethod
+    def from_env(cls, **defaults) -> "PoolSettings":
+        """Settings from DB_* variables, falling back to `defaults` and then to the class defaults."""
+        base = cls(**defaults)
+        return cls(
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", str(base.min_size))),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", str(base.max_size))),
+            acquire_timeout=float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", str(base.acquire_timeout))),
+            statement_timeout_ms=int(os.getenv("DB_STATEMENT_TIMEOUT_MS", str(base.statement_timeout_ms))),
+            idle_in_transaction_timeout_ms=int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", str(base.idle_in_transaction_timeout_ms))),
+            ping_after=float(os.getenv("DB_POOL_PING_AFTER", str(base.ping_after))),
+            max_idle=float(os.getenv("DB_POOL_MAX_IDLE", str(base.max_idle))),
+            max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", str(base.max_lifetime))),
+            prepared_statements=os.getenv("DB_PREPARED_STATEMENTS", str(base.prepared_statements)).lower() == "true",
+        )
+
+    def server_settings(self) -> Dict[str, str]:
+        """Session parameters sent when a connection is opened."""
+        return {
+            "statement_timeout": str(self.statement_timeout_ms),
+            "idle_in_transaction_session_timeout": str(self.idle_in_transaction_timeout_ms),
+        }
+
+
+class PoolMetrics:
+    """Event counters and acquire-wait histogram of one pool."""
+
+    def __init__(self):
+        self.counters = {
+            "acquires": 0,
+            "timeouts": 0,
+            "connections_opened": 0,
+            "health_checks": 0,
+            "health_failures": 0,
+        }
+        self.wait = Histogram()
+        self._lock = threading.Lock()
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def opened(self):
+        """A new connection was opened; counted on the current span too, as a cold-pool signal."""
+        self.count("connections_opened")
+        span = current_span()
+        if span is not None:
+            span.count("db.new_connections")
+
+    def stats(self, **gauges) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**gauges, **counters, "acquire_wait": self.wait.stats() if self.wait.count else None}
+
+
+# Every pool created in this process, by name, for /api/db-pool and /metrics
+_pools: Dict[str, Any] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_name(kind: str, url: str) -> str:
+    """A name for the pool that identifies the database without its credentials."""
+    parts = urlsplit(url)
+    return f"{kind}:{parts.hostname}:{parts.port or 5432}{parts.path}"
+
+
+class SyncPool:
+    """A SQLAlchemy engine whose connections carry the session settings, pinged after idling, with metrics."""
+
+    def __init__(self, url: str, settings: PoolSettings):
+        from sqlalchemy import create_engine, event
+
+        self.url = url
+        self.settings = settings
+        self.metrics = PoolMetrics()
+        options = " ".join(f"-c {name}={value}" for name, value in settings.server_settings().items())
+        self.engine = create_engine(
+            url,
+            pool_size=settings.max_size,
+            max_overflow=0,
+            pool_timeout=settings.acquire_timeout,
+            pool_recycle=settings.max_lifetime,
+            # Most recently used first, so the connections left idle are the ones recycled
+            pool_use_lifo=True,
+            connect_args={"options": options},
+        )
+        event.listen(self.engine, "connect", self._on_connect)
+        event.listen(self.engine, "checkout", self._on_checkout)
+        event.listen(self.engine, "checkin", self._on_checkin)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.metrics.opened()
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        from sqlalchemy import exc
+
+        self.metrics.count("acquires")
+        last_used = connection_record.info.get("last_used")
+        if last_used is None or time.monotonic() - last_used < self.settings.ping_after:
+            return
+        self.metrics.count("health_checks")
+        try:
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            dbapi_connection.rollback()
+        except Exception:
+            self.metrics.count("health_failures")
+            # The pool discards this connection and retries the checkout on a new one
+            raise exc.DisconnectionError()
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        connection_record.info["last_used"] = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        return self.metrics.stats(
+            size=pool.checkedin() + pool.checkedout(),
+            max_size=self.settings.max_size,
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+        )
+
+
+def sync_pool(url: Any, settings: Optional[PoolSettings] = None) -> SyncPool:
+    """The process-wide sync pool for a database URL (a string or SQLAlchemy URL), created on first use."""
+    if not isinstance(url, str):
+        url = url.render_as_string(hide_password=False)
+    name = pool_name("sync", url)
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = SyncPool(url, settings or PoolSettings.from_env())
+    return pool
+
+
+def use_sync_pool(db: Any, settings: Optional[PoolSettings] = None) -> SyncPool:
+    """Point a vecs client (Mem0's Supabase store `.db`) at the shared pool for its database.
+
+    vecs opens its own unpooled engine per client; its collections look up
+    `client.engine` and `client.Session` on every call, so swapping them here
+    moves all later queries onto the shared pool.
+    """
+    from sqlalchemy.orm import sessionmaker
+
+    pool = sync_pool(db.engine.url, settings)
+    if db.engine is not pool.engine:
+        db.engine.dispose()
+        db.engine = pool.engine
+        db.Session = sessionmaker(pool.engine)
+    return pool
+
+
+# Postgres NOTIFY channel; the payload is a user id, or empty for every user
+MEMORY_CHANGED_CHANNEL = "memory_changed"
+
+
+def notify_memory_changed(engine: Any, user_id: Optional[str] = None):
+    """Tell the endpoint processes that a user's memories (everyone's with None) were changed from outside."""
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_notify(:channel, :user_id)"), {"channel": MEMORY_CHANGED_CHANNEL, "user_id": user_id or ""})
+
+
+async def listen_memory_changed(url: str, on_change: Callable[[Optional[str]], Any], keepalive: float = 30.0):
+    """Call `on_change(user_id)` for each memory_changed notification until cancelled.
+
+    Notifications sent while the listening connection is down are lost, so
+    after every reconnect `on_change(None)` invalidates all users.
+    """
+    if asyncpg is None:
+        print("Cross-process memory invalidation disabled: asyncpg is not installed (pip install asyncpg)")
+        return
+    url = re.sub(r"^postgres(ql)?(\+\w+)?://", "postgresql://", url)
+    reconnect = False
+    while True:
+        try:
+            conn = await asyncpg.connect(url)
+        except (OSError, asyncpg.PostgresError) as e:
+            print(f"Could not listen for memory changes, retrying: {str(e)}")
+            await asyncio.sleep(keepalive)
+            continue
+        try:
+            await conn.add_listener(
+                MEMORY_CHANGED_CHANNEL,
+                lambda connection, pid, channel, payload: on_change(payload or None)
+            )
+            if reconnect:
+                on_change(None)
+            reconnect = True
+            while True:
+                await asyncio.sleep(keepalive)
+                # A dead connection is only noticed when it is used
+                await conn.execute("SELECT 1")
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+            print(f"Memory change listener lost its connection, reconnecting: {str(e)}")
+        finally:
+            if not conn.is_closed():
+                conn.terminate()
+
+
+_ddl_engines: Dict[str, Any] = {}
+
+
+def ddl_collection(collection: Any) -> Any:
+    """A copy of a vecs collection bound to an unpooled engine with no statement timeout, for index builds.
+
+    The shared pool's connections carry DB_STATEMENT_TIMEOUT_MS, which would
+    cancel an HNSW or IVFFlat build; the collection itself is left untouched.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import NullPool
+
+    url = collection.client.engine.url.render_as_string(hide_password=False)
+    with _pools_lock:
+        engine = _ddl_engines.get(url)
+        if engine is None:
+            engine = _ddl_engines[url] = create_engine(url, poolclass=NullPool, connect_args={"options": "-c statement_timeout=0"})
+    client = copy.copy(collection.client)
+    client.engine = engine
+    client.Session = sessionmaker(engine)
+    ddl = copy.copy(collection)
+    ddl.client = client
+    return ddl
+
+
+class PreparedSearchStore:
+    """Mem0 vector store proxy running vector search as a prepared statement.
+
+    The search is prepared once per pooled connection and collection, then
+    each call is a single round trip: the index's ef_search / probes for the
+    transaction and an EXECUTE, with no parsing or planning on the server.
+    """
+
+    def __init__(self, store: Any, ef_search: int = 40, probes: int = 10):
+        self.store = store
+        self.ef_search = ef_search
+        self.probes = probes
+
+    def search(self, query, limit=5, filters=None, **kwargs):
+        from quantization import vector_literal
+
+        filters = filters or {}
+        if hasattr(self.store, "collection_for") and "user_id" in filters:
+            collection = self.store.collection_for(filters["user_id"])
+        else:
+            collection = getattr(self.store, "collection", None)
+        if collection is None:
+            return self.store.search(query=query, limit=limit, filters=filters, **kwargs)
+        name = "vector_search_" + hashlib.sha1(collection.name.encode("utf-8")).hexdigest()[:16]
+        with collection.client.engine.begin() as conn:
+            # Kept with the pooled connection, which outlives this checkout
+            prepared = conn.connection.info.setdefault("prepared_statements", set())
+            if name not in prepared:
+                conn.exec_driver_sql(
+                    f"PREPARE {name} (vector, jsonb, integer) AS "
+                    f'SELECT id, metadata, vec <=> $1 AS distance FROM vecs."{collection.name}" '
+                    f"WHERE metadata @> $2 ORDER BY vec <=> $1 LIMIT $3"
+                )
+                prepared.add(name)
+            rows = conn.exec_driver_sql(
+                f"SET LOCAL hnsw.ef_search = {int(self.ef_search)}; "
+                f"SET LOCAL ivfflat.probes = {int(self.probes)}; "
+                f"EXECUTE {name} (%(query)s, %(filters)s, %(limit)s)",
+                {"query": vector_literal(query), "filters": json.dumps(filters), "limit": int(limit)},
+            ).fetchall()
+        return [SimpleNamespace(id=str(row[0]), score=float(row[2]), payload=row[1]) for row in rows]
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.store, name)
+
+
+class AsyncPool:
+    """An asyncpg pool with the session settings, ping-after-idle health checks and metrics.
+
+    asyncpg prepares each query the first time a connection runs it and keeps
+    it in the connection's statement cache, so repeated queries skip parsing
+    and planning (disabled with DB_PREPARED_STATEMENTS=false).
+    """
+
+    def __init__(self, url: str, settings: PoolSettings):
+        self.url = url
+        self.settings = settings
+        self.metrics = PoolMetrics()
+        self.pool = None
+        # Last release time per backend pid, for the ping-after-idle check
+        self.last_used: Dict[int, float] = {}
+
+    @classmethod
+    async def connect(cls, url: str, settings: Optional[PoolSettings] = None) -> "AsyncPool":
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is not installed (pip install asyncpg)")
+        # asyncpg only understands plain postgresql:// URLs
+        url = re.sub(r"^postgres(ql)?(\+\w+)?://", "postgresql://", url)
+        self = cls(url, settings or PoolSettings.from_env())
+        self.pool = await asyncpg.create_pool(
+            url,
+            min_size=self.settings.min_size,
+            max_size=self.settings.max_size,
+            max_inactive_connection_lifetime=self.settings.max_idle,
+            statement_cache_size=100 if self.settings.prepared_statements else 0,
+            server_settings=self.settings.server_settings(),
+            init=self._init,
+        )
+        with _pools_lock:
+            _pools[pool_name("async", url)] = self
+        return self
+
+    async def _init(self, conn):
+        self.metrics.opened()
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.settings.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.count("timeouts")
+            raise
+        self.metrics.count("acquires")
+        self.metrics.wait.record(time.perf_counter() - started)
+        return conn
+
+    async def _checked(self, conn):
+        """The connection, or a replacement if it idled past ping_after and no longer answers."""
+        last_used = self.last_used.get(conn.get_server_pid())
+        if last_used is None or time.monotonic() - last_used < self.settings.ping_after:
+            return conn
+        self.metrics.count("health_checks")
+        try:
+            await conn.fetchval("SELECT 1", timeout=self.settings.acquire_timeout)
+            return conn
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError):
+            self.metrics.count("health_failures")
+            self.last_used.pop(conn.get_server_pid(), None)
+            conn.terminate()
+            await self.pool.release(conn)
+            return await self._acquire()
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await self._checked(await self._acquire())
+        try:
+            yield conn
+        finally:
+            now = time.monotonic()
+            self.last_used[conn.get_server_pid()] = now
+            if len(self.last_used) > 4 * self.settings.max_size:
+                # Connections idle for longer than max_idle have been closed by the pool
+                self.last_used = {pid: used for pid, used in self.last_used.items() if now - used < self.settings.max_idle}
+            await self.pool.release(conn)
+
+    async def fetch(self, query: str, *args) -> List[Any]:
+        async with self.connection() as conn:
+            return await conn.fetch(query, *args)
+
+    async def fetchrow(self, query: str, *args) -> Optional[Any]:
+        async with self.connection() as conn:
+            return await conn.fetchrow(query, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return self.metrics.stats(size=size, max_size=self.settings.max_size, in_use=size - idle, idle=idle)
+
+    async def close(self):
+        with _pools_lock:
+            _pools.pop(pool_name("async", self.url), None)
+        await self.pool.close()
+
+
+def message_row(row: Any) -> Dict[str, Any]:
+    """A messages row shaped like PostgREST returns it: created_at as an ISO 8601 string, message as a dict."""
+    return {**dict(row), "created_at": row["created_at"].isoformat()}
+
+
+class MessageStore:
+    """The endpoint's queries on the messages table, over the async pool.
+
+    Keyset pages on (session_id, created_at, id) as with PostgREST, so the
+    same cursors work with either backend; cursor timestamps are passed as
+    text and cast by Postgres.
+    """
+
+    COLUMNS = "id, created_at, session_id, message"
+    LATEST = (
+        f"SELECT {COLUMNS} FROM messages WHERE session_id = $1 "
+        "ORDER BY created_at DESC, id DESC LIMIT $2"
+    )
+    BEFORE = (
+        f"SELECT {COLUMNS} FROM messages WHERE session_id = $1 "
+        "AND created_at <= $2::text::timestamptz AND (created_at < $2::text::timestamptz OR id < $3) "
+        "ORDER BY created_at DESC, id DESC LIMIT $4"
+    )
+    AFTER = (
+        f"SELECT {COLUMNS} FROM messages WHERE session_id = $1 "
+        "AND created_at >= $2::text::timestamptz AND (created_at > $2::text::timestamptz OR id > $3) "
+        "ORDER BY created_at, id LIMIT $4"
+    )
+    # Many rows in one statement; ORDER BY position makes the ids follow the input order
+    INSERT_MANY = (
+        "INSERT INTO messages (session_id, message) "
+        "SELECT session_id, message::jsonb FROM unnest($1::text[], $2::text[]) "
+        "WITH ORDINALITY AS batch(session_id, message, position) ORDER BY position "
+        f"RETURNING {COLUMNS}"
+    )
+
+    def __init__(self, pool: AsyncPool):
+        self.pool = pool
+
+    async def history(self, session_id: str, limit: int, created_at: Optional[str] = None,
+                      message_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The newest `limit` messages (older than the cursor position if given), newest first."""
+        if created_at is None:
+            rows = await self.pool.fetch(self.LATEST, session_id, limit)
+        else:
+            rows = await self.pool.fetch(self.BEFORE, session_id, created_at, message_id, limit)
+        return [message_row(row) for row in rows]
+
+    async def after(self, session_id: str, created_at: str, message_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Messages stored after the cursor position, oldest first."""
+        rows = await self.pool.fetch(self.AFTER, session_id, created_at, message_id, limit)
+        return [message_row(row) for row in rows]
+
+    async def insert_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert {"session_id", "message"} rows with one statement and return them as stored."""
+        stored = await self.pool.fetch(
+            self.INSERT_MANY,
+            [row["session_id"] for row in rows],
+            [json.dumps(row["message"]) for row in rows],
+        )
+        return [message_row(row) for row in stored]
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in sorted(pools.items())}
+
+
+def pool_metrics() -> str:
+    """Pool sizes, event counters and acquire-wait quantiles in Prometheus text format."""
+    with _pools_lock:
+        pools = sorted(_pools.items())
+    lines = [
+        "# HELP mem0_db_pool_connections Connections held by each Postgres pool",
+        "# TYPE mem0_db_pool_connections gauge",
+    ]
+    for name, pool in pools:
+        stats = pool.stats()
+        for state in ("in_use", "idle"):
+            lines.append(f'mem0_db_pool_connections{{pool="{name}",state="{state}"}} {stats[state]}')
+    lines += [
+        "# HELP mem0_db_pool_events_total Acquires, timeouts, new connections and health checks of each Postgres pool",
+        "# TYPE mem0_db_pool_events_total counter",
+    ]
+    for name, pool in pools:
+        for event, amount in sorted(pool.metrics.counters.items()):
+            lines.append(f'mem0_db_pool_events_total{{pool="{name}",event="{event}"}} {amount}')
+    lines += [
+        "# HELP mem0_db_pool_acquire_wait_seconds Time spent waiting for a pooled connection",
+        "# TYPE mem0_db_pool_acquire_wait_seconds summary",
+    ]
+    for name, pool in pools:
+        wait = pool.metrics.wait
+        if not wait.count:
+            continue
+        for share in QUANTILES:
+            lines.append(f'mem0_db_pool_acquire_wait_seconds{{pool="{name}",quantile="{share}"}} {wait.value_at(share):.6f}')
+        lines.append(f'mem0_db_pool_acquire_wait_seconds_sum{{pool="{name}"}} {wait.total:.6f}')
+        lines.append(f'mem0_db_pool_acquire_wait_seconds_count{{pool="{name}"}} {wait.count}')
+    return "\n".join(lines) + "\n"
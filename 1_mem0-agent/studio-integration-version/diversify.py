@@ -0,0 +1,122 @@
+"""Post-retrieval dedup and maximal-marginal-relevance (MMR) re-ranking.
+
+Near-identical memories (the same fact extracted from several turns) can
+fill every top-k slot. The retriever fetches `fetch_k` candidates, collapses
+exact duplicates (content hash) and near duplicates (cosine similarity above
+a threshold), then picks `limit` results with MMR, so each slot in the
+prompt carries a distinct fact.
+
+Candidate vectors are read back from the vecs collection in one fetch, with
+the embedder (and its cache) as a fallback.
+"""
+import hashlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from memory_cache import normalize_query
+
+
+def content_key(entry: Dict[str, Any]) -> str:
+    """Mem0's content hash of a memory, or an md5 of its normalized text."""
+    return entry.get("hash") or hashlib.md5(normalize_query(entry["memory"]).encode()).hexdigest()
+
+
+def fetch_vectors(store: Any, ids: List[str], user_id: Optional[str] = None) -> Dict[str, List[float]]:
+    """Stored vectors of the given memory ids, from the collection holding the user's memories."""
+    if hasattr(store, "collection_for"):
+        collection = store.collection_for(user_id or "")
+    else:
+        collection = getattr(store, "collection", None)
+    if collection is None or not ids:
+        return {}
+    return {str(record[0]): record[1] for record in collection.fetch(ids=ids)}
+
+
+def unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def collapse_duplicates(entries: List[Dict[str, Any]], vectors: np.ndarray, threshold: float) -> List[int]:
+    """Indices of the entries to keep: the first of each exact or near-duplicate group, in rank order."""
+    similarity = vectors @ vectors.T
+    kept: List[int] = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        key = content_key(entry)
+        if key in seen:
+            continue
+        if kept and similarity[index, kept].max() >= threshold:
+            continue
+        seen.add(key)
+        kept.append(index)
+    return kept
+
+
+def mmr(query_vector: np.ndarray, vectors: np.ndarray, k: int, lambda_: float = 0.7) -> List[int]:
+    """Select k rows by maximal marginal relevance.
+
+    Each step picks argmax of lambda * sim(query, d) - (1 - lambda) * max sim(d, selected).
+    Vectors must be unit-normalized.
+    """
+    count = len(vectors)
+    if count == 0:
+        return []
+    relevance = vectors @ query_vector
+    pairwise = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(count, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, count):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        choice = int(np.argmax(scores))
+        selected.append(choice)
+        available[choice] = False
+        redundancy = np.maximum(redundancy, pairwise[choice])
+    return selected
+
+
+class DiverseRetriever:
+    """Wraps a search function (memory.search or a hybrid retriever) with dedup and MMR.
+
+    `search(query, user_id, limit)` must return Mem0's {"results": [...]} format.
+    """
+
+    def __init__(
+        self,
+        memory: Any,
+        search: Callable[..., Dict[str, Any]],
+        fetch_k: int = 20,
+        lambda_: float = 0.7,
+        duplicate_threshold: float = 0.95,
+    ):
+        self.memory = memory
+        self.inner = search
+        self.fetch_k = fetch_k
+        self.lambda_ = lambda_
+        self.duplicate_threshold = duplicate_threshold
+        self.collapsed = 0
+
+    def search(self, query: str, user_id: str, limit: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        candidates = self.inner(query, user_id, max(self.fetch_k, limit))["results"]
+        if len(candidates) <= 1:
+            return {"results": candidates[:limit]}
+        vectors = unit_rows(self._vectors(candidates, user_id))
+        kept = collapse_duplicates(candidates, vectors, self.duplicate_threshold)
+        self.collapsed += len(candidates) - len(kept)
+        # Same call as Mem0's own search, so the query vector comes from the embedding cache
+        query_vector = unit_rows(np.asarray(self.memory.embedding_model.embed(query, "search"), dtype=np.float32))
+        order = mmr(query_vector, vectors[kept], limit, self.lambda_)
+        return {"results": [candidates[kept[index]] for index in order]}
+
+    def _vectors(self, entries: List[Dict[str, Any]], user_id: str) -> np.ndarray:
+        stored = fetch_vectors(self.memory.vector_store, [entry["id"] for entry in entries], user_id)
+        rows = []
+        for entry in entries:
+            vector = stored.get(entry["id"])
+            if vector is None:
+                vector = self.memory.embedding_model.embed(entry["memory"])
+            rows.append(np.asarray(vector, dtype=np.float32))
+        return np.vstack(rows)
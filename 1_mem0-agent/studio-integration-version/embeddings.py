@@ -0,0 +1,345 @@
+"""Local embedding inference with micro-batching and an on-disk embedding cache.
+
+The provider is chosen in memory_config.embedder_config (EMBEDDING_PROVIDER):
+- openai: Mem0's OpenAI embedder, one HTTP call per text
+- local:  a sentence-transformers model on CPU (torch or ONNX Runtime),
+  no network at all
+
+install_embedder puts two layers in front of whichever Mem0 built:
+- BatchingEmbedder (local models): concurrent embed calls from the request
+  threads are coalesced into one forward pass, which is much cheaper per
+  text than encoding them one at a time
+- DiskCachedEmbedder (opt-in, EMBEDDING_CACHE_PATH): vectors are kept in an
+  SQLite file keyed by a hash of model, dimension and text, so a restart
+  (or a rerun of a benchmark) does not embed the same text again. Search
+  queries bypass it; memory_cache already caches repeated queries in memory
+
+Dimension safety: a collection's vector size is fixed at creation, so
+memory_config puts non-1536 models in their own collection, and the
+embedder's real output size is checked against the configured one before
+anything is written: at startup for local models, which report their size,
+and on the first embedding for remote providers, so startup makes no API
+call. Cache entries are namespaced by model
+and size, so vectors of different models never mix.
+
+Usage:
+    python embeddings.py stats
+    python embeddings.py prune      # drop cached vectors of other models
+"""
+import argparse
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from memory_config import embedder_config, embedding_dims
+
+
+def embed_batch(embedder: Any, texts: List[str]) -> List[List[float]]:
+    """Embed many texts in one request when the embedder supports it."""
+    if hasattr(embedder, "embed_batch"):
+        return embedder.embed_batch(texts)
+    client = getattr(embedder, "client", None)
+    config = getattr(embedder, "config", None)
+    model = getattr(config, "model", None)
+    if client is not None and model:
+        request = {"input": [text.replace("\n", " ") for text in texts], "model": model}
+        # Same size as Mem0's own embed(), which shortens the vectors to embedding_dims
+        if getattr(config, "embedding_dims", None):
+            request["dimensions"] = config.embedding_dims
+        response = client.embeddings.create(**request)
+        return [item.embedding for item in response.data]
+    return [embedder.embed(text) for text in texts]
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-text calls into batched `encode(texts)` calls.
+
+    Callers block on a future. One worker thread takes the first waiting
+    text, collects more for up to `max_wait` seconds or `max_batch` texts,
+    and encodes them together.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], Sequence[Sequence[float]]], max_batch: int = 32, max_wait: float = 0.005):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                vectors = self.encode([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result([float(value) for value in vector])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+
+class BatchingEmbedder:
+    """Mem0 embedder proxy for a local sentence-transformers model with micro-batched inference."""
+
+    def __init__(self, embedder: Any, max_batch: int = 32, max_wait: float = 0.005):
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.batcher = MicroBatcher(self.embed_batch, max_batch, max_wait)
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        return self.batcher.embed(text)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.model.encode(texts, batch_size=self.max_batch, convert_to_numpy=True).tolist()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embedder, name)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.batcher.stats()
+
+
+class EmbeddingDiskCache:
+    """Content-addressed float32 vectors in an SQLite file, keyed by sha256(namespace, text).
+
+    `namespace` identifies the model and vector size; vectors whose length
+    is not `dims` are refused.
+    """
+
+    def __init__(self, path: str, namespace: str, dims: int):
+        self.path = path
+        self.namespace = namespace
+        self.dims = dims
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, namespace TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, List[float]]:
+        keys = {self.key(text): text for text in texts}
+        found: Dict[str, List[float]] = {}
+        items = list(keys)
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, data in rows:
+                    vector = array("f")
+                    vector.frombytes(data)
+                    if len(vector) == self.dims:
+                        found[keys[key]] = vector.tolist()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, Sequence[float]]):
+        for text, vector in vectors.items():
+            if len(vector) != self.dims:
+                raise ValueError(f"Refusing to cache a {len(vector)}-dim vector in a {self.dims}-dim namespace ({self.namespace})")
+        rows = [(self.key(text), self.namespace, array("f", vector).tobytes()) for text, vector in vectors.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, namespace, vector) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def namespaces(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT namespace, count(*) FROM embeddings GROUP BY namespace").fetchall())
+
+    def prune(self) -> int:
+        """Delete the vectors of every other namespace."""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM embeddings WHERE namespace != ?", (self.namespace,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+class DiskCachedEmbedder:
+    """Mem0 embedder proxy that reads and writes vectors through an EmbeddingDiskCache.
+
+    The providers configured here embed the same way for add and search, so
+    Mem0's memory_action argument is not part of the key. Search queries are
+    embedded directly: they rarely repeat across restarts, and a read plus a
+    committed insert on every turn costs more than it saves.
+    """
+
+    def __init__(self, embedder: Any, cache: EmbeddingDiskCache):
+        self.embedder = embedder
+        self.cache = cache
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        if memory_action == "search":
+            return self.embedder.embed(text, memory_action)
+        cached = self.cache.get_many([text]).get(text)
+        if cached is not None:
+            return cached
+        vector = self.embedder.embed(text, memory_action)
+        self.cache.put_many({text: vector})
+        return vector
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        found = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+        if missing:
+            vectors = dict(zip(missing, embed_batch(self.embedder, missing)))
+            self.cache.put_many(vectors)
+            found.update(vectors)
+        return [found[text] for text in texts]
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embedder, name)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"disk_cache": self.cache.stats()}
+        if hasattr(self.embedder, "stats"):
+            stats["batching"] = self.embedder.stats()
+        return stats
+
+
+class DimensionCheckedEmbedder:
+    """Mem0 embedder proxy that checks the size of the first vector it returns.
+
+    Used for remote providers, whose output size is only known from a real
+    embedding; the check runs once, before that vector reaches a cache or
+    the collection.
+    """
+
+    def __init__(self, embedder: Any, dims: int):
+        self.embedder = embedder
+        self.dims = dims
+        self.verified = False
+
+    def embed(self, text: str, memory_action: Optional[str] = None) -> List[float]:
+        return self._check([self.embedder.embed(text, memory_action)])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self._check(embed_batch(self.embedder, texts))
+
+    def _check(self, vectors: List[List[float]]) -> List[List[float]]:
+        if not self.verified and vectors:
+            check_dimension(len(vectors[0]), self.dims)
+            self.verified = True
+        return vectors
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embedder, name)
+
+
+def cache_namespace(dims: int) -> str:
+    config = embedder_config()
+    return f"{config['provider']}:{config['config']['model']}:{dims}"
+
+
+def check_dimension(actual: int, dims: int):
+    """Fail before anything is written if the model's vectors do not fit the collection."""
+    if actual != dims:
+        raise RuntimeError(
+            f"Embedding model returns {actual}-dim vectors but the memory collection expects {dims}; "
+            f"set EMBEDDING_DIMS={actual} (a collection for that size is used automatically)"
+        )
+
+
+def install_embedder(memory: Any, dims: Optional[int] = None) -> Any:
+    """Wrap memory.embedding_model with a dimension check, micro-batching (local models) and the disk cache."""
+    dims = dims or embedding_dims()
+    embedder = memory.embedding_model
+    model = getattr(embedder, "model", None)
+    if hasattr(model, "get_sentence_embedding_dimension"):
+        check_dimension(model.get_sentence_embedding_dimension(), dims)
+    else:
+        embedder = DimensionCheckedEmbedder(embedder, dims)
+    if hasattr(model, "encode"):
+        embedder = BatchingEmbedder(
+            embedder,
+            max_batch=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            max_wait=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")) / 1000
+        )
+    path = os.getenv("EMBEDDING_CACHE_PATH", "")
+    if path:
+        embedder = DiskCachedEmbedder(embedder, EmbeddingDiskCache(path, cache_namespace(dims), dims))
+    memory.embedding_model = embedder
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["stats", "prune"])
+    parser.add_argument("--path", default=None, help="cache file (default EMBEDDING_CACHE_PATH)")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    dims = embedding_dims()
+    cache = EmbeddingDiskCache(args.path or os.getenv("EMBEDDING_CACHE_PATH") or "embeddings.sqlite3", cache_namespace(dims), dims)
+    if args.action == "prune":
+        print(f"Deleted {cache.prune()} vectors of other models")
+    for namespace, count in sorted(cache.namespaces().items()):
+        marker = " (current)" if namespace == cache.namespace else ""
+        print(f"{namespace}: {count:,} vectors{marker}")
+    print(f"File size: {cache.stats()['file_bytes']:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
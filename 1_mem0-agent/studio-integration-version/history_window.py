@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken, or estimates ~4 characters per token if it is unavailable."""
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return max(1, len(text) // 4)
+
+
+def message_tokens(row: Dict[str, Any], counter: TokenCounter) -> int:
+    """Token count of a stored message, using the count cached in its data when present."""
+    message = row["message"]
+    cached = (message.get("data") or {}).get("token_count")
+    if isinstance(cached, int):
+        return cached
+    return counter.count(message["content"])
+
+
+def build_window(
+    rows: List[Dict[str, Any]],
+    budget: int,
+    counter: TokenCounter,
+    covered_until_id: int = 0,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split chronological history rows into the window sent to the agent and the rows left out.
+
+    The window is the longest run of newest messages that fits the token
+    budget. Rows already folded into the session summary (id <= covered_until_id)
+    are neither sent nor returned as dropped.
+    """
+    rows = [row for row in rows if row.get("id", 0) > covered_until_id]
+    used = 0
+    start = len(rows)
+    for index in range(len(rows) - 1, -1, -1):
+        tokens = message_tokens(rows[index], counter)
+        if used + tokens > budget:
+            break
+        used += tokens
+        start = index
+    return rows[start:], rows[:start]
+
+
+class SessionSummaryStore:
+    """Rolling per-session summaries of turns that no longer fit the history window.
+
+    Backed by the session_summaries table (migrations/002_session_summaries.sql).
+    """
+
+    def __init__(self, client_getter, table: str = "session_summaries"):
+        self.client_getter = client_getter
+        self.table = table
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        response = await self.client_getter().table(self.table) \
+            .select("session_id, summary, covered_until_id, token_count") \
+            .eq("session_id", session_id) \
+            .limit(1) \
+            .execute()
+        return response.data[0] if response.data else None
+
+    async def save(self, session_id: str, summary: str, covered_until_id: int, token_count: int):
+        await self.client_getter().table(self.table).upsert({
+            "session_id": session_id,
+            "summary": summary,
+            "covered_until_id": covered_until_id,
+            "token_count": token_count,
+            # The column default only applies on insert, so an update must set it
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }).execute()
+
+
+def format_transcript(rows: List[Dict[str, Any]]) -> str:
+    """Render stored messages as a plain transcript for the summarizer."""
+    lines = []
+    for row in rows:
+        message = row["message"]
+        speaker = "User" if message["type"] == "human" else "Assistant"
+        lines.append(f"{speaker}: {message['content']}")
+    return "\n".join(lines)
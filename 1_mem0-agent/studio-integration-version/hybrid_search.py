@@ -0,0 +1,281 @@
+"""Hybrid memory retrieval: an in-process BM25 keyword index fused with vector search.
+
+Entity and date questions ("When did Caroline go to the LGBTQ support
+group?") hinge on exact tokens that embeddings blur. Each user's memories
+are kept in a BM25 inverted index next to the vector store, and the two
+ranked lists are merged with reciprocal-rank fusion, so no extra LLM or
+embedding calls are made.
+
+The index is loaded lazily per user from the vector store and then kept up
+to date by KeywordIndexedStore, which mirrors every insert, update and
+delete Mem0 (or bulk ingestion) makes.
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from vector_index import fetch_user_records, user_collection
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her his how i in is it its "
+    "me my of on or our she so that the their them they this to was we were what when where which "
+    "who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Incrementally maintained BM25 index over one user's memories."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.texts: Dict[str, str] = {}
+        self._total_length = 0
+
+    def add(self, doc_id: str, text: str):
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.lengths[doc_id] = sum(terms.values())
+        self.texts[doc_id] = text
+        self._total_length += self.lengths[doc_id]
+
+    def remove(self, doc_id: str):
+        if doc_id not in self.lengths:
+            return
+        for term in set(tokenize(self.texts[doc_id])):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self._total_length -= self.lengths.pop(doc_id)
+        del self.texts[doc_id]
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        if not self.lengths:
+            return []
+        docs = len(self.lengths)
+        average = self._total_length / docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+
+class KeywordIndex:
+    """BM25 indexes for recently searched users, loaded on demand.
+
+    `loader(user_id)` returns (memory id, text) pairs for a user. At most
+    `max_users` indexes are kept, evicting the least recently searched.
+    A cold user is loaded outside the index lock, so other users' searches
+    and writes do not wait for it; concurrent searches for the same user
+    share one load, and writes made during the load are applied to its
+    result. `invalidate` drops users whose memories changed in another
+    process.
+    """
+
+    def __init__(self, loader: Callable[[str], List[Tuple[str, str]]], max_users: int = 1000):
+        self.loader = loader
+        self.max_users = max_users
+        self._users: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._owners: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        # Users being loaded: the shared load, and the writes that arrived meanwhile
+        self._loading: Dict[str, Future] = {}
+        self._pending: Dict[str, List[Tuple[str, str, str]]] = {}
+        self.loads = 0
+
+    def search(self, user_id: str, query: str, limit: int) -> List[Tuple[str, float, str]]:
+        """(memory id, BM25 score, text) of the best keyword matches for a user."""
+        index = self._index(user_id)
+        with self._lock:
+            return [(doc_id, score, index.texts[doc_id]) for doc_id, score in index.search(query, limit)]
+
+    def upsert(self, user_id: str, memory_id: str, text: str):
+        with self._lock:
+            if user_id in self._pending:
+                self._pending[user_id].append(("upsert", memory_id, text))
+            index = self._users.get(user_id)
+            if index is not None:
+                index.add(memory_id, text)
+                self._owners[memory_id] = user_id
+
+    def delete(self, memory_id: str):
+        with self._lock:
+            # The owner of a memory is unknown until its user is loaded
+            for pending in self._pending.values():
+                pending.append(("delete", memory_id, ""))
+            user_id = self._owners.pop(memory_id, None)
+            if user_id in self._users:
+                self._users[user_id].remove(memory_id)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop a user's index (everyone's with None), so the next search reloads it."""
+        with self._lock:
+            users = list(self._users) if user_id is None else [user_id]
+            for user in users:
+                index = self._users.pop(user, None)
+                if index is not None:
+                    for memory_id in index.lengths:
+                        self._owners.pop(memory_id, None)
+            # A load already running may have read the old rows
+            for user, pending in self._pending.items():
+                if user_id is None or user == user_id:
+                    pending.append(("reload", "", ""))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._users),
+            "max_users": self.max_users,
+            "documents": sum(len(index) for index in self._users.values()),
+            "loads": self.loads,
+        }
+
+    def _index(self, user_id: str) -> BM25Index:
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+                return index
+            future = self._loading.get(user_id)
+            if future is None:
+                future = self._loading[user_id] = Future()
+                self._pending[user_id] = []
+                loader = True
+            else:
+                loader = False
+        if not loader:
+            return future.result()
+        try:
+            index = BM25Index()
+            for memory_id, text in self.loader(user_id):
+                index.add(memory_id, text)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[user_id]
+                del self._pending[user_id]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[user_id]
+            stale = False
+            for action, memory_id, text in self._pending.pop(user_id):
+                if action == "upsert":
+                    index.add(memory_id, text)
+                elif action == "delete":
+                    index.remove(memory_id)
+                else:
+                    stale = True
+            self.loads += 1
+            # Invalidated while loading: serve this search from it, but do not keep it
+            if not stale:
+                for memory_id in index.lengths:
+                    self._owners[memory_id] = user_id
+                self._users[user_id] = index
+                while len(self._users) > self.max_users:
+                    _, evicted = self._users.popitem(last=False)
+                    for memory_id in evicted.lengths:
+                        self._owners.pop(memory_id, None)
+        future.set_result(index)
+        return index
+
+
+class KeywordIndexedStore:
+    """Mem0 vector store proxy that mirrors writes into the keyword index."""
+
+    def __init__(self, store: Any, index: KeywordIndex):
+        self.store = store
+        self.index = index
+
+    def insert(self, vectors, payloads=None, ids=None, **kwargs):
+        result = self.store.insert(vectors=vectors, payloads=payloads, ids=ids, **kwargs)
+        for payload, memory_id in zip(payloads or [], ids or []):
+            if payload.get("user_id") and payload.get("data"):
+                self.index.upsert(payload["user_id"], memory_id, payload["data"])
+        return result
+
+    def update(self, vector_id, vector=None, payload=None, **kwargs):
+        result = self.store.update(vector_id=vector_id, vector=vector, payload=payload, **kwargs)
+        if payload and payload.get("user_id") and payload.get("data"):
+            self.index.upsert(payload["user_id"], vector_id, payload["data"])
+        return result
+
+    def delete(self, vector_id, **kwargs):
+        result = self.store.delete(vector_id=vector_id, **kwargs)
+        self.index.delete(vector_id)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.store, name)
+
+
+def store_loader(store: Any) -> Callable[[str], List[Tuple[str, str]]]:
+    """Loader reading all of a user's memories from the vecs table behind a Mem0 vector store.
+
+    Stores without a vecs collection (other providers) are read through list().
+    """
+    def load(user_id: str) -> List[Tuple[str, str]]:
+        collection = user_collection(store, user_id)
+        if collection is not None:
+            records = fetch_user_records(collection, user_id)
+        else:
+            records = store.list(filters={"user_id": user_id}, limit=1000)[0]
+        return [(str(record.id), record.payload["data"]) for record in records if record.payload.get("data")]
+    return load
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """memory.search fused with BM25 keyword search over the same memories.
+
+    Both retrievers return `fetch_k` candidates; the fused top `limit` is
+    returned in Mem0's search result format with the RRF score as "score".
+    """
+
+    def __init__(self, memory: Any, index: KeywordIndex, fetch_k: int = 20, rrf_k: int = 60):
+        self.memory = memory
+        self.index = index
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+
+    def search(self, query: str, user_id: str, limit: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        fetch_k = max(self.fetch_k, limit)
+        vector_hits = self.memory.search(query=query, user_id=user_id, limit=fetch_k)["results"]
+        keyword_hits = self.index.search(user_id, query, fetch_k)
+        entries: Dict[str, Dict[str, Any]] = {entry["id"]: entry for entry in vector_hits}
+        for memory_id, _, text in keyword_hits:
+            entries.setdefault(memory_id, {"id": memory_id, "memory": text, "user_id": user_id})
+        fused = reciprocal_rank_fusion(
+            [[entry["id"] for entry in vector_hits], [memory_id for memory_id, _, _ in keyword_hits]],
+            k=self.rrf_k
+        )
+        return {"results": [{**entries[memory_id], "score": score} for memory_id, score in fused[:limit]]}
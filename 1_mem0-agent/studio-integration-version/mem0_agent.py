@@ -4,13 +4,16 @@ import asyncio
 import os
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
+from typing import Any, Dict, List, Optional
 
 import logfire
 from dotenv import load_dotenv
 
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai import Agent, ModelRetry, RunContext
+from pydantic_ai import Agent, ModelRetry
+from pydantic_ai.messages import ModelMessage, ModelRequest, SystemPromptPart
+
+from memory_cache import LRUTTLCache
 
 load_dotenv()
 llm = os.getenv('LLM_MODEL', 'gpt-4o-mini')
@@ -18,28 +21,81 @@ llm = os.getenv('LLM_MODEL', 'gpt-4o-mini')
 # 'if-token-present' means nothing will be sent (and the example will work) if you don't have logfire configured
 logfire.configure(send_to_logfire='if-token-present')
 
+# Kept byte-identical across requests so the provider can cache the prompt prefix;
+# anything that varies (date, memories) goes in the late context section instead
+STATIC_SYSTEM_PROMPT = 'You are a helpful AI. Answer the question based on query and memories.'
+
+# Rendered memory blocks keyed by (user_id, memory-set version, memory ids)
+memory_blocks = LRUTTLCache(maxsize=int(os.getenv("MEMORY_BLOCK_CACHE_SIZE", "1024")))
+
 
 @dataclass
 class Mem0Deps:
     memories: str
 
 
+def render_memories(entries: List[Dict[str, Any]], user_id: Optional[str] = None, version: Optional[int] = None) -> str:
+    """Render retrieved memories as the bullet list the agent sees.
+
+    With a user id and memory-set version the rendered block is cached, so the
+    same memories always produce the same bytes until the user's memories change.
+    """
+    key = None
+    if user_id is not None and version is not None:
+        key = (user_id, version, tuple(entry.get("id") for entry in entries))
+        cached = memory_blocks.get(key)
+        if cached is not None:
+            return cached
+    block = "\n".join(f"- {entry['memory']}" for entry in entries)
+    if key is not None:
+        memory_blocks.set(key, block)
+    return block
+
+
+def context_prompt(deps: Mem0Deps) -> str:
+    """The per-request part of the system prompt: today's date and the user's memories."""
+    return f'The current date is: {datetime.now().strftime("%Y-%m-%d")}\nUser Memories:\n{deps.memories}'
+
+
 mem0_agent = Agent(
     OpenAIModel(llm),
-    system_prompt=f'You are a helpful AI. Answer the question based on query and memories. The current date is: {datetime.now().strftime("%Y-%m-%d")}',
+    system_prompt=STATIC_SYSTEM_PROMPT,
     deps_type=Mem0Deps,
     retries=2
 )
 
-@mem0_agent.system_prompt  
-def add_memories(ctx: RunContext[str]) -> str:
-    return f"\nUser Memories:\n{ctx.deps.memories}"
+def build_message_history(history: List[ModelMessage], deps: Mem0Deps) -> List[ModelMessage]:
+    """Assemble the full prompt for a run, with or without conversation history.
+
+    This is the only place the date and memories enter the prompt; pass the
+    result as message_history on every run. pydantic-ai only adds the agent's
+    system prompts when there is no message history, so they are placed
+    explicitly: the static prompt first, then the history (itself append-only
+    between turns), then the date and memories, which change per request,
+    just before the new user prompt.
+    """
+    return [
+        ModelRequest(parts=[SystemPromptPart(content=STATIC_SYSTEM_PROMPT)]),
+        *history,
+        ModelRequest(parts=[SystemPromptPart(content=context_prompt(deps))]),
+    ]
+
+# Folds turns that no longer fit the history window into a rolling session summary
+summary_agent = Agent(
+    OpenAIModel(llm),
+    system_prompt=(
+        'Update the running summary of a conversation with the new transcript lines. '
+        'Keep names, dates, decisions, preferences and open questions; drop small talk. '
+        'Reply with the updated summary only, in at most 150 words.'
+    ),
+    retries=2
+)
 
 async def main():
     deps = Mem0Deps(memories="")
     
     result = await mem0_agent.run(
-        'Greetings!', deps=deps
+        'Greetings!', deps=deps, message_history=build_message_history([], deps)
     )
     
     print('Response:', result.data)
@@ -1,30 +1,200 @@
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Security, Depends
+from typing import List, Optional, Dict, Any, Callable, Literal
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Security, Depends, Response
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
+from fastapi.responses import StreamingResponse
+from supabase import acreate_client, AsyncClient
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from pathlib import Path
 from mem0 import Memory
-import httpx
+import asyncio
+import base64
+import json
+import time
 import sys
 import os
+import uuid
 
 from pydantic_ai.messages import (
     ModelRequest,
     ModelResponse,
     UserPromptPart,
+    SystemPromptPart,
     TextPart
 )
 
-from mem0_agent import mem0_agent, Mem0Deps
+from mem0_agent import mem0_agent, summary_agent, Mem0Deps, build_message_history, render_memories
+from memory_queue import MemoryWriteQueue
+from message_writer import MessageWriter
+from blocking_io import run_blocking, shutdown_executor
+from pipeline import StageTimings, run_stage
+from telemetry import configure_tracing, tracer
+from db_pool import AsyncPool, MessageStore, PoolSettings, listen_memory_changed, pool_metrics, pool_stats
+from memory_config import embedder_config, embedding_dims, mem0_config
+from memory_stack import MemoryStack, with_caches
+from consolidation import Consolidator
+from memory_tiers import AccessTracker
+from bulk_ingest import BulkIngestor, Checkpoint, IngestItem
+from history_window import TokenCounter, SessionSummaryStore, build_window, format_transcript, message_tokens
 
 # Load environment variables
 load_dotenv()
 
+# Spans for every stage of a turn, with HDR histograms served at /metrics (see telemetry.py)
+configure_tracing()
+
+# Per-stage timeouts (seconds) for the parts of a chat turn the agent can do without
+HISTORY_TIMEOUT = float(os.getenv("HISTORY_TIMEOUT", "2"))
+STORE_MESSAGE_TIMEOUT = float(os.getenv("STORE_MESSAGE_TIMEOUT", "2"))
+MEMORY_SEARCH_TIMEOUT = float(os.getenv("MEMORY_SEARCH_TIMEOUT", "3"))
+NO_MEMORIES = "(No memories available)"
+
+# History sent to the agent is the newest messages that fit this many tokens
+HISTORY_FETCH_LIMIT = int(os.getenv("HISTORY_FETCH_LIMIT", "30"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+# Older turns can be folded into a rolling per-session summary (one extra LLM call per fold)
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() == "true"
+HISTORY_SUMMARY_MIN_TOKENS = int(os.getenv("HISTORY_SUMMARY_MIN_TOKENS", "500"))
+token_counter = TokenCounter(os.getenv('LLM_MODEL', 'gpt-4o-mini'))
+
+async def write_memory(user_id: str, messages: List[Dict[str, str]]):
+    """Extract and store memories for a conversation turn, then merge any new near duplicates."""
+    with tracer.span("memory_add"):
+        if memory_stack is not None:
+            await run_blocking(memory_stack.write, messages, user_id, CONSOLIDATION_ENABLED)
+        else:
+            await run_blocking(memory.add, messages, user_id=user_id)
+
+# Background memory ingestion, so memory.add stays out of the request path
+memory_queue = MemoryWriteQueue(
+    write_memory,
+    workers=int(os.getenv("MEMORY_QUEUE_WORKERS", "4")),
+    maxsize=int(os.getenv("MEMORY_QUEUE_MAXSIZE", "1000")),
+    max_retries=int(os.getenv("MEMORY_QUEUE_RETRIES", "3"))
+)
+
+async def update_summary(session_id: str, rows: List[Dict[str, Any]]):
+    """Fold turns that fell out of the history window into the session's rolling summary."""
+    current = await summary_store.get(session_id)
+    covered_until_id = current["covered_until_id"] if current else 0
+    new_rows = [row for row in rows if row["id"] > covered_until_id]
+    if not new_rows:
+        return
+    result = await summary_agent.run(
+        f"Current summary:\n{current['summary'] if current else '(none)'}\n\n"
+        f"New transcript lines:\n{format_transcript(new_rows)}"
+    )
+    await summary_store.save(
+        session_id,
+        result.data,
+        covered_until_id=new_rows[-1]["id"],
+        token_count=token_counter.count(result.data)
+    )
+
+# Summaries are keyed by session, so folds for one session never run concurrently
+summary_queue = MemoryWriteQueue(
+    update_summary,
+    workers=int(os.getenv("SUMMARY_QUEUE_WORKERS", "2")),
+    maxsize=int(os.getenv("SUMMARY_QUEUE_MAXSIZE", "200")),
+    name="summary"
+)
+
+# Supabase async client, created on startup so PostgREST calls never block the event loop
+supabase: Optional[AsyncClient] = None
+summary_store = SessionSummaryStore(lambda: supabase)
+
+# The messages table read and written directly over a pooled asyncpg connection (see db_pool.py);
+# MESSAGES_BACKEND=supabase, or a failure to connect, keeps it on PostgREST
+MESSAGES_BACKEND = os.getenv("MESSAGES_BACKEND", "postgres")
+message_store: Optional[MessageStore] = None
+
+async def insert_messages(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert a batch of messages rows with one statement (or one PostgREST call) and return them as stored."""
+    if message_store is not None:
+        return await message_store.insert_many(rows)
+    response = await supabase.table("messages").insert(rows).execute()
+    return response.data
+
+# Group commit: concurrent message inserts share one multi-row statement (see message_writer.py)
+MESSAGE_GROUP_COMMIT = os.getenv("MESSAGE_GROUP_COMMIT", "true").lower() == "true"
+message_writer = MessageWriter(
+    insert_messages,
+    max_rows=int(os.getenv("MESSAGE_BATCH_MAX_ROWS", "100")),
+    max_delay=float(os.getenv("MESSAGE_BATCH_MAX_DELAY_MS", "5")) / 1000
+)
+
+# Write-time memory consolidation (incremental after memory.add, plus periodic compaction)
+CONSOLIDATION_ENABLED = os.getenv("CONSOLIDATION_ENABLED", "false").lower() == "true"
+CONSOLIDATION_INTERVAL = float(os.getenv("CONSOLIDATION_INTERVAL", "600"))
+
+async def compaction_loop():
+    """Periodically re-cluster the memories of users written to since their last pass."""
+    while True:
+        await asyncio.sleep(CONSOLIDATION_INTERVAL)
+        if consolidator is None:
+            continue
+        reports = await run_blocking(consolidator.compact, int(os.getenv("CONSOLIDATION_MAX_USERS", "50")))
+        if reports:
+            print(f"Compaction merged {sum(report['removed'] for report in reports)} memories for {len(reports)} users")
+
+async def access_flush_loop():
+    """Write buffered memory hit counts to memory_access."""
+    while True:
+        await asyncio.sleep(float(os.getenv("MEMORY_ACCESS_FLUSH_INTERVAL", "30")))
+        try:
+            await run_blocking(access_tracker.flush)
+        except Exception as e:
+            print(f"Error flushing memory access stats: {str(e)}")
+
+def on_memory_changed(user_id: Optional[str]):
+    """A tiering or consolidation job changed a user's memories in another process."""
+    detach(run_blocking(memory_stack.invalidate, user_id))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global supabase, message_store
+    supabase = await acreate_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_SERVICE_KEY")
+    )
+    if MESSAGES_BACKEND == "postgres":
+        try:
+            message_store = MessageStore(await AsyncPool.connect(os.environ["DATABASE_URL"], PoolSettings.from_env()))
+        except Exception as e:
+            print(f"Direct Postgres messages disabled, using PostgREST: {str(e)}")
+    if MESSAGE_GROUP_COMMIT:
+        await message_writer.start()
+    await memory_queue.start()
+    await summary_queue.start()
+    compaction = asyncio.create_task(compaction_loop()) if CONSOLIDATION_ENABLED else None
+    access_flush = asyncio.create_task(access_flush_loop()) if access_tracker is not None else None
+    invalidations = asyncio.create_task(listen_memory_changed(os.environ["DATABASE_URL"], on_memory_changed)) \
+        if memory_stack is not None and os.getenv("DATABASE_URL") else None
+    yield
+    if invalidations is not None:
+        invalidations.cancel()
+    # Bulk upserts run on the memory queue, so the jobs stop before it drains
+    await stop_bulk_jobs(timeout=float(os.getenv("BULK_INGEST_DRAIN_TIMEOUT", "10")))
+    if compaction is not None:
+        compaction.cancel()
+    if access_flush is not None:
+        access_flush.cancel()
+        await run_blocking(access_tracker.flush)
+    await memory_queue.drain(timeout=float(os.getenv("MEMORY_QUEUE_DRAIN_TIMEOUT", "30")))
+    await summary_queue.drain(timeout=float(os.getenv("MEMORY_QUEUE_DRAIN_TIMEOUT", "30")))
+    if memory_stack is not None:
+        memory_stack.shutdown()
+    shutdown_executor()
+    # Queued messages are written before the pool closes
+    await message_writer.drain(timeout=float(os.getenv("MESSAGE_WRITER_DRAIN_TIMEOUT", "10")))
+    if message_store is not None:
+        await message_store.pool.close()
+    tracer.shutdown()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 security = HTTPBearer()
 
 app.add_middleware(
@@ -35,32 +205,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Supabase setup
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_SERVICE_KEY")
-)
-
 # Mem0 Setup
-config = {
-    "llm": {
-        "provider": "openai",
-        "config": {
-            "model": os.getenv('LLM_MODEL', 'gpt-4o-mini')
-        }
-    },
-    "vector_store": {
-        "provider": "supabase",
-        "config": {
-            "connection_string": os.environ['DATABASE_URL'],
-            "collection_name": "memories_api_new",
-            "embedding_model_dims": 1536
-        }
-    }    
-}
+config = mem0_config()
+
+# The Mem0 instance with its storage wrappers and retrieval chain (see memory_stack.py)
+memory_stack: Optional[MemoryStack] = None
+# The retrieval chain used for each turn: memory.search, optionally wrapped by retrieval stages
+memory_search: Optional[Callable[..., Dict[str, Any]]] = None
+consolidator: Optional[Consolidator] = None
+access_tracker: Optional[AccessTracker] = None
 
 try:
-    memory = Memory.from_config(config)
+    memory_stack = MemoryStack(Memory.from_config(config))
+    memory = memory_stack.memory
+    memory_search = memory_stack.search
+    consolidator = memory_stack.consolidator
+    access_tracker = memory_stack.access_tracker
     print(f"Successfully created collection with config: {config}")
 except Exception as e:
     print(f"Failed to create collection: {str(e)}")
@@ -74,7 +234,7 @@ except Exception as e:
                 }
             }
         }
-        memory = Memory.from_config(alt_config)
+        memory = with_caches(Memory.from_config(alt_config))
         print("Using fallback in-memory storage")
     except Exception as e2:
         print(f"Failed to create fallback memory: {str(e2)}")
@@ -89,6 +249,24 @@ class AgentRequest(BaseModel):
 
 class AgentResponse(BaseModel):
     success: bool
+    reply: Optional[str] = None
+    user_message_id: Optional[int] = None
+    ai_message_id: Optional[int] = None
+    cursor: Optional[str] = None
+
+class BulkIngestConversation(BaseModel):
+    user_id: str
+    messages: List[Dict[str, str]]
+    key: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+
+class BulkIngestRequest(BaseModel):
+    conversations: List[BulkIngestConversation]
+    mode: Literal["extract", "raw"] = "extract"
+
+class ConsolidateRequest(BaseModel):
+    user_id: str
+    dry_run: bool = True
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> bool:
     """Verify the bearer token against environment variable."""
@@ -105,133 +283,500 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Security(security))
         )
     return True    
 
-async def fetch_conversation_history(session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-    """Fetch the most recent conversation history for a session."""
+# Only the columns the API returns, rather than select("*")
+HISTORY_COLUMNS = "id, created_at, session_id, message"
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque history cursor pointing at a stored message row."""
+    raw = json.dumps([row["created_at"], row["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """Return the (created_at, id) pair encoded in a history cursor."""
+    try:
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"Invalid history cursor: {cursor}")
+
+async def fetch_conversation_history(session_id: str, limit: int = 10, before: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetch the most recent conversation history for a session, or the page older than `before`.
+
+    Pages are keyset-paginated on (session_id, created_at, id), which the
+    idx_messages_session_created_id index serves at the same cost at any depth.
+    """
+    created_at, message_id = decode_cursor(before) if before else (None, None)
     try:
-        response = supabase.table("messages") \
-            .select("*") \
-            .eq("session_id", session_id) \
-            .order("created_at", desc=True) \
-            .limit(limit) \
-            .execute()
-        
+        if message_store is not None:
+            rows = await message_store.history(session_id, limit, created_at, message_id)
+        else:
+            query = supabase.table("messages") \
+                .select(HISTORY_COLUMNS) \
+                .eq("session_id", session_id)
+            if before:
+                # The lte bound is the index range condition; the or_ filter only breaks created_at ties on id
+                query = query \
+                    .lte("created_at", created_at) \
+                    .or_(f'created_at.lt."{created_at}",id.lt.{message_id}')
+            response = await query \
+                .order("created_at", desc=True) \
+                .order("id", desc=True) \
+                .limit(limit) \
+                .execute()
+            rows = response.data
+
         # Convert to list and reverse to get chronological order
-        messages = response.data[::-1]
+        messages = rows[::-1]
         return messages
     except Exception as e:
         print(f"Error fetching conversation history: {str(e)}")
         return []
 
-async def store_message(session_id: str, message_type: str, content: str, data: Optional[Dict] = None):
-    """Store a message in the Supabase messages table."""
+async def fetch_messages_after(session_id: str, cursor: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """Fetch messages stored after the cursor, in chronological order."""
+    created_at, message_id = decode_cursor(cursor)
+    if message_store is not None:
+        return await message_store.after(session_id, created_at, message_id, limit)
+    response = await supabase.table("messages") \
+        .select(HISTORY_COLUMNS) \
+        .eq("session_id", session_id) \
+        .gte("created_at", created_at) \
+        .or_(f'created_at.gt."{created_at}",id.gt.{message_id}') \
+        .order("created_at") \
+        .order("id") \
+        .limit(limit) \
+        .execute()
+    return response.data
+
+async def store_message(session_id: str, message_type: str, content: str, data: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+    """Store a message in the messages table and return the stored row.
+
+    The insert is batched with those of concurrent requests (group commit);
+    the row is returned once its batch has committed. The message's token
+    count is cached in its data for the history window builder.
+    """
     message_obj = {
         "type": message_type,
-        "content": content
+        "content": content,
+        "data": {**(data or {}), "token_count": token_counter.count(content)}
     }
-    if data:
-        message_obj["data"] = data
 
     try:
-        supabase.table("messages").insert({
-            "session_id": session_id,
-            "message": message_obj
-        }).execute()
+        row = await message_writer.write(session_id, message_obj)
         print(f"Stored message: {message_type} - {content[:30]}...")
+        return row
     except Exception as e:
         print(f"Failed to store message: {str(e)}")
+        return None
+
+async def search_memories(query: str, user_id: str, limit: int = 3) -> str:
+    """Retrieve relevant memories through the configured retrieval chain and format them for the agent."""
+    version = memory.version(user_id)
+    relevant_memories = await run_blocking(memory_search or memory.search, query, user_id, limit)
+    return render_memories(relevant_memories["results"], user_id, version)
+
+async def fetch_summary(session_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch the rolling summary of a session's older turns, if summaries are enabled."""
+    if not HISTORY_SUMMARY_ENABLED:
+        return None
+    return await summary_store.get(session_id)
+
+def without_current_query(conversation_history: List[Dict[str, Any]], request_id: str) -> List[Dict[str, Any]]:
+    """Drop the row holding this turn's query.
+
+    The current query is stored concurrently with the history read, so a row
+    tagged with this request's id is skipped rather than sent to the agent twice.
+    """
+    return [
+        msg for msg in conversation_history
+        if not (msg["message"]["type"] == "human" and (msg["message"].get("data") or {}).get("request_id") == request_id)
+    ]
+
+def to_model_messages(conversation_history: List[Dict[str, Any]], summary: Optional[Dict[str, Any]] = None) -> List:
+    """Convert stored messages to the format expected by the agent."""
+    messages = []
+    if summary:
+        messages.append(ModelRequest(parts=[SystemPromptPart(content=f"Summary of the earlier conversation:\n{summary['summary']}")]))
+    for msg in conversation_history:
+        msg_data = msg["message"]
+        msg_type = msg_data["type"]
+        msg_content = msg_data["content"]
+        msg = ModelRequest(parts=[UserPromptPart(content=msg_content)]) if msg_type == "human" else ModelResponse(parts=[TextPart(content=msg_content)])
+        messages.append(msg)
+    return messages
+
+def build_history(request: AgentRequest, rows: List[Dict[str, Any]], summary: Optional[Dict[str, Any]]) -> List:
+    """Fit the session's history into the token budget, queueing a summary fold for what is left out."""
+    budget = HISTORY_TOKEN_BUDGET - (summary["token_count"] if summary else 0)
+    covered_until_id = summary["covered_until_id"] if summary else 0
+    window, dropped = build_window(rows, budget, token_counter, covered_until_id)
+    if HISTORY_SUMMARY_ENABLED and dropped:
+        if sum(message_tokens(row, token_counter) for row in dropped) >= HISTORY_SUMMARY_MIN_TOKENS:
+            summary_queue.submit(request.session_id, dropped)
+    return to_model_messages(window, summary)
+
+async def prepare_turn(request: AgentRequest, timings: StageTimings):
+    """Load history, store the user's query and search memories for one chat turn."""
+    # History read, user-message write and memory search are independent, so run them together
+    conversation_history, summary, user_row, memories_str = await asyncio.gather(
+        run_stage("history", fetch_conversation_history(request.session_id, HISTORY_FETCH_LIMIT), timings,
+                  timeout=HISTORY_TIMEOUT, default=[]),
+        run_stage("summary", fetch_summary(request.session_id), timings,
+                  timeout=HISTORY_TIMEOUT, default=None),
+        # Shielded: on timeout the turn stops waiting, but the insert still completes
+        run_stage("store_user_message", asyncio.shield(store_message(
+            session_id=request.session_id,
+            message_type="human",
+            content=request.query,
+            data={"request_id": request.request_id}
+        )), timings, timeout=STORE_MESSAGE_TIMEOUT),
+        run_stage("memory_search", search_memories(request.query, request.user_id), timings,
+                  timeout=MEMORY_SEARCH_TIMEOUT, default=NO_MEMORIES)
+    )
+    history = build_history(request, without_current_query(conversation_history, request.request_id), summary)
+    deps = Mem0Deps(
+        memories=memories_str or NO_MEMORIES
+    )
+    return build_message_history(history, deps), deps, user_row
+
+async def finish_turn(request: AgentRequest, reply: str, timings: StageTimings,
+                      interrupted: bool = False) -> Optional[Dict[str, Any]]:
+    """Store the agent's reply, queue the memory update for the turn and return the stored row.
+
+    `interrupted` marks a partial reply whose stream the client disconnected from.
+    """
+    data = {"request_id": request.request_id}
+    if interrupted:
+        data["interrupted"] = True
+    with timings.measure("store_ai_message"):
+        ai_row = await store_message(
+            session_id=request.session_id,
+            message_type="ai",
+            content=reply,
+            data=data
+        )
+
+    # Queue a memory update based on the last user message and agent response
+    memory_messages = [
+        {"role": "user", "content": request.query},
+        {"role": "assistant", "content": reply}
+    ]
+    memory_queue.submit(request.user_id, memory_messages, trace=timings.span)
+    return ai_row
+
+def turn_result(reply: str, user_row: Optional[Dict[str, Any]], ai_row: Optional[Dict[str, Any]]) -> AgentResponse:
+    """Describe a completed turn so clients can append it without re-reading history."""
+    return AgentResponse(
+        success=True,
+        reply=reply,
+        user_message_id=user_row["id"] if user_row else None,
+        ai_message_id=ai_row["id"] if ai_row else None,
+        cursor=encode_cursor(ai_row) if ai_row else None
+    )
+
+async def store_error(request: AgentRequest, error: Exception):
+    """Store an apology in the conversation when a turn fails."""
+    print(f"Error processing agent request: {str(error)}")
+    await store_message(
+        session_id=request.session_id,
+        message_type="ai",
+        content="I apologize, but I encountered an error processing your request.",
+        data={"error": str(error), "request_id": request.request_id}
+    )
+
+# Work that outlives the request that started it (kept referenced until done)
+detached_tasks: set = set()
+
+def detach(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    detached_tasks.add(task)
+    task.add_done_callback(detached_tasks.discard)
+    return task
+
+async def finish_interrupted_turn(request: AgentRequest, reply: str, timings: StageTimings):
+    """Store the part of a streamed reply sent before the client disconnected, and queue its memory write."""
+    try:
+        await finish_turn(request, reply, timings, interrupted=True)
+    except Exception as e:
+        print(f"Error storing interrupted reply: {str(e)}")
+    finally:
+        timings.finish()
+        print(f"Stage timings [{request.request_id}]: {timings.summary()}")
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.post("/api/mem0-agent", response_model=AgentResponse)
 async def web_search(
     request: AgentRequest,
+    response: Response,
     authenticated: bool = Depends(verify_token)
 ):
+    timings = StageTimings(request.request_id)
     try:
-        # Fetch conversation history
-        conversation_history = await fetch_conversation_history(request.session_id)
-        
-        # Convert conversation history to format expected by agent
-        messages = []
-        for msg in conversation_history:
-            msg_data = msg["message"]
-            msg_type = msg_data["type"]
-            msg_content = msg_data["content"]
-            msg = ModelRequest(parts=[UserPromptPart(content=msg_content)]) if msg_type == "human" else ModelResponse(parts=[TextPart(content=msg_content)])
-            messages.append(msg)
-
-        # Store user's query
-        await store_message(
-            session_id=request.session_id,
-            message_type="human",
-            content=request.query
-        )       
+        messages, deps, user_row = await prepare_turn(request, timings)
 
-        # Retrieve relevant memories with Mem0
-        try:
-            relevant_memories = memory.search(query=request.query, user_id=request.user_id, limit=3)
-            memories_str = "\n".join(f"- {entry['memory']}" for entry in relevant_memories["results"])
-        except Exception as e:
-            print(f"Error retrieving memories: {str(e)}")
-            memories_str = "(No memories available)"
-
-        # Initialize agent dependencies
-        async with httpx.AsyncClient() as client:
-            deps = Mem0Deps(
-                memories=memories_str
-            )
-
-            # Run the agent with conversation history
+        # Run the agent with conversation history
+        with timings.measure("agent"):
             result = await mem0_agent.run(
                 request.query,
                 message_history=messages,
                 deps=deps
             )
 
-        # Store agent's response
-        await store_message(
-            session_id=request.session_id,
-            message_type="ai",
-            content=result.data,
-            data={"request_id": request.request_id}
-        )
+        ai_row = await finish_turn(request, result.data, timings)
+        return turn_result(result.data, user_row, ai_row)
+
+    except Exception as e:
+        timings.status = "error"
+        await store_error(request, e)
+        return AgentResponse(success=False)
+
+    finally:
+        timings.finish()
+        response.headers["Server-Timing"] = timings.server_timing()
+        print(f"Stage timings [{request.request_id}]: {timings.summary()}")
 
-        # Update memories based on the last user message and agent response
+@app.post("/api/mem0-agent/stream")
+async def web_search_stream(
+    request: AgentRequest,
+    authenticated: bool = Depends(verify_token)
+):
+    """Stream the agent's reply as Server-Sent Events.
+
+    Emits `token` events with text deltas as the model produces them, then a
+    `done` event with the stored reply and message ids, or an `error` event.
+    If the client disconnects mid-stream, the partial reply is still stored
+    and its memory write queued.
+    """
+    timings = StageTimings(request.request_id, name="turn_stream")
+
+    async def event_stream():
+        chunks = []
+        replied = False
+        detached = False
         try:
-            memory_messages = [
-                {"role": "user", "content": request.query},
-                {"role": "assistant", "content": result.data}
-            ]
-            memory.add(memory_messages, user_id=request.user_id)        
+            messages, deps, user_row = await prepare_turn(request, timings)
+            started = time.perf_counter()
+            with timings.measure("agent"):
+                async with mem0_agent.run_stream(
+                    request.query,
+                    message_history=messages,
+                    deps=deps
+                ) as result:
+                    async for delta in result.stream_text(delta=True, debounce_by=None):
+                        if not chunks:
+                            timings.record("first_token", started)
+                        chunks.append(delta)
+                        yield sse_event("token", {"delta": delta})
+
+            reply = "".join(chunks)
+            replied = True
+            # Shielded so a disconnect while storing still completes the turn
+            ai_row = await asyncio.shield(finish_turn(request, reply, timings))
+            yield sse_event("done", turn_result(reply, user_row, ai_row).model_dump())
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client disconnected: the request is being cancelled, so finish the turn in a detached task
+            timings.status = "cancelled"
+            if chunks and not replied:
+                detach(finish_interrupted_turn(request, "".join(chunks), timings))
+                detached = True
+            raise
+
         except Exception as e:
-            print(f"Error adding memory: {str(e)}")
+            timings.status = "error"
+            await store_error(request, e)
+            yield sse_event("error", {"success": False, "request_id": request.request_id})
 
-        return AgentResponse(success=True)
+        finally:
+            if not detached:
+                timings.finish()
+                print(f"Stage timings [{request.request_id}]: {timings.summary()}")
 
-    except Exception as e:
-        print(f"Error processing agent request: {str(e)}")
-        # Store error message in conversation
-        await store_message(
-            session_id=request.session_id,
-            message_type="ai",
-            content="I apologize, but I encountered an error processing your request.",
-            data={"error": str(e), "request_id": request.request_id}
-        )
-        return AgentResponse(success=False)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/health")
 async def health_check():
     """Simple health check endpoint."""
     return {"status": "ok"}
 
+@app.get("/metrics")
+async def metrics(authenticated: bool = Depends(verify_token)):
+    """Stage latency quantiles (HDR histograms), latency events per span and Postgres pool metrics, in Prometheus text format."""
+    return Response(tracer.metrics() + pool_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/traces")
+async def slow_traces(limit: int = 20, authenticated: bool = Depends(verify_token)):
+    """Span trees of the slowest recent turns (over TRACE_SLOW_MS), slowest first."""
+    return tracer.slow_traces(limit)
+
+@app.get("/api/db-pool")
+async def db_pool_stats(authenticated: bool = Depends(verify_token)):
+    """Size, usage, acquire waits and health checks of the shared Postgres pools."""
+    return pool_stats()
+
+@app.get("/api/message-writer")
+async def message_writer_stats(authenticated: bool = Depends(verify_token)):
+    """Queue depth, batch sizes and failures of the group-commit message writer."""
+    return message_writer.stats()
+
+@app.get("/api/memory-queue")
+async def memory_queue_stats(authenticated: bool = Depends(verify_token)):
+    """Depth and lag of the background memory ingestion queue."""
+    return memory_queue.stats()
+
+@app.get("/api/memory-cache")
+async def memory_cache_stats(authenticated: bool = Depends(verify_token)):
+    """Hit/miss counters and footprint of the embedding and search-result caches."""
+    return memory.stats()
+
+@app.get("/api/embeddings")
+async def embedding_stats(authenticated: bool = Depends(verify_token)):
+    """Embedding provider in use, micro-batching counters and on-disk cache hit rate."""
+    return {
+        "embedder": embedder_config(),
+        "dims": embedding_dims(),
+        "stats": memory_stack.embedder.stats() if memory_stack and hasattr(memory_stack.embedder, "stats") else None,
+    }
+
+@app.get("/api/vector-index")
+async def vector_index_stats(authenticated: bool = Depends(verify_token)):
+    """pgvector index settings in use, partitioning, counters of the local HNSW tier and of the reranker."""
+    collection = getattr(memory.vector_store, "collection", None)
+    return {
+        "collection": getattr(collection, "name", None),
+        "index": getattr(collection, "index", None) if collection is not None else None,
+        "settings": memory_stack.index_settings.__dict__ if memory_stack else None,
+        "partitions": memory_stack.partitioned_store.stats() if memory_stack and memory_stack.partitioned_store else None,
+        "keyword_index": memory_stack.keyword_index.stats() if memory_stack and memory_stack.keyword_index else None,
+        "local_tier": memory_stack.local_tier.stats() if memory_stack and memory_stack.local_tier else None,
+        "reranker": memory_stack.reranker.stats() if memory_stack and memory_stack.reranker else None,
+    }
+
+# Running and recently finished bulk ingestion jobs, by job id; finished ones are kept for
+# BULK_JOB_TTL seconds (at most BULK_JOBS_KEPT of them) so their status can still be read
+bulk_jobs: Dict[str, Dict[str, Any]] = {}
+BULK_JOB_TTL = float(os.getenv("BULK_JOB_TTL", "3600"))
+BULK_JOBS_KEPT = int(os.getenv("BULK_JOBS_KEPT", "100"))
+# Completed conversation keys, shared by all jobs, so a resubmitted job skips what was already stored
+bulk_checkpoint = Checkpoint(os.getenv("BULK_INGEST_CHECKPOINT") or None)
+
+def prune_bulk_jobs():
+    """Forget finished jobs past their TTL, and the oldest ones beyond BULK_JOBS_KEPT."""
+    now = time.monotonic()
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in bulk_jobs.items() if job["finished_at"] is not None
+    )
+    for position, (finished_at, job_id) in enumerate(finished):
+        if now - finished_at > BULK_JOB_TTL or position < len(finished) - BULK_JOBS_KEPT:
+            del bulk_jobs[job_id]
+
+async def stop_bulk_jobs(timeout: float):
+    """Give running jobs `timeout` seconds to finish, then cancel them; completed batches stay checkpointed."""
+    tasks = [job["task"] for job in bulk_jobs.values() if not job["task"].done()]
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if pending:
+        print(f"Cancelled {len(pending)} bulk ingestion jobs at shutdown")
+
+@app.post("/api/memories/bulk")
+async def bulk_ingest(
+    request: BulkIngestRequest,
+    authenticated: bool = Depends(verify_token)
+):
+    """Start a background job that ingests many conversations with batched embeddings."""
+    job_id = str(uuid.uuid4())
+    prune_bulk_jobs()
+    ingestor = BulkIngestor(
+        memory,
+        mode=request.mode,
+        batch_size=int(os.getenv("BULK_INGEST_BATCH_SIZE", "100")),
+        concurrency=int(os.getenv("BULK_INGEST_CONCURRENCY", "4")),
+        checkpoint=bulk_checkpoint,
+        run_for_user=memory_queue.run_for_user
+    )
+    items = [
+        IngestItem(
+            key=conversation.key or f"{job_id}:{index}",
+            user_id=conversation.user_id,
+            messages=conversation.messages,
+            metadata=conversation.metadata
+        )
+        for index, conversation in enumerate(request.conversations)
+    ]
+    job = bulk_jobs[job_id] = {"ingestor": ingestor, "task": asyncio.create_task(ingestor.run(items)), "finished_at": None}
+    job["task"].add_done_callback(lambda task: job.update(finished_at=time.monotonic()))
+    return {"job_id": job_id, "conversations": len(items)}
+
+@app.get("/api/memories/bulk/{job_id}")
+async def bulk_ingest_status(
+    job_id: str,
+    authenticated: bool = Depends(verify_token)
+):
+    """Progress of a bulk ingestion job."""
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown bulk ingestion job: {job_id}")
+    return {"job_id": job_id, **job["ingestor"].stats}
+
+@app.post("/api/memories/consolidate")
+async def consolidate_memories(
+    request: ConsolidateRequest,
+    authenticated: bool = Depends(verify_token)
+):
+    """Merge a user's near-duplicate memories, or with dry_run only report what would be merged."""
+    if consolidator is None:
+        raise HTTPException(status_code=503, detail="Memory consolidation is not available")
+    return await run_blocking(consolidator.consolidate_user, request.user_id, request.dry_run)
+
+@app.get("/api/memories/consolidation")
+async def consolidation_stats(authenticated: bool = Depends(verify_token)):
+    """Merge counters of the consolidator and the users waiting for compaction."""
+    if consolidator is None:
+        raise HTTPException(status_code=503, detail="Memory consolidation is not available")
+    return consolidator.stats()
+
 @app.get("/api/history")
 async def get_history(
     session_id: str,
+    response: Response,
     limit: int = 50,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
     authenticated: bool = Depends(verify_token)
 ):
-    """Get conversation history for a session."""
+    """Get conversation history for a session, in chronological order.
+
+    With `after` (a cursor from a previous turn or history call), only messages
+    stored after it are returned; with `before`, the page of older messages.
+    The cursor of the newest returned message is sent in X-History-Cursor, and
+    when older messages may remain, the cursor of the oldest one in
+    X-History-Before-Cursor. Messages of the session still waiting in the
+    group-commit writer are written first, so none is missed.
+    """
     try:
-        messages = await fetch_conversation_history(session_id, limit)
+        await message_writer.flush_session(session_id)
+        if after:
+            messages = await fetch_messages_after(session_id, after, limit)
+        else:
+            messages = await fetch_conversation_history(session_id, limit, before=before)
+        if messages:
+            response.headers["X-History-Cursor"] = encode_cursor(messages[-1])
+            if not after and len(messages) == limit:
+                response.headers["X-History-Before-Cursor"] = encode_cursor(messages[0])
         return messages
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -2,12 +2,44 @@ from fastapi import FastAPI, Request, Form, Depends
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import importlib.util
 import uuid
 import os
 import httpx
 from pathlib import Path
 
-app = FastAPI()
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8001")
+
+def create_backend_client() -> httpx.AsyncClient:
+    """Create the pooled keep-alive client shared by all requests to the agent API."""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("BACKEND_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("BACKEND_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("BACKEND_KEEPALIVE_EXPIRY", "30"))
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("BACKEND_TIMEOUT", "60")),
+        connect=float(os.getenv("BACKEND_CONNECT_TIMEOUT", "5"))
+    )
+    return httpx.AsyncClient(
+        base_url=API_BASE_URL,
+        headers={"Authorization": f"Bearer {os.getenv('API_BEARER_TOKEN', 'mem0-secret-token')}"},
+        limits=limits,
+        timeout=timeout,
+        # HTTP/2 needs the optional h2 package and a TLS backend; otherwise HTTP/1.1 keep-alive is used
+        http2=importlib.util.find_spec("h2") is not None
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.backend = create_backend_client()
+    yield
+    await app.state.backend.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Tạo thư mục templates và static
 templates_dir = Path("./templates")
@@ -65,30 +97,75 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Setup templates
 templates = Jinja2Templates(directory="templates")
 
+# Rendered conversation per session, so a chat turn appends to it instead of re-reading history.
+# The cache lives in this process: run the web app with one worker, or a turn appended by one
+# worker is not seen by another, which only fetches messages after its own cursor.
+MAX_MESSAGES = 50
+sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+
+async def fetch_history(client: httpx.AsyncClient, session_id: str, after: Optional[str] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """Get message history from mem0_agent_endpoint API, optionally only messages after a cursor."""
+    messages = []
+    cursor = after
+    try:
+        params = {"session_id": session_id, "limit": MAX_MESSAGES}
+        if after:
+            params["after"] = after
+        response = await client.get("/api/history", params=params)
+        if response.status_code == 200:
+            data = response.json()
+            for msg in data:
+                msg_data = msg["message"]
+                messages.append({
+                    "type": "user" if msg_data["type"] == "human" else "ai",
+                    "content": msg_data["content"]
+                })
+            cursor = response.headers.get("X-History-Cursor", cursor)
+    except Exception as e:
+        print(f"Error fetching message history: {e}")
+    return messages, cursor
+
+def session_state(session_id: str) -> Dict[str, Any]:
+    """Get or create the cached conversation for a session, evicting the least recently used."""
+    state = sessions.get(session_id)
+    if state is None:
+        state = sessions[session_id] = {"messages": [], "cursor": None, "loaded": False}
+        while len(sessions) > SESSION_CACHE_SIZE:
+            sessions.popitem(last=False)
+    sessions.move_to_end(session_id)
+    return state
+
+def append_messages(state: Dict[str, Any], messages: List[Dict[str, str]], cursor: Optional[str]):
+    state["messages"] = (state["messages"] + messages)[-MAX_MESSAGES:]
+    if cursor:
+        state["cursor"] = cursor
+
+async def sync_session(client: httpx.AsyncClient, session_id: str) -> Dict[str, Any]:
+    """Load a session's history, then only fetch messages newer than its cursor.
+
+    Until a cursor is known (a new session, or one whose turns all failed)
+    the latest history is fetched in full and replaces what is cached.
+    """
+    state = session_state(session_id)
+    if state["cursor"] is None:
+        messages, cursor = await fetch_history(client, session_id)
+        state["messages"] = []
+        append_messages(state, messages, cursor)
+    else:
+        messages, cursor = await fetch_history(client, session_id, after=state["cursor"])
+        append_messages(state, messages, cursor)
+    state["loaded"] = True
+    return state
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     # Initialize or get session
     session_id = request.cookies.get("session_id", str(uuid.uuid4()))
     user_id = request.cookies.get("user_id", str(uuid.uuid4()))
     
-    # Get message history from mem0_agent_endpoint API
-    messages = []
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"http://localhost:8001/api/history?session_id={session_id}",
-                headers={"Authorization": f"Bearer {os.getenv('API_BEARER_TOKEN', 'mem0-secret-token')}"}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                for msg in data:
-                    msg_data = msg["message"]
-                    messages.append({
-                        "type": "user" if msg_data["type"] == "human" else "ai",
-                        "content": msg_data["content"]
-                    })
-    except Exception as e:
-        print(f"Error fetching message history: {e}")
+    state = await sync_session(request.app.state.backend, session_id)
+    messages = state["messages"]
     
     # Return template with message history
     return templates.TemplateResponse(
@@ -102,40 +179,37 @@ async def post_message(request: Request, message: str = Form(...)):
     session_id = request.cookies.get("session_id", str(uuid.uuid4()))
     user_id = request.cookies.get("user_id", str(uuid.uuid4()))
     
-    # Send message to mem0_agent_endpoint
+    client = request.app.state.backend
+    state = session_state(session_id)
+    if not state["loaded"]:
+        await sync_session(client, session_id)
+
+    # Send message to mem0_agent_endpoint; a successful reply is appended directly
+    result = {}
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "http://localhost:8001/api/mem0-agent",
-                json={
-                    "query": message,
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "request_id": str(uuid.uuid4())
-                },
-                headers={"Authorization": f"Bearer {os.getenv('API_BEARER_TOKEN', 'mem0-secret-token')}"}
-            )
+        response = await client.post(
+            "/api/mem0-agent",
+            json={
+                "query": message,
+                "user_id": user_id,
+                "session_id": session_id,
+                "request_id": str(uuid.uuid4())
+            }
+        )
+        if response.status_code == 200:
+            result = response.json()
     except Exception as e:
         print(f"Error sending message to API: {e}")
     
-    # Get updated message history
-    messages = []
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"http://localhost:8001/api/history?session_id={session_id}",
-                headers={"Authorization": f"Bearer {os.getenv('API_BEARER_TOKEN', 'mem0-secret-token')}"}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                for msg in data:
-                    msg_data = msg["message"]
-                    messages.append({
-                        "type": "user" if msg_data["type"] == "human" else "ai",
-                        "content": msg_data["content"]
-                    })
-    except Exception as e:
-        print(f"Error fetching message history: {e}")
+    if result.get("success") and result.get("reply") is not None:
+        append_messages(state, [
+            {"type": "user", "content": message},
+            {"type": "ai", "content": result["reply"]}
+        ], result.get("cursor"))
+    else:
+        # The turn failed; pick up whatever the API stored for it (e.g. its apology)
+        await sync_session(client, session_id)
+    messages = state["messages"]
     
     # Add the new messages if history API failed
     if not messages:
@@ -0,0 +1,222 @@
+import copy
+import json
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_query(text: str) -> str:
+    """Normalize query text so trivially different spellings share a cache entry."""
+    return " ".join(text.lower().split())
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache with a per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches the predicate."""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class CachingEmbedder:
+    """Wraps a Mem0 embedder and caches vectors by text.
+
+    Search queries are keyed by their normalized text, so trivially different
+    phrasings share a vector. Facts embedded for add/update are keyed by their
+    exact text, so case-distinct facts keep their own vectors.
+
+    Vectors are stored as float32 arrays (about 6KB for 1536 dims rather than
+    ~50KB as a list of Python floats), so the cache footprint is bounded by
+    maxsize * dims * 4 bytes.
+    """
+
+    def __init__(self, embedder: Any, cache: LRUTTLCache):
+        self.embedder = embedder
+        self.cache = cache
+        self._dims = 0
+
+    def embed(self, text: str, *args, **kwargs):
+        memory_action = kwargs.get("memory_action", args[0] if args else None)
+        cache_text = normalize_query(text) if memory_action == "search" else text
+        key = (cache_text, args, tuple(sorted(kwargs.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached.tolist()
+        vector = self.embedder.embed(text, *args, **kwargs)
+        self._dims = len(vector)
+        self.cache.set(key, array("f", vector))
+        return vector
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.embedder, name)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        stats["approx_bytes"] = len(self.cache) * self._dims * 4
+        return stats
+
+
+class CachedMemory:
+    """Mem0 Memory proxy with a query-embedding cache and a per-user search-result cache.
+
+    Search results are invalidated whenever a write (add, update, delete,
+    delete_all, clear) touches the user. Each user has a version counter that is
+    bumped on every write; a search that raced a write is not cached. Updates
+    and deletes are addressed by memory id; the owner is looked up in the
+    vector store first, and only if it cannot be found is every user
+    invalidated. Results are stored and returned as copies, so callers may
+    modify them.
+    """
+
+    def __init__(self, memory: Any, search_cache: LRUTTLCache, embedding_cache: Optional[LRUTTLCache] = None):
+        self.memory = memory
+        self.search_cache = search_cache
+        self.embedder: Optional[CachingEmbedder] = None
+        if embedding_cache is not None and hasattr(memory, "embedding_model"):
+            self.embedder = CachingEmbedder(memory.embedding_model, embedding_cache)
+            memory.embedding_model = self.embedder
+        self._versions: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id: Optional[str]) -> int:
+        """Current memory-set version for a user; changes on every write."""
+        return self._versions.get(user_id, 0)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop cached search results for one user, or for everyone."""
+        with self._lock:
+            if user_id is None:
+                self._versions = {user: version + 1 for user, version in self._versions.items()}
+                self.search_cache.clear()
+                return
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self.search_cache.discard_where(lambda key: key[0] == user_id)
+
+    def search(self, query: str, user_id: Optional[str] = None, limit: int = 100, **kwargs):
+        version = self.version(user_id)
+        key = (user_id, normalize_query(query), limit, json.dumps(kwargs, sort_keys=True, default=str))
+        cached = self.search_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        result = self.memory.search(query=query, user_id=user_id, limit=limit, **kwargs)
+        if self.version(user_id) == version:
+            self.search_cache.set(key, copy.deepcopy(result))
+        return result
+
+    def add(self, messages, user_id: Optional[str] = None, **kwargs):
+        try:
+            return self.memory.add(messages, user_id=user_id, **kwargs)
+        finally:
+            self.invalidate(user_id)
+
+    def delete_all(self, user_id: Optional[str] = None, **kwargs):
+        try:
+            return self.memory.delete_all(user_id=user_id, **kwargs)
+        finally:
+            self.invalidate(user_id)
+
+    def clear(self, user_id: Optional[str] = None):
+        try:
+            if hasattr(self.memory, "clear"):
+                return self.memory.clear(user_id=user_id)
+            return self.memory.delete_all(user_id=user_id)
+        finally:
+            self.invalidate(user_id)
+
+    def update(self, *args, **kwargs):
+        owner = self._owner(args, kwargs)
+        try:
+            return self.memory.update(*args, **kwargs)
+        finally:
+            self.invalidate(owner)
+
+    def delete(self, *args, **kwargs):
+        owner = self._owner(args, kwargs)
+        try:
+            return self.memory.delete(*args, **kwargs)
+        finally:
+            self.invalidate(owner)
+
+    def reset(self):
+        try:
+            return self.memory.reset()
+        finally:
+            self.invalidate()
+
+    def _owner(self, args: tuple, kwargs: Dict[str, Any]) -> Optional[str]:
+        """user_id of the memory an update or delete addresses; None (everyone) if it cannot be found."""
+        memory_id = kwargs.get("memory_id", args[0] if args else None)
+        if memory_id is None:
+            return None
+        try:
+            record = self.memory.vector_store.get(vector_id=memory_id)
+        except Exception:
+            return None
+        return (getattr(record, "payload", None) or {}).get("user_id")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.memory, name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "search_results": self.search_cache.stats(),
+            "query_embeddings": self.embedder.stats() if self.embedder else None,
+        }
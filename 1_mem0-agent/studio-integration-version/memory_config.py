@@ -0,0 +1,69 @@
+import os
+from typing import Any, Dict
+
+# Output size of the default local model (all-MiniLM-L6-v2) and of OpenAI text-embedding-3-small
+LOCAL_EMBEDDING_DIMS = 384
+OPENAI_EMBEDDING_DIMS = 1536
+
+
+def embedding_dims() -> int:
+    """Vector size of the configured embedding provider (EMBEDDING_DIMS overrides the provider default)."""
+    if os.getenv("EMBEDDING_DIMS"):
+        return int(os.environ["EMBEDDING_DIMS"])
+    return LOCAL_EMBEDDING_DIMS if os.getenv("EMBEDDING_PROVIDER", "openai") == "local" else OPENAI_EMBEDDING_DIMS
+
+
+def embedder_config() -> Dict[str, Any]:
+    """Mem0 embedder section: OpenAI, or a local sentence-transformers model on CPU (EMBEDDING_PROVIDER=local)."""
+    dims = embedding_dims()
+    if os.getenv("EMBEDDING_PROVIDER", "openai") != "local":
+        return {
+            "provider": "openai",
+            "config": {
+                "model": os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"),
+                "embedding_dims": dims
+            }
+        }
+    model_kwargs = {"device": "cpu"}
+    if os.getenv("EMBEDDING_BACKEND", "torch") == "onnx":
+        # ONNX Runtime backend (sentence-transformers >= 3.2)
+        model_kwargs["backend"] = "onnx"
+    return {
+        "provider": "huggingface",
+        "config": {
+            "model": os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+            "embedding_dims": dims,
+            "model_kwargs": model_kwargs
+        }
+    }
+
+
+def collection_for_dimension(collection_name: str, dims: int) -> str:
+    """Collection holding vectors of this size; anything but 1536 gets its own collection.
+
+    A collection's dimension is fixed when it is created, so switching to a
+    model with another output size must not write into the existing one.
+    """
+    return collection_name if dims == OPENAI_EMBEDDING_DIMS else f"{collection_name}_{dims}"
+
+
+def mem0_config(collection_name: str = "memories_api_new") -> Dict[str, Any]:
+    """Mem0 config for the Supabase (vecs) memory collection used by the agent endpoint."""
+    dims = embedding_dims()
+    return {
+        "llm": {
+            "provider": "openai",
+            "config": {
+                "model": os.getenv('LLM_MODEL', 'gpt-4o-mini')
+            }
+        },
+        "embedder": embedder_config(),
+        "vector_store": {
+            "provider": "supabase",
+            "config": {
+                "connection_string": os.environ['DATABASE_URL'],
+                "collection_name": collection_for_dimension(collection_name, dims),
+                "embedding_model_dims": dims
+            }
+        }
+    }
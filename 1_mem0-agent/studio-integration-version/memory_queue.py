@@ -0,0 +1,193 @@
+import asyncio
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telemetry import Span
+
+
+@dataclass
+class MemoryWriteJob:
+    """A pending memory.add call for one user."""
+    user_id: str
+    messages: List[Dict[str, str]]
+    seq: int = 0
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Span of the request that queued the write; spans opened by the writer go under it
+    trace: Optional[Span] = None
+    # Set for run_for_user jobs: the coroutine function run instead of the writer, and its outcome
+    call: Optional[Callable[[], Awaitable[Any]]] = None
+    result: Optional[asyncio.Future] = None
+
+
+class MemoryWriteQueue:
+    """Bounded background queue for Mem0 memory ingestion.
+
+    Jobs are sharded onto workers by user_id, so writes for the same user are
+    applied in submission order while different users are processed in parallel.
+    The same queue runs other keyed background writes (e.g. session summaries);
+    `name` only labels its workers and log lines.
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[str, List[Dict[str, str]]], Awaitable[Any]],
+        workers: int = 4,
+        maxsize: int = 1000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        name: str = "memory",
+    ):
+        self.writer = writer
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._shard_size = max(1, maxsize // self.workers)
+        self._shards: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending: "OrderedDict[int, float]" = OrderedDict()
+        self._seq = 0
+        self._accepting = False
+        self._last_wait = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    async def start(self):
+        """Start the worker pool."""
+        if self._tasks:
+            return
+        self._shards = [asyncio.Queue(maxsize=self._shard_size) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(queue), name=f"{self.name}-writer-{i}")
+            for i, queue in enumerate(self._shards)
+        ]
+        self._accepting = True
+
+    def submit(self, user_id: str, messages: List[Dict[str, str]], trace: Optional[Span] = None) -> bool:
+        """Enqueue a memory write. Returns False if the queue is full or closed."""
+        if not self._accepting:
+            self.dropped += 1
+            return False
+        self._seq += 1
+        job = MemoryWriteJob(user_id=user_id, messages=messages, seq=self._seq, trace=trace)
+        try:
+            self._shard_for(user_id).put_nowait(job)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"{self.name.capitalize()} queue full, dropping write for {user_id}")
+            return False
+        self._pending[job.seq] = job.enqueued_at
+        return True
+
+    async def run_for_user(self, user_id: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `call()` on the user's worker, in order with the user's other writes, and return its result.
+
+        For writes made outside the writer (bulk ingestion). Waits for room in
+        the queue instead of dropping; errors go to the caller and are not retried.
+        """
+        if not self._accepting:
+            raise RuntimeError(f"{self.name.capitalize()} queue is not running")
+        self._seq += 1
+        job = MemoryWriteJob(user_id=user_id, messages=[], seq=self._seq, call=call,
+                             result=asyncio.get_running_loop().create_future())
+        self._pending[job.seq] = job.enqueued_at
+        try:
+            await self._shard_for(user_id).put(job)
+        except BaseException:
+            self._pending.pop(job.seq, None)
+            raise
+        return await job.result
+
+    async def drain(self, timeout: Optional[float] = 30.0):
+        """Stop accepting writes, wait for queued jobs to finish and stop the workers."""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._shards)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"{self.name.capitalize()} queue drain timed out with {self.depth} writes pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def lag(self) -> float:
+        """Age in seconds of the oldest write that has not completed yet."""
+        if not self._pending:
+            return 0.0
+        oldest = next(iter(self._pending.values()))
+        return time.monotonic() - oldest
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "lag_seconds": round(self.lag, 3),
+            "last_wait_seconds": round(self._last_wait, 3),
+            "workers": self.workers,
+            "capacity": self._shard_size * self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+        }
+
+    def _shard_for(self, user_id: str) -> asyncio.Queue:
+        return self._shards[zlib.crc32(user_id.encode("utf-8")) % self.workers]
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            self._last_wait = time.monotonic() - job.enqueued_at
+            try:
+                await self._run(job)
+            finally:
+                self._pending.pop(job.seq, None)
+                queue.task_done()
+
+    async def _run(self, job: MemoryWriteJob):
+        if job.call is not None:
+            try:
+                result = await job.call()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.result.done():
+                    job.result.set_exception(e)
+                return
+            self.processed += 1
+            if not job.result.done():
+                job.result.set_result(result)
+            return
+        while True:
+            try:
+                if job.trace is not None:
+                    with job.trace.activate():
+                        await self.writer(job.user_id, job.messages)
+                else:
+                    await self.writer(job.user_id, job.messages)
+                self.processed += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.attempts += 1
+                if job.attempts > self.max_retries:
+                    self.failed += 1
+                    print(f"Error in {self.name} write for {job.user_id} after {job.attempts} attempts: {str(e)}")
+                    return
+                self.retried += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (job.attempts - 1))
@@ -0,0 +1,240 @@
+"""The Mem0 instance behind the agent, with its storage wrappers and retrieval chain.
+
+Built from the environment in one place, so the endpoint and the offline
+benchmarks (benchmarks/evaluate_retrieval.py) write and search memories
+through exactly the same path:
+
+    Memory.from_config
+      -> embedder (size check, micro-batching, disk cache)
+      -> shared Postgres pool (see db_pool.py)
+      -> vector store (index settings, partitions, prepared or binary re-scored
+         search, local HNSW tier)
+      -> keyword index
+      -> tracing (embed, LLM and vector store calls as spans, see telemetry.py)
+      -> query-embedding and search-result caches
+    search: memory.search -> hybrid -> dedup/MMR -> rerank -> archive fallback
+"""
+import os
+from typing import Any, Callable, Dict, Optional
+
+from consolidation import Consolidator
+from db_pool import PoolSettings, PreparedSearchStore, SyncPool, use_sync_pool
+from diversify import DiverseRetriever
+from embeddings import install_embedder
+from hybrid_search import HybridRetriever, KeywordIndex, KeywordIndexedStore, store_loader
+from memory_cache import CachedMemory, LRUTTLCache
+from memory_config import embedding_dims
+from memory_tiers import AccessTracker, MemoryArchive, TieredRetriever
+from partitioned_store import PartitionedVectorStore, partitioned_store_from_env
+from quantization import BinaryRescoreStore
+from rerank import Reranker, scorers_from_spec
+from telemetry import instrument_engine, tracer
+from vector_index import IndexSettings, LocalHNSWTier, LocalTierVectorStore, apply_query_settings, ensure_index
+
+
+def enabled(name: str) -> bool:
+    return os.getenv(name, "false").lower() == "true"
+
+
+def with_caches(base_memory: Any) -> CachedMemory:
+    """Put the query-embedding and search-result caches in front of a Mem0 instance."""
+    return CachedMemory(
+        base_memory,
+        search_cache=LRUTTLCache(
+            maxsize=int(os.getenv("SEARCH_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "300"))
+        ),
+        embedding_cache=LRUTTLCache(
+            maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+            ttl=float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+        )
+    )
+
+
+class MemoryStack:
+    """A Mem0 instance wrapped with everything the environment enables.
+
+    `memory` is the cached Mem0 proxy used for writes; `search(query, user_id,
+    limit)` is the retrieval chain used for each turn. The other attributes
+    are the optional components (None when disabled), exposed for stats.
+    """
+
+    def __init__(self, base_memory: Any):
+        self.index_settings = IndexSettings.from_env()
+        self.db_pool: Optional[SyncPool] = None
+        self.partitioned_store: Optional[PartitionedVectorStore] = None
+        self.local_tier: Optional[LocalHNSWTier] = None
+        self.keyword_index: Optional[KeywordIndex] = None
+        self.hybrid_retriever: Optional[HybridRetriever] = None
+        self.diverse_retriever: Optional[DiverseRetriever] = None
+        self.reranker: Optional[Reranker] = None
+        self.access_tracker: Optional[AccessTracker] = None
+        self.tiered_retriever: Optional[TieredRetriever] = None
+        self.embedder = self.with_embedder(base_memory).embedding_model
+        self.memory = with_caches(self.with_tracing(self.with_keyword_index(self.with_vector_index(self.with_pool(base_memory)))))
+        self.search = self.retrieval_chain()
+        self.consolidator = Consolidator(
+            self.memory.memory,
+            threshold=float(os.getenv("CONSOLIDATION_THRESHOLD", "0.92")),
+            ops_per_second=float(os.getenv("CONSOLIDATION_OPS_PER_SECOND", "5")),
+            burst=int(os.getenv("CONSOLIDATION_BURST", "20")),
+            cooldown=float(os.getenv("CONSOLIDATION_COOLDOWN", "300")),
+            invalidate=self.memory.invalidate
+        )
+
+    def with_embedder(self, base_memory: Any) -> Any:
+        """Check the embedder's vector size and add micro-batching (local models) and the on-disk embedding cache."""
+        return install_embedder(base_memory, embedding_dims())
+
+    def with_pool(self, base_memory: Any) -> Any:
+        """Move the vector store's database access onto the shared connection pool."""
+        db = getattr(base_memory.vector_store, "db", None)
+        if db is not None:
+            self.db_pool = use_sync_pool(db, PoolSettings.from_env())
+        return base_memory
+
+    def with_vector_index(self, base_memory: Any) -> Any:
+        """Apply the pgvector index settings, partitioned storage, prepared or quantized search and, if enabled, the local HNSW tier for hot users."""
+        collection = getattr(base_memory.vector_store, "collection", None)
+        if collection is None:
+            return base_memory
+        self.partitioned_store = partitioned_store_from_env(
+            base_memory.vector_store.db, collection.name, collection.dimension, self.index_settings
+        )
+        if self.partitioned_store is not None:
+            base_memory.vector_store = self.partitioned_store
+        else:
+            if enabled("VECTOR_INDEX_AUTO_CREATE"):
+                ensure_index(collection, self.index_settings)
+            apply_query_settings(collection, self.index_settings)
+        binary = os.getenv("VECTOR_QUANTIZATION", "off") == "binary"
+        if binary and (self.partitioned_store is None or self.partitioned_store.mode != "user"):
+            print("Binary quantized search disabled: it needs per-user partitions (VECTOR_PARTITION_MODE=user)")
+            binary = False
+        if binary:
+            base_memory.vector_store = BinaryRescoreStore(
+                base_memory.vector_store,
+                candidates_factor=int(os.getenv("VECTOR_RESCORE_FACTOR", "10"))
+            )
+        elif self.db_pool is not None and self.db_pool.settings.prepared_statements:
+            base_memory.vector_store = PreparedSearchStore(
+                base_memory.vector_store,
+                ef_search=self.index_settings.ef_search,
+                probes=self.index_settings.probes
+            )
+        if enabled("LOCAL_HNSW_ENABLED"):
+            try:
+                self.local_tier = LocalHNSWTier(
+                    collection,
+                    max_users=int(os.getenv("LOCAL_HNSW_MAX_USERS", "100")),
+                    promote_after=int(os.getenv("LOCAL_HNSW_PROMOTE_AFTER", "3")),
+                    ef_search=int(os.getenv("LOCAL_HNSW_EF_SEARCH", "50")),
+                    collection_for=self.partitioned_store.collection_for if self.partitioned_store else None
+                )
+                base_memory.vector_store = LocalTierVectorStore(base_memory.vector_store, self.local_tier)
+            except RuntimeError as e:
+                print(f"Local HNSW tier disabled: {str(e)}")
+        return base_memory
+
+    def with_keyword_index(self, base_memory: Any) -> Any:
+        """Maintain a per-user BM25 index next to the vector store when hybrid search is enabled."""
+        if enabled("HYBRID_SEARCH_ENABLED"):
+            self.keyword_index = KeywordIndex(
+                store_loader(base_memory.vector_store),
+                max_users=int(os.getenv("HYBRID_INDEX_MAX_USERS", "1000"))
+            )
+            base_memory.vector_store = KeywordIndexedStore(base_memory.vector_store, self.keyword_index)
+        return base_memory
+
+    def with_tracing(self, base_memory: Any) -> Any:
+        """Open a span around each embed, LLM and vector store call, and count new connections and slow plans on the database engine."""
+        base_memory.embedding_model = tracer.traced(base_memory.embedding_model, {"embed": "embed", "embed_batch": "embed"})
+        base_memory.llm = tracer.traced(base_memory.llm, {"generate_response": "memory_llm"})
+        base_memory.vector_store = tracer.traced(base_memory.vector_store, {
+            "search": "vector_query",
+            "insert": "vector_write",
+            "update": "vector_write",
+            "delete": "vector_write",
+        })
+        engine = getattr(getattr(base_memory.vector_store, "db", None), "engine", None)
+        if engine is not None:
+            instrument_engine(engine, explain_slow_ms=float(os.getenv("TRACE_EXPLAIN_SLOW_MS", "500")))
+        return base_memory
+
+    def retrieval_chain(self) -> Callable[..., Dict[str, Any]]:
+        """memory.search, wrapped by each enabled retrieval stage in turn."""
+        memory = self.memory
+        if self.keyword_index is not None:
+            self.hybrid_retriever = HybridRetriever(
+                memory,
+                self.keyword_index,
+                fetch_k=int(os.getenv("HYBRID_FETCH_K", "20")),
+                rrf_k=int(os.getenv("HYBRID_RRF_K", "60"))
+            )
+        if enabled("DIVERSIFY_ENABLED"):
+            self.diverse_retriever = DiverseRetriever(
+                memory,
+                self.hybrid_retriever.search if self.hybrid_retriever else memory.search,
+                fetch_k=int(os.getenv("DIVERSIFY_FETCH_K", "20")),
+                lambda_=float(os.getenv("DIVERSIFY_MMR_LAMBDA", "0.7")),
+                duplicate_threshold=float(os.getenv("DIVERSIFY_DUPLICATE_THRESHOLD", "0.95"))
+            )
+        search = (self.diverse_retriever or self.hybrid_retriever or memory).search
+        if enabled("RERANK_ENABLED"):
+            try:
+                self.reranker = Reranker(
+                    search,
+                    scorers_from_spec(
+                        os.getenv("RERANK_SCORERS", "lexical:1,recency:0.3"),
+                        half_life_days=float(os.getenv("RERANK_RECENCY_HALF_LIFE_DAYS", "30")),
+                        cross_encoder_model=os.getenv("RERANK_CROSS_ENCODER_MODEL") or None
+                    ),
+                    fetch_k=int(os.getenv("RERANK_FETCH_K", "20")),
+                    budget=float(os.getenv("RERANK_BUDGET_MS", "150")) / 1000,
+                    vector_weight=float(os.getenv("RERANK_VECTOR_WEIGHT", "1"))
+                )
+                search = self.reranker.search
+            except (RuntimeError, ValueError) as e:
+                print(f"Reranking disabled: {str(e)}")
+        if enabled("MEMORY_TIERING_ENABLED"):
+            engine = memory.vector_store.db.engine
+            self.access_tracker = AccessTracker(engine)
+            self.tiered_retriever = TieredRetriever(
+                memory,
+                search,
+                MemoryArchive(engine),
+                self.access_tracker,
+                promote_similarity=float(os.getenv("MEMORY_ARCHIVE_PROMOTE_SIMILARITY", "0.8")),
+                min_similarity=float(os.getenv("MEMORY_ARCHIVE_MIN_SIMILARITY", "0.3"))
+            )
+            search = self.tiered_retriever.search
+        return search
+
+    def write(self, messages, user_id: str, consolidate: bool = False) -> Dict[str, Any]:
+        """memory.add for a conversation turn, then merge any new near duplicates."""
+        result = self.memory.add(messages, user_id=user_id)
+        if consolidate:
+            self.consolidator.on_write(user_id, result)
+        return result
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop everything this process caches about a user's memories (everyone's with None).
+
+        For changes made outside this process, e.g. by the tiering and
+        consolidation jobs (see db_pool.listen_memory_changed).
+        """
+        self.memory.invalidate(user_id)
+        if self.keyword_index is not None:
+            self.keyword_index.invalidate(user_id)
+        if self.local_tier is not None:
+            self.local_tier.invalidate(user_id)
+        if self.tiered_retriever is not None:
+            self.tiered_retriever.archive.invalidate(user_id)
+
+    def shutdown(self):
+        if self.reranker is not None:
+            self.reranker.shutdown()
+        if self.tiered_retriever is not None:
+            self.tiered_retriever.shutdown()
+        if self.access_tracker is not None:
+            self.access_tracker.flush()
@@ -0,0 +1,408 @@
+"""Memory decay and hot/cold tiering for long-term memories.
+
+- AccessTracker counts which memories searches return (hit count, last
+  hit) and flushes them in batches to memory_access
+- DecayPolicy scores a memory from its recency of use and hit count; low
+  scoring memories past a minimum age are cold
+- the tiering job moves cold memories from the hot vector collection (and
+  its ANN index) to memory_archive, with int8-quantized vectors
+- TieredRetriever searches a user's archive when the hot tier comes back
+  short or the archive holds a strong match, and moves the hits it returns
+  back to the hot tier in the background
+
+Tables are created by migrations/003_memory_tiering.sql.
+
+Usage:
+    python memory_tiers.py tier --user-id alice               # dry-run report
+    python memory_tiers.py tier --all --apply
+    python memory_tiers.py expire --days 365 --apply
+"""
+import argparse
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from diversify import fetch_vectors, unit_rows
+from memory_cache import LRUTTLCache
+from quantization import dequantize, quantize
+from vector_index import fetch_user_records, stored_user_ids, user_collection
+
+
+def parse_time(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class DecayPolicy:
+    """Exponential decay of a memory's usefulness since it was last written or retrieved.
+
+    score = 0.5 ** (days since last touch / half_life_days) * (1 + ln(1 + hits))
+    A memory is cold once its score drops below cold_score and it is older than
+    min_age_days; archived memories untouched for expire_after_days are deleted.
+    """
+    half_life_days: float = 30.0
+    cold_score: float = 0.25
+    min_age_days: float = 14.0
+    expire_after_days: Optional[float] = None
+
+    def score(self, last_touched: datetime, hit_count: int, now: datetime) -> float:
+        days = max(0.0, (now - last_touched).total_seconds() / 86400)
+        return 0.5 ** (days / self.half_life_days) * (1 + math.log1p(hit_count))
+
+    def is_cold(self, created_at: datetime, last_touched: datetime, hit_count: int, now: datetime) -> bool:
+        if (now - created_at).total_seconds() / 86400 < self.min_age_days:
+            return False
+        return self.score(last_touched, hit_count, now) < self.cold_score
+
+
+class AccessTracker:
+    """Buffers memory hits in process and upserts them into memory_access in batches."""
+
+    def __init__(self, engine: Any):
+        self.engine = engine
+        self._pending: Dict[str, Tuple[str, int, datetime]] = {}
+        self._lock = threading.Lock()
+        self.flushed = 0
+
+    def record(self, user_id: str, memory_ids: List[str]):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for memory_id in memory_ids:
+                _, hits, _ = self._pending.get(memory_id, (user_id, 0, now))
+                self._pending[memory_id] = (user_id, hits + 1, now)
+
+    def flush(self) -> int:
+        from sqlalchemy import text
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [
+            {"memory_id": memory_id, "user_id": user_id, "hits": hits, "last_hit_at": last_hit}
+            for memory_id, (user_id, hits, last_hit) in pending.items()
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO memory_access (memory_id, user_id, hit_count, last_hit_at)
+                VALUES (:memory_id, :user_id, :hits, :last_hit_at)
+                ON CONFLICT (memory_id) DO UPDATE
+                SET hit_count = memory_access.hit_count + EXCLUDED.hit_count,
+                    last_hit_at = GREATEST(memory_access.last_hit_at, EXCLUDED.last_hit_at)
+            """), rows)
+        self.flushed += len(rows)
+        return len(rows)
+
+    def stats_for(self, memory_ids: List[str]) -> Dict[str, Tuple[int, datetime]]:
+        """(hit count, last hit) of each memory that has been retrieved at least once."""
+        from sqlalchemy import text
+
+        if not memory_ids:
+            return {}
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT memory_id, hit_count, last_hit_at FROM memory_access WHERE memory_id = ANY(:ids)"),
+                {"ids": memory_ids}
+            )
+            return {row.memory_id: (row.hit_count, row.last_hit_at) for row in rows}
+
+
+class MemoryArchive:
+    """Cold memories in memory_archive, searched by brute force per user.
+
+    A user's dequantized archive matrix is cached for `cache_ttl` seconds;
+    users with nothing archived are cached as empty, so the common case costs
+    no query.
+    """
+
+    def __init__(self, engine: Any, cache_size: int = 1000, cache_ttl: float = 300.0):
+        self.engine = engine
+        self._cache = LRUTTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Forget the cached archive of a user (everyone's with None)."""
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.discard(user_id)
+
+    def archive(self, user_id: str, records: List[Tuple[str, List[float], Dict[str, Any], int, datetime]]):
+        """Store (memory id, vector, payload, hit count, last touched) records."""
+        from sqlalchemy import text
+
+        rows = []
+        for memory_id, vector, payload, hit_count, last_touched in records:
+            data, scale = quantize(vector)
+            rows.append({
+                "memory_id": memory_id, "user_id": user_id, "payload": json.dumps(payload),
+                "vector": data, "scale": scale, "hit_count": hit_count, "last_touched_at": last_touched,
+            })
+        with self.engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO memory_archive (memory_id, user_id, payload, vector, scale, hit_count, last_touched_at)
+                VALUES (:memory_id, :user_id, CAST(:payload AS JSONB), :vector, :scale, :hit_count, :last_touched_at)
+                ON CONFLICT (memory_id) DO UPDATE
+                SET payload = EXCLUDED.payload, vector = EXCLUDED.vector, scale = EXCLUDED.scale,
+                    hit_count = EXCLUDED.hit_count, last_touched_at = EXCLUDED.last_touched_at,
+                    archived_at = now()
+            """), rows)
+        self._cache.discard(user_id)
+
+    def search(self, user_id: str, query_vector: np.ndarray, limit: int) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """(memory id, cosine similarity, payload) of the user's closest archived memories."""
+        ids, matrix, payloads = self._load(user_id)
+        if not ids:
+            return []
+        similarity = matrix @ unit_rows(np.asarray(query_vector, dtype=np.float32))
+        order = np.argsort(-similarity)[:limit]
+        return [(ids[index], float(similarity[index]), payloads[index]) for index in order]
+
+    def restore(self, user_id: str, memory_ids: List[str]) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        """Remove memories from the archive and return them as (id, vector, payload) for re-insertion."""
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text("DELETE FROM memory_archive WHERE memory_id = ANY(:ids) RETURNING memory_id, payload, vector, scale"),
+                {"ids": memory_ids}
+            ).fetchall()
+        self._cache.discard(user_id)
+        return [(row.memory_id, dequantize(row.vector, row.scale).tolist(), row.payload) for row in rows]
+
+    def expire(self, older_than_days: float, dry_run: bool = True) -> int:
+        """Delete (or with dry_run count) archived memories untouched for longer than the given age."""
+        from sqlalchemy import text
+
+        condition = "last_touched_at < now() - make_interval(secs => :seconds)"
+        with self.engine.begin() as conn:
+            if dry_run:
+                return conn.execute(text(f"SELECT count(*) FROM memory_archive WHERE {condition}"), {"seconds": older_than_days * 86400}).scalar()
+            count = conn.execute(text(f"DELETE FROM memory_archive WHERE {condition}"), {"seconds": older_than_days * 86400}).rowcount
+        self._cache.clear()
+        return count
+
+    def _load(self, user_id: str):
+        from sqlalchemy import text
+
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return cached
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT memory_id, payload, vector, scale FROM memory_archive WHERE user_id = :user_id"),
+                {"user_id": user_id}
+            ).fetchall()
+        if rows:
+            matrix = unit_rows(np.vstack([dequantize(row.vector, row.scale) for row in rows]))
+            entry = ([row.memory_id for row in rows], matrix, [row.payload for row in rows])
+        else:
+            entry = ([], None, [])
+        self._cache.set(user_id, entry)
+        return entry
+
+
+def tier_user(
+    memory: Any,
+    user_id: str,
+    policy: DecayPolicy,
+    tracker: AccessTracker,
+    archive: MemoryArchive,
+    dry_run: bool = True,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Move a user's cold memories from the hot collection to the archive."""
+    store = memory.vector_store
+    collection = user_collection(store, user_id)
+    records = fetch_user_records(collection, user_id, limit=limit) if collection is not None else []
+    access = tracker.stats_for([str(record.id) for record in records])
+    now = datetime.now(timezone.utc)
+    cold = []
+    for record in records:
+        created_at = parse_time(record.payload.get("created_at")) or now
+        written = parse_time(record.payload.get("updated_at")) or created_at
+        hit_count, last_hit = access.get(str(record.id), (0, None))
+        last_touched = max(written, last_hit) if last_hit else written
+        if policy.is_cold(created_at, last_touched, hit_count, now):
+            cold.append((str(record.id), record.payload, hit_count, last_touched))
+    report = {
+        "user_id": user_id, "hot": len(records), "cold": len(cold), "dry_run": dry_run,
+        "memories": [{"id": memory_id, "memory": payload.get("data")} for memory_id, payload, _, _ in cold],
+    }
+    if dry_run or not cold:
+        return report
+    vectors = fetch_vectors(store, [memory_id for memory_id, _, _, _ in cold], user_id)
+    moved = [
+        (memory_id, vectors[memory_id], payload, hit_count, last_touched)
+        for memory_id, payload, hit_count, last_touched in cold if memory_id in vectors
+    ]
+    archive.archive(user_id, moved)
+    for memory_id, _, _, _, _ in moved:
+        store.delete(vector_id=memory_id)
+    if hasattr(memory, "invalidate"):
+        memory.invalidate(user_id)
+    report["archived"] = len(moved)
+    return report
+
+
+class TieredRetriever:
+    """Wraps a search function with access tracking and fallback to the cold archive.
+
+    The archive is searched when the hot tier returns fewer than `limit`
+    results (the best archived memories fill the gap) and in any case the
+    best archived memory with similarity >= promote_similarity displaces the
+    last hot result. Archived memories that end up in the results are moved
+    back to the hot tier on a background thread, off the search path.
+    """
+
+    def __init__(
+        self,
+        memory: Any,
+        search: Callable[..., Dict[str, Any]],
+        archive: MemoryArchive,
+        tracker: AccessTracker,
+        promote_similarity: float = 0.8,
+        min_similarity: float = 0.3,
+    ):
+        self.memory = memory
+        self.inner = search
+        self.archive = archive
+        self.tracker = tracker
+        self.promote_similarity = promote_similarity
+        self.min_similarity = min_similarity
+        self.restored = 0
+        self._restoring = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-restore")
+
+    def search(self, query: str, user_id: str, limit: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        results = list(self.inner(query, user_id, limit)["results"])
+        # Same call as Mem0's own search, so the query vector comes from the embedding cache
+        query_vector = self.memory.embedding_model.embed(query, "search")
+        hits = [hit for hit in self.archive.search(user_id, query_vector, limit) if hit[1] >= self.min_similarity]
+        # Hits come best first: fill the gap, then let the best remaining strong hit take the last hot slot
+        for memory_id, similarity, payload in hits:
+            if len(results) >= limit:
+                if similarity >= self.promote_similarity and results and results[-1].get("tier") != "archive":
+                    results[-1] = self._entry(memory_id, similarity, payload)
+                break
+            results.append(self._entry(memory_id, similarity, payload))
+        restored = [entry["id"] for entry in results if entry.get("tier") == "archive"]
+        if restored:
+            self._queue_restore(user_id, restored)
+        self.tracker.record(user_id, [entry["id"] for entry in results])
+        return {"results": results}
+
+    def _queue_restore(self, user_id: str, memory_ids: List[str]):
+        with self._lock:
+            memory_ids = [memory_id for memory_id in memory_ids if memory_id not in self._restoring]
+            self._restoring.update(memory_ids)
+        if memory_ids:
+            self._executor.submit(self._restore, user_id, memory_ids)
+
+    def _restore(self, user_id: str, memory_ids: List[str]):
+        try:
+            records = self.archive.restore(user_id, memory_ids)
+            if records:
+                self.memory.vector_store.insert(
+                    vectors=[vector for _, vector, _ in records],
+                    payloads=[payload for _, _, payload in records],
+                    ids=[memory_id for memory_id, _, _ in records]
+                )
+                self.restored += len(records)
+                if hasattr(self.memory, "invalidate"):
+                    self.memory.invalidate(user_id)
+        except Exception as e:
+            print(f"Error restoring archived memories for {user_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._restoring.difference_update(memory_ids)
+
+    def shutdown(self):
+        """Finish the queued restores."""
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _entry(memory_id: str, similarity: float, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": memory_id,
+            "memory": payload.get("data"),
+            "hash": payload.get("hash"),
+            "created_at": payload.get("created_at"),
+            "user_id": payload.get("user_id"),
+            "score": 1 - similarity,
+            "tier": "archive",
+        }
+
+
+def policy_from_env() -> DecayPolicy:
+    expire = os.getenv("MEMORY_EXPIRE_AFTER_DAYS")
+    return DecayPolicy(
+        half_life_days=float(os.getenv("MEMORY_DECAY_HALF_LIFE_DAYS", "30")),
+        cold_score=float(os.getenv("MEMORY_COLD_SCORE", "0.25")),
+        min_age_days=float(os.getenv("MEMORY_MIN_AGE_DAYS", "14")),
+        expire_after_days=float(expire) if expire else None
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["tier", "expire"])
+    parser.add_argument("--user-id")
+    parser.add_argument("--all", action="store_true", help="every user found in the hot collection")
+    parser.add_argument("--days", type=float, help="expire: archive age in days (default MEMORY_EXPIRE_AFTER_DAYS)")
+    parser.add_argument("--apply", action="store_true", help="move or delete instead of only reporting")
+    parser.add_argument("--collection", default="memories_api_new")
+    args = parser.parse_args()
+
+    from db_pool import notify_memory_changed
+    from dotenv import load_dotenv
+    from mem0 import Memory
+    from memory_config import mem0_config
+    from partitioned_store import partitioned_store_from_env
+
+    load_dotenv()
+    memory = Memory.from_config(mem0_config(args.collection))
+    engine = memory.vector_store.db.engine
+    store = partitioned_store_from_env(memory.vector_store.db, memory.vector_store.collection.name, memory.vector_store.collection.dimension)
+    if store is not None:
+        memory.vector_store = store
+    policy = policy_from_env()
+    archive = MemoryArchive(engine)
+
+    if args.action == "expire":
+        days = args.days or policy.expire_after_days
+        if days is None:
+            parser.error("expire needs --days or MEMORY_EXPIRE_AFTER_DAYS")
+        count = archive.expire(days, dry_run=not args.apply)
+        if args.apply and count:
+            notify_memory_changed(engine)
+        print(f"{'Deleted' if args.apply else 'Would delete'} {count} archived memories untouched for {days:g} days")
+        return
+
+    if args.all:
+        user_ids = stored_user_ids(memory.vector_store)
+    elif args.user_id:
+        user_ids = [args.user_id]
+    else:
+        parser.error("tier needs --user-id or --all")
+    tracker = AccessTracker(engine)
+    for user_id in user_ids:
+        report = tier_user(memory, user_id, policy, tracker, archive, dry_run=not args.apply)
+        if report.get("archived"):
+            # The endpoint's keyword, local HNSW, search and archive caches still hold the moved memories
+            notify_memory_changed(engine, user_id)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Group commit for the messages table.
+
+Concurrent store_message calls are queued and written together: the writer
+waits up to `max_delay` seconds for more rows (or until `max_rows` are
+queued), then inserts the whole batch with one multi-row statement. Under
+load the batches grow instead of the statement count, so inserts scale with
+the load rather than with the number of requests.
+
+Each caller still gets its own stored row back (id, created_at) once its
+batch commits. Writes for a session are committed in the order they were
+queued, and `flush_session` waits until every row queued for the session
+is committed, which gives /api/history read-your-writes. `drain` flushes
+everything still queued on shutdown.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class PendingMessage:
+    """A messages row waiting for its batch."""
+    session_id: str
+    message: Dict[str, Any]
+    future: asyncio.Future
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class MessageWriter:
+    """Micro-batching writer in front of a multi-row insert.
+
+    `insert_many` takes a list of {"session_id", "message"} rows and returns
+    the stored rows; ids are assigned in input order, so the returned rows
+    are matched to the queued ones by id.
+    """
+
+    def __init__(
+        self,
+        insert_many: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+        max_rows: int = 100,
+        max_delay: float = 0.005,
+    ):
+        self.insert_many = insert_many
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        self._queue: List[PendingMessage] = []
+        # Rows queued or being written, per session
+        self._unwritten: Dict[str, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._written: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        self.rows = 0
+        self.batches = 0
+        self.failed = 0
+        self.retried_batches = 0
+        self.largest_batch = 0
+        self._last_wait = 0.0
+
+    async def start(self):
+        """Start the flusher task."""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_now = asyncio.Event()
+        self._written = asyncio.Condition()
+        self._task = asyncio.create_task(self._run(), name="message-writer")
+        self._accepting = True
+
+    async def write(self, session_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a row and return it as stored, once its batch has committed.
+
+        Before start() or after drain(), the row is inserted on its own. A
+        caller that stops waiting (timeout, cancellation) does not withdraw
+        the row: it is still written with its batch.
+        """
+        if not self._accepting:
+            rows = await self.insert_many([{"session_id": session_id, "message": message}])
+            return rows[0]
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append(PendingMessage(session_id=session_id, message=message, future=future))
+        self._unwritten[session_id] = self._unwritten.get(session_id, 0) + 1
+        self._wakeup.set()
+        if len(self._queue) >= self.max_rows:
+            self._flush_now.set()
+        return await future
+
+    async def flush_session(self, session_id: str):
+        """Wait until every row queued so far for the session is committed (or has failed)."""
+        if not self._unwritten.get(session_id):
+            return
+        self._flush_now.set()
+        async with self._written:
+            await self._written.wait_for(lambda: not self._unwritten.get(session_id))
+
+    async def drain(self, timeout: Optional[float] = 30.0):
+        """Stop batching, write every queued row and stop the flusher."""
+        if self._task is None:
+            return
+        self._accepting = False
+        self._flush_now.set()
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Message writer drain timed out with {len(self._queue)} rows unwritten")
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "sessions_unwritten": len(self._unwritten),
+            "rows": self.rows,
+            "batches": self.batches,
+            "mean_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "last_wait_seconds": round(self._last_wait, 4),
+            "failed": self.failed,
+            "retried_batches": self.retried_batches,
+            "max_rows": self.max_rows,
+            "max_delay_seconds": self.max_delay,
+        }
+
+    async def _run(self):
+        while self._accepting or self._queue:
+            await self._wakeup.wait()
+            if not self._queue:
+                self._wakeup.clear()
+                continue
+            if self._accepting and not self._flush_now.is_set():
+                # Give concurrent requests up to max_delay to join the batch
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), timeout=self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._queue[:self.max_rows]
+            del self._queue[:self.max_rows]
+            if len(self._queue) < self.max_rows:
+                self._flush_now.clear()
+            if not self._queue:
+                self._wakeup.clear()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingMessage]):
+        self._last_wait = time.monotonic() - batch[0].queued_at
+        try:
+            try:
+                self._resolve(batch, await self._insert(batch))
+            except Exception as e:
+                if len(batch) == 1:
+                    raise
+                # One bad row must not fail the others: write them one at a time, in order
+                print(f"Batch insert of {len(batch)} messages failed, retrying row by row: {str(e)}")
+                self.retried_batches += 1
+                for pending in batch:
+                    try:
+                        self._resolve([pending], await self._insert([pending]))
+                    except Exception as row_error:
+                        self._fail([pending], row_error)
+        except Exception as e:
+            self._fail(batch, e)
+        finally:
+            for pending in batch:
+                remaining = self._unwritten.get(pending.session_id, 0) - 1
+                if remaining > 0:
+                    self._unwritten[pending.session_id] = remaining
+                else:
+                    self._unwritten.pop(pending.session_id, None)
+            async with self._written:
+                self._written.notify_all()
+
+    async def _insert(self, batch: List[PendingMessage]) -> List[Dict[str, Any]]:
+        rows = await self.insert_many([{"session_id": p.session_id, "message": p.message} for p in batch])
+        if len(rows) != len(batch):
+            raise RuntimeError(f"Inserted {len(batch)} messages but {len(rows)} rows came back")
+        self.batches += 1
+        self.rows += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        return sorted(rows, key=lambda row: row["id"])
+
+    def _resolve(self, batch: List[PendingMessage], rows: List[Dict[str, Any]]):
+        for pending, row in zip(batch, rows):
+            if not pending.future.done():
+                pending.future.set_result(row)
+
+    def _fail(self, batch: List[PendingMessage], error: Exception):
+        self.failed += len(batch)
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(error)
@@ -0,0 +1,8 @@
+-- Conversation messages read and written by mem0_agent_endpoint.py.
+-- Matches the table the Live Agent Studio expects; safe to run on an existing database.
+CREATE TABLE IF NOT EXISTS messages (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    session_id TEXT NOT NULL,
+    message JSONB NOT NULL
+);
@@ -0,0 +1,13 @@
+-- Composite index for keyset pagination of conversation history.
+--
+-- /api/history and fetch_conversation_history page on (session_id, created_at, id):
+--   WHERE session_id = $1 AND created_at <= $2 AND (created_at < $2 OR id < $3)
+--   ORDER BY created_at DESC, id DESC LIMIT $4
+-- A backward scan of this index starts at the cursor, so every page costs the
+-- same no matter how deep it is. The JSONB message column is deliberately not
+-- INCLUDEd: long messages would exceed the btree tuple size limit.
+--
+-- CONCURRENTLY avoids locking writes; run outside a transaction, e.g.
+--   psql "$DATABASE_URL" -f migrations/001_messages_keyset_index.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_session_created_id
+    ON messages (session_id, created_at, id);
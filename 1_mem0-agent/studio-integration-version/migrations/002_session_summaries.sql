@@ -0,0 +1,10 @@
+-- Rolling per-session summaries of turns that fell out of the token-budgeted
+-- history window (see history_window.py). covered_until_id is the id of the
+-- newest messages row folded into the summary.
+CREATE TABLE IF NOT EXISTS session_summaries (
+    session_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    covered_until_id BIGINT NOT NULL DEFAULT 0,
+    token_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
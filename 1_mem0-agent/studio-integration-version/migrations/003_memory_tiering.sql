@@ -0,0 +1,23 @@
+-- Access statistics and cold storage for long-term memories (see memory_tiers.py).
+-- memory_access is upserted in batches from memory searches; memory_archive
+-- holds memories moved out of the hot vector collection, with the vector
+-- stored int8-quantized (dimension bytes plus one scale) instead of float32.
+CREATE TABLE IF NOT EXISTS memory_access (
+    memory_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    last_hit_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS memory_archive (
+    memory_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    vector BYTEA NOT NULL,
+    scale REAL NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    last_touched_at TIMESTAMPTZ NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_memory_archive_user ON memory_archive (user_id);
@@ -0,0 +1,321 @@
+"""Partitioned vector storage: memories are physically split by user.
+
+In the shared Mem0 collection every user's memories live in one table, and
+a per-user search filters the whole table. Here each user is routed to a
+partition, a separate vecs collection (table and index):
+
+- bucket: crc32(user_id) % buckets, e.g. memories_api_new_b017. Search cost
+  scales with the bucket size, i.e. total memories / buckets
+- user:   one collection per user, e.g. memories_api_new_u_alice_1a2b3c4d.
+  Search cost depends only on that user's memories
+
+The store implements the vector store methods Mem0 calls, so it replaces
+memory.vector_store. Lookups by memory id alone (get/update/delete) use an
+id -> partition map filled from inserts and searches, and fan out over the
+partitions on a miss. Searches without a user_id fan out and merge.
+
+Only writes create a partition (table and index build, plus the binary
+index when VECTOR_QUANTIZATION=binary). Reads of a user whose partition
+does not exist yet return nothing and run no DDL.
+
+Usage:
+    python partitioned_store.py migrate --source memories_api_new --mode bucket --buckets 64
+    python partitioned_store.py stats --source memories_api_new --mode user
+"""
+import argparse
+import heapq
+import os
+import re
+import threading
+import uuid
+import zlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from memory_cache import LRUTTLCache
+
+
+def partition_name(base: str, user_id: str, mode: str, buckets: int) -> str:
+    """Name of the collection holding a user's memories."""
+    checksum = zlib.crc32(user_id.encode("utf-8"))
+    if mode == "bucket":
+        return f"{base}_b{checksum % buckets:03d}"
+    if mode == "user":
+        # Sanitized for a Postgres identifier; the checksum keeps distinct ids from colliding.
+        # The slug is cut so "_u_", the slug, "_" and the checksum fit in 63 bytes, so
+        # Postgres never truncates the name into the checksum.
+        slug = re.sub(r"[^a-z0-9_]", "_", user_id.lower())[:max(0, min(32, 63 - len(base) - 12))]
+        return f"{base}_u_{slug}_{checksum:08x}"
+    raise ValueError(f"Unknown partition mode: {mode}")
+
+
+class PartitionedVectorStore:
+    """Mem0 vector store that routes each user's memories to its own vecs collection."""
+
+    def __init__(
+        self,
+        db: Any,
+        base_name: str,
+        dimension: int,
+        mode: str = "bucket",
+        buckets: int = 64,
+        index_settings: Any = None,
+        route_cache_size: int = 100_000,
+    ):
+        if mode not in ("bucket", "user"):
+            raise ValueError(f"Unknown partition mode: {mode}")
+        self.db = db
+        self.base_name = base_name
+        self.dimension = dimension
+        self.mode = mode
+        self.buckets = buckets
+        self.index_settings = index_settings
+        self._collections: Dict[str, Any] = {}
+        # One lock per partition being created, so an index build holds up only that partition
+        self._creating: Dict[str, threading.Lock] = {}
+        self._routes = LRUTTLCache(maxsize=route_cache_size)
+        self._lock = threading.Lock()
+        self.fanouts = 0
+
+    def collection_for(self, user_id: str) -> Optional[Any]:
+        """The collection of the user's partition, or None if it has not been created yet."""
+        return self._collection(partition_name(self.base_name, user_id, self.mode, self.buckets))
+
+    def partitions(self) -> List[str]:
+        """Names of the existing partitions of this store."""
+        prefix = f"{self.base_name}_{'b' if self.mode == 'bucket' else 'u_'}"
+        return sorted(c.name for c in self.db.list_collections() if c.name.startswith(prefix))
+
+    def collections(self) -> List[Any]:
+        """The vecs collections of the existing partitions."""
+        collections = [self._collection(name) for name in self.partitions()]
+        return [collection for collection in collections if collection is not None]
+
+    def insert(self, vectors, payloads=None, ids=None):
+        ids = ids or [str(uuid.uuid4()) for _ in vectors]
+        payloads = payloads or [{} for _ in vectors]
+        grouped: Dict[str, List[Any]] = {}
+        for vector, payload, memory_id in zip(vectors, payloads, ids):
+            name = partition_name(self.base_name, payload.get("user_id", ""), self.mode, self.buckets)
+            grouped.setdefault(name, []).append((memory_id, vector, payload))
+        for name, records in grouped.items():
+            self._collection(name, create=True).upsert(records=records)
+            for memory_id, _, _ in records:
+                self._routes.set(memory_id, name)
+
+    def search(self, query, limit=5, filters=None):
+        filters = filters or {}
+        if "user_id" in filters:
+            names = [partition_name(self.base_name, filters["user_id"], self.mode, self.buckets)]
+        else:
+            self.fanouts += 1
+            names = self.partitions()
+        results = []
+        for name in names:
+            collection = self._collection(name)
+            if collection is None:
+                continue
+            for memory_id, distance, payload in collection.query(
+                data=query,
+                limit=limit,
+                filters=self._filters(filters),
+                include_value=True,
+                include_metadata=True
+            ):
+                self._routes.set(str(memory_id), name)
+                results.append(SimpleNamespace(id=str(memory_id), score=float(distance), payload=payload))
+        return heapq.nsmallest(limit, results, key=lambda result: result.score) if len(names) > 1 else results
+
+    def get(self, vector_id):
+        found = self._locate(vector_id)
+        if found is None:
+            return None
+        _, record = found
+        return SimpleNamespace(id=str(record[0]), score=None, payload=record[2])
+
+    def update(self, vector_id, vector=None, payload=None):
+        found = self._locate(vector_id)
+        if found is None:
+            return
+        name, record = found
+        vector = record[1] if vector is None else vector
+        payload = record[2] if payload is None else payload
+        target = partition_name(self.base_name, payload.get("user_id", ""), self.mode, self.buckets)
+        if target != name:
+            self._collection(name).delete(ids=[vector_id])
+        self._collection(target, create=True).upsert(records=[(vector_id, vector, payload)])
+        self._routes.set(vector_id, target)
+
+    def delete(self, vector_id):
+        found = self._locate(vector_id)
+        if found is not None:
+            self._collection(found[0]).delete(ids=[vector_id])
+            self._routes.discard(vector_id)
+
+    def list(self, filters=None, limit=100):
+        filters = filters or {}
+        names = [partition_name(self.base_name, filters["user_id"], self.mode, self.buckets)] \
+            if "user_id" in filters else self.partitions()
+        results = []
+        for name in names:
+            collection = self._collection(name)
+            if collection is None:
+                continue
+            table = collection.table
+            statement = table.select().limit(limit - len(results))
+            for key, value in filters.items():
+                statement = statement.where(table.c.metadata[key].astext == str(value))
+            with self.db.Session() as session:
+                results.extend(
+                    SimpleNamespace(id=str(row.id), score=None, payload=row.metadata)
+                    for row in session.execute(statement)
+                )
+            if len(results) >= limit:
+                break
+        # Mem0 unpacks the first element of the list result
+        return [results]
+
+    def delete_col(self):
+        for name in self.partitions():
+            self.db.delete_collection(name)
+        self._collections.clear()
+        self._routes.clear()
+
+    def col_info(self):
+        return self.stats()
+
+    def list_cols(self):
+        return self.partitions()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "buckets": self.buckets if self.mode == "bucket" else None,
+            "open_partitions": len(self._collections),
+            "routes_cached": len(self._routes),
+            "fanouts": self.fanouts,
+        }
+
+    def _collection(self, name: str, create: bool = False) -> Optional[Any]:
+        """A partition's collection; None if it does not exist and `create` is False."""
+        from vector_index import apply_query_settings, ensure_index
+
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        if not create:
+            from vecs.exc import CollectionNotFound
+
+            try:
+                collection = self.db.get_collection(name)
+            except CollectionNotFound:
+                return None
+        else:
+            with self._lock:
+                creating = self._creating.setdefault(name, threading.Lock())
+            with creating:
+                collection = self._collections.get(name)
+                if collection is not None:
+                    return collection
+                collection = self.db.get_or_create_collection(name=name, dimension=self.dimension)
+                if self.index_settings is not None:
+                    ensure_index(collection, self.index_settings)
+                if os.getenv("VECTOR_QUANTIZATION", "off") == "binary":
+                    from quantization import create_binary_index
+                    create_binary_index(collection)
+        if self.index_settings is not None:
+            apply_query_settings(collection, self.index_settings)
+        with self._lock:
+            self._creating.pop(name, None)
+            return self._collections.setdefault(name, collection)
+
+    def _locate(self, vector_id: str):
+        """(partition name, record) holding a memory id, or None."""
+        name = self._routes.get(vector_id)
+        names = [name] if name else []
+        if not names:
+            self.fanouts += 1
+            names = self.partitions()
+        for name in names:
+            collection = self._collection(name)
+            records = collection.fetch(ids=[vector_id]) if collection is not None else []
+            if records:
+                self._routes.set(vector_id, name)
+                return name, records[0]
+        return None
+
+    @staticmethod
+    def _filters(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not filters:
+            return None
+        clauses = [{key: {"$eq": value}} for key, value in filters.items()]
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def migrate(db: Any, source: str, store: PartitionedVectorStore, batch_size: int = 1000) -> Dict[str, int]:
+    """Copy every record of an existing vecs collection into its partition.
+
+    The source collection is left untouched, so the endpoint can keep serving
+    from it until the partitioned mode is switched on; re-running is an upsert.
+    """
+    collection = db.get_or_create_collection(name=source, dimension=store.dimension)
+    table = collection.table
+    copied, last_id = 0, None
+    while True:
+        statement = table.select().order_by(table.c.id).limit(batch_size)
+        if last_id is not None:
+            statement = statement.where(table.c.id > last_id)
+        with db.Session() as session:
+            rows = list(session.execute(statement))
+        if not rows:
+            break
+        store.insert(
+            vectors=[list(row.vec) for row in rows],
+            payloads=[row.metadata or {} for row in rows],
+            ids=[str(row.id) for row in rows]
+        )
+        copied += len(rows)
+        last_id = rows[-1].id
+        print(f"Migrated {copied:,} memories")
+    return {"source_records": len(collection), "copied": copied, "partitions": len(store.partitions())}
+
+
+def partitioned_store_from_env(db: Any, base_name: str, dimension: int, index_settings: Any = None) -> Optional[PartitionedVectorStore]:
+    """The partitioned store configured by VECTOR_PARTITION_MODE, or None when it is off."""
+    mode = os.getenv("VECTOR_PARTITION_MODE", "off")
+    if mode == "off":
+        return None
+    return PartitionedVectorStore(
+        db,
+        base_name,
+        dimension,
+        mode=mode,
+        buckets=int(os.getenv("VECTOR_PARTITION_BUCKETS", "64")),
+        index_settings=index_settings
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["migrate", "stats"])
+    parser.add_argument("--source", default="memories_api_new", help="existing shared collection, also the partition name prefix")
+    parser.add_argument("--mode", choices=["bucket", "user"], default=os.getenv("VECTOR_PARTITION_MODE", "bucket"))
+    parser.add_argument("--buckets", type=int, default=int(os.getenv("VECTOR_PARTITION_BUCKETS", "64")))
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    import vecs
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    db = vecs.create_client(os.environ["DATABASE_URL"])
+    store = PartitionedVectorStore(db, args.source, args.dimension, mode=args.mode, buckets=args.buckets)
+    if args.action == "migrate":
+        print(migrate(db, args.source, store, args.batch_size))
+    for name in store.partitions():
+        print(f"{name}: {len(store._collection(name))} memories")
+
+
+if __name__ == "__main__":
+    main()
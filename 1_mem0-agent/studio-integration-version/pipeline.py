@@ -0,0 +1,88 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Optional
+
+from telemetry import Span, tracer
+
+
+class StageTimings:
+    """Per-stage wall-clock timings for one request.
+
+    Each stage is also a span under the request's root span (telemetry.py),
+    so calls made inside a stage are traced as its children.
+    """
+
+    def __init__(self, request_id: Optional[str] = None, name: str = "turn"):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.status = "ok"
+        self.span = tracer.start_trace(name, request_id=request_id)
+
+    def record(self, name: str, started: float, status: str = "ok", span: Optional[Span] = None):
+        self.stages[name] = {
+            "start_ms": round((started - self.started) * 1000, 1),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "status": status,
+        }
+        (span or tracer.start_span(name, parent=self.span, started=started)).end(status)
+
+    @contextmanager
+    def measure(self, name: str):
+        """Time a block; exceptions propagate and mark the stage as failed."""
+        started = time.perf_counter()
+        span = tracer.start_span(name, parent=self.span, started=started)
+        try:
+            with span.activate():
+                yield
+        except BaseException:
+            self.record(name, started, "error", span)
+            raise
+        self.record(name, started, span=span)
+
+    def finish(self):
+        """End the request's root span; set `status` to "error" first if the turn failed."""
+        self.span.end(self.status)
+
+    def total_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def server_timing(self) -> str:
+        """Render the timings as a Server-Timing header value."""
+        metrics = [f'{name};dur={stage["duration_ms"]};desc="{stage["status"]}"' for name, stage in self.stages.items()]
+        metrics.append(f"total;dur={self.total_ms()}")
+        return ", ".join(metrics)
+
+    def summary(self) -> str:
+        parts = [f'{name}={stage["duration_ms"]}ms({stage["status"]})' for name, stage in self.stages.items()]
+        return " ".join(parts) + f" total={self.total_ms()}ms"
+
+
+async def run_stage(
+    name: str,
+    awaitable: Awaitable[Any],
+    timings: StageTimings,
+    timeout: Optional[float] = None,
+    default: Any = None,
+) -> Any:
+    """Await one pipeline stage with a timeout, returning `default` if it is slow or fails.
+
+    Used for stages the request can do without, so one slow dependency degrades
+    the answer instead of failing or stalling the whole request.
+    """
+    started = time.perf_counter()
+    span = tracer.start_span(name, parent=timings.span, started=started)
+    try:
+        # The stage runs as a task that inherits the active span
+        with span.activate():
+            result = await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        timings.record(name, started, "timeout", span)
+        print(f"Stage {name} timed out after {timeout}s, continuing without it")
+        return default
+    except Exception as e:
+        timings.record(name, started, "error", span)
+        print(f"Stage {name} failed: {str(e)}")
+        return default
+    timings.record(name, started, span=span)
+    return result
@@ -0,0 +1,186 @@
+"""Quantized vector search with full-precision re-scoring.
+
+A 1536-dim float32 embedding takes 6KB. The first pass of a search only has
+to find good candidates, so it can run on compact codes:
+
+- int8:   scalar quantization with one scale per vector (D + 4 bytes, 4x smaller)
+- binary: sign bits compared by Hamming distance (D / 8 bytes, 32x smaller)
+
+The best `candidates` rows are then re-scored exactly against the float32
+vectors, which stay off the hot path (on disk, or in the table heap rather
+than the index).
+
+Two implementations:
+- QuantizedMatrix: in-process codes, used by benchmarks/quantized_locomo.py
+- BinaryRescoreStore: Mem0 vector store proxy searching pgvector through an
+  HNSW index on binary_quantize(vec) and re-ranking candidates by exact
+  cosine distance (needs pgvector >= 0.7; create the index with
+  `python quantization.py index --collection memories_api_new`)
+
+pgvector applies a WHERE clause after the HNSW scan, so on a table shared by
+many users a filtered scan finds few or none of the user's rows among its
+candidates. BinaryRescoreStore therefore only takes the binary path inside
+per-user partitions (VECTOR_PARTITION_MODE=user); every other search goes to
+the exact search of the wrapped store.
+"""
+import argparse
+import json
+import os
+from types import SimpleNamespace
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Set bits in each byte value, for Hamming distance over packed sign bits
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def quantize(vector: List[float]) -> Tuple[bytes, float]:
+    """int8 scalar quantization with one scale per vector (4x smaller than float32)."""
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8).tobytes(), scale
+
+
+def dequantize(data: bytes, scale: float) -> np.ndarray:
+    return np.frombuffer(data, dtype=np.int8).astype(np.float32) * scale
+
+
+class QuantizedMatrix:
+    """In-process first-pass scan over int8 or binary codes, re-scored in float32.
+
+    `full_precision(rows)` returns the float32 vectors of the given rows, e.g.
+    from a np.memmap, so only the compact codes need to stay in memory.
+    """
+
+    def __init__(self, vectors: np.ndarray, mode: str, full_precision: Callable[[np.ndarray], np.ndarray]):
+        if mode not in ("int8", "binary"):
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.mode = mode
+        self.full_precision = full_precision
+        if mode == "int8":
+            self.scales = (np.abs(vectors).max(axis=1) / 127).astype(np.float32)
+            self.codes = np.round(vectors / self.scales[:, None]).astype(np.int8)
+        else:
+            self.codes = np.packbits(vectors > 0, axis=1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.mode == "int8" else 0)
+
+    def first_pass(self, query: np.ndarray, rows: Optional[np.ndarray], candidates: int) -> np.ndarray:
+        """Candidate row numbers (restricted to `rows` if given), best first."""
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.mode == "int8":
+            scores = (codes.astype(np.float32) @ query) * (self.scales if rows is None else self.scales[rows])
+        else:
+            scores = -POPCOUNT[np.bitwise_xor(codes, np.packbits(query > 0))].sum(axis=1, dtype=np.int32)
+        count = min(candidates, len(scores))
+        best = np.argpartition(-scores, count - 1)[:count] if count < len(scores) else np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return best if rows is None else rows[best]
+
+    def search(self, query: np.ndarray, limit: int, candidates: int, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the top `limit` rows after exact re-scoring."""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        if rows is not None and len(rows) == 0:
+            return []
+        shortlist = self.first_pass(query, rows, max(candidates, limit))
+        exact = self.full_precision(shortlist) @ query
+        order = np.argsort(-exact)[:limit]
+        return [(int(shortlist[index]), float(exact[index])) for index in order]
+
+
+def vector_literal(vector: List[float]) -> str:
+    return "[" + ",".join(repr(float(value)) for value in vector) + "]"
+
+
+def create_binary_index(collection: Any, m: int = 16, ef_construction: int = 64):
+    """HNSW index over the sign bits of the collection's vectors (bit_hamming_ops)."""
+    from sqlalchemy import text
+
+    with collection.client.engine.begin() as conn:
+        # The pooled connections' statement_timeout would cancel the build
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS "ix_{collection.name}_binary" ON vecs."{collection.name}" '
+            f"USING hnsw ((binary_quantize(vec)::bit({collection.dimension})) bit_hamming_ops) "
+            f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+        ))
+
+
+class BinaryRescoreStore:
+    """Mem0 vector store proxy: binary-quantized first pass in Postgres, exact cosine re-ranking.
+
+    The candidate scan walks the small bit index; only `candidates_factor * limit`
+    full-precision vectors are read from the heap to compute exact distances.
+    Needs a PartitionedVectorStore in user mode: searches without a user_id,
+    or on shared tables, are delegated unchanged.
+    """
+
+    def __init__(self, store: Any, candidates_factor: int = 10):
+        self.store = store
+        self.candidates_factor = candidates_factor
+
+    def search(self, query, limit=5, filters=None, **kwargs):
+        from sqlalchemy import text
+
+        filters = filters or {}
+        if getattr(self.store, "mode", None) != "user" or "user_id" not in filters:
+            # The filter would only apply after a scan over other users' rows
+            return self.store.search(query=query, limit=limit, filters=filters, **kwargs)
+        collection = self.store.collection_for(filters["user_id"])
+        candidates = limit * self.candidates_factor
+        with collection.client.engine.begin() as conn:
+            # The HNSW scan returns at most ef_search rows, so it must cover the candidate count
+            conn.execute(text(f"SET LOCAL hnsw.ef_search = {int(max(candidates, 40))}"))
+            rows = conn.execute(text(f"""
+                SELECT id, metadata, vec <=> CAST(:query AS vector) AS distance FROM (
+                    SELECT id, vec, metadata FROM vecs."{collection.name}"
+                    WHERE metadata @> CAST(:filters AS jsonb)
+                    ORDER BY binary_quantize(vec)::bit({collection.dimension})
+                        <~> binary_quantize(CAST(:query AS vector))
+                    LIMIT :candidates
+                ) candidates
+                ORDER BY distance
+                LIMIT :limit
+            """), {
+                "query": vector_literal(query),
+                "filters": json.dumps(filters),
+                "candidates": candidates,
+                "limit": limit,
+            }).fetchall()
+        return [SimpleNamespace(id=str(row.id), score=float(row.distance), payload=row.metadata) for row in rows]
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.store, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["index"])
+    parser.add_argument("--collection", default="memories_api_new")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    args = parser.parse_args()
+
+    import vecs
+    from dotenv import load_dotenv
+    from partitioned_store import partitioned_store_from_env
+
+    load_dotenv()
+    db = vecs.create_client(os.environ["DATABASE_URL"])
+    store = partitioned_store_from_env(db, args.collection, args.dimension)
+    names = store.partitions() if store is not None else [args.collection]
+    for name in names:
+        collection = db.get_or_create_collection(name=name, dimension=args.dimension)
+        create_binary_index(collection, args.m, args.ef_construction)
+        print(f"Binary HNSW index ready on {collection.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Re-ranking of retrieved memories under a per-request latency budget.
+
+Vector order alone often puts the right memory outside the top slots. The
+reranker fetches `fetch_k` candidates from the stage below it, scores them
+with one or more pluggable scorers, and passes only the best `limit` to the
+agent. The final score of a candidate is
+
+    vector_weight * (1 - rank / n) + sum(weight * min-max normalized scorer score)
+
+Scorers (RERANK_SCORERS, e.g. "lexical:1,recency:0.3"):
+- lexical:       BM25 over the candidate set, so exact names and dates count
+- recency:       time-aware boost; newer memories score higher, and memories
+                 mentioning a date or time score higher for "when" questions
+- cross_encoder: a local sentence-transformers CrossEncoder scoring
+                 (query, memory) pairs (pip install sentence-transformers)
+
+Scoring runs in a small dedicated pool and must finish within the budget,
+counted from the moment the candidates are fetched (embedding and the vector
+query are not part of it); otherwise the candidates are returned in vector
+order. A scorer that overruns is not interrupted, it just no longer holds up
+the turn. stats() reports how often that happens as fallback_rate.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from hybrid_search import BM25Index
+from memory_tiers import parse_time
+
+TEMPORAL_QUERY = re.compile(
+    r"\b(when|what (year|month|day|date|time)|how long|since|ago|before|after|recently|lately|last|first)\b",
+    re.IGNORECASE,
+)
+TIME_EXPRESSION = re.compile(
+    r"\b((19|20)\d{2}|january|february|march|april|may|june|july|august|september|october|november|december|"
+    r"jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec|monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+    r"yesterday|today|tomorrow|tonight|weekend|week|month|year|ago|\d{1,2}:\d{2})\b",
+    re.IGNORECASE,
+)
+
+Scorer = Callable[[str, List[Dict[str, Any]]], List[float]]
+
+
+def lexical_scorer(query: str, entries: List[Dict[str, Any]]) -> List[float]:
+    """BM25 score of each candidate, with document statistics from the candidate set."""
+    index = BM25Index()
+    for position, entry in enumerate(entries):
+        index.add(str(position), entry["memory"])
+    scores = dict(index.search(query, len(entries)))
+    return [scores.get(str(position), 0.0) for position in range(len(entries))]
+
+
+class RecencyScorer:
+    """Newer memories score higher (halving every `half_life_days`).
+
+    For temporal questions ("When did ...?"), memories that mention a date or
+    time get a bonus of 1, since those are the ones that can answer them.
+    """
+
+    def __init__(self, half_life_days: float = 30.0):
+        self.half_life_days = half_life_days
+
+    def __call__(self, query: str, entries: List[Dict[str, Any]]) -> List[float]:
+        now = datetime.now(timezone.utc)
+        temporal = bool(TEMPORAL_QUERY.search(query))
+        scores = []
+        for entry in entries:
+            written = parse_time(entry.get("updated_at") or entry.get("created_at"))
+            score = 0.5 ** (max((now - written).total_seconds(), 0) / 86400 / self.half_life_days) if written else 0.0
+            if temporal and TIME_EXPRESSION.search(entry["memory"]):
+                score += 1.0
+            scores.append(score)
+        return scores
+
+
+class CrossEncoderScorer:
+    """Relevance of (query, memory) pairs from a local cross-encoder model on CPU."""
+
+    def __init__(self, model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise RuntimeError("sentence-transformers is not installed; pip install sentence-transformers to use the cross_encoder scorer")
+        self.model = CrossEncoder(model, device="cpu")
+
+    def __call__(self, query: str, entries: List[Dict[str, Any]]) -> List[float]:
+        return [float(score) for score in self.model.predict([(query, entry["memory"]) for entry in entries])]
+
+
+def normalize(scores: List[float]) -> List[float]:
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [0.0] * len(scores)
+    return [(score - low) / (high - low) for score in scores]
+
+
+class Reranker:
+    """Retrieval stage that re-orders `fetch_k` candidates and returns the best `limit` within a time budget."""
+
+    def __init__(
+        self,
+        search: Callable[..., Dict[str, Any]],
+        scorers: List[Tuple[Scorer, float]],
+        fetch_k: int = 20,
+        budget: float = 0.15,
+        vector_weight: float = 1.0,
+        workers: int = 4,
+    ):
+        self.inner = search
+        self.scorers = scorers
+        self.fetch_k = fetch_k
+        self.budget = budget
+        self.vector_weight = vector_weight
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+        self.reranked = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+    def search(self, query: str, user_id: str, limit: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+        candidates = self.inner(query, user_id, max(self.fetch_k, limit))["results"]
+        if len(candidates) <= limit or not self.scorers:
+            return {"results": candidates[:limit]}
+        try:
+            order = self._executor.submit(self.rank, query, candidates).result(timeout=self.budget)
+        except FutureTimeout:
+            self.fallbacks += 1
+            return {"results": candidates[:limit]}
+        except Exception as e:
+            print(f"Reranking failed, using vector order: {str(e)}")
+            self.errors += 1
+            return {"results": candidates[:limit]}
+        self.reranked += 1
+        return {"results": [candidates[index] for index in order[:limit]]}
+
+    def rank(self, query: str, candidates: List[Dict[str, Any]]) -> List[int]:
+        """Candidate indices, best first."""
+        count = len(candidates)
+        totals = [self.vector_weight * (1 - position / count) for position in range(count)]
+        for scorer, weight in self.scorers:
+            for position, score in enumerate(normalize(scorer(query, candidates))):
+                totals[position] += weight * score
+        # Stable sort, so ties keep vector order
+        return sorted(range(count), key=lambda position: -totals[position])
+
+    def stats(self) -> Dict[str, Any]:
+        attempts = self.reranked + self.fallbacks + self.errors
+        return {
+            "fetch_k": self.fetch_k,
+            "budget_ms": round(self.budget * 1000, 1),
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "errors": self.errors,
+            "fallback_rate": round(self.fallbacks / attempts, 3) if attempts else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scorers_from_spec(spec: str, half_life_days: float = 30.0, cross_encoder_model: Optional[str] = None) -> List[Tuple[Scorer, float]]:
+    """Parse "name:weight,..." (weight defaults to 1) into scorers."""
+    scorers: List[Tuple[Scorer, float]] = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = part.partition(":")
+        if name == "lexical":
+            scorer: Scorer = lexical_scorer
+        elif name == "recency":
+            scorer = RecencyScorer(half_life_days)
+        elif name == "cross_encoder":
+            scorer = CrossEncoderScorer(cross_encoder_model) if cross_encoder_model else CrossEncoderScorer()
+        else:
+            raise ValueError(f"Unknown rerank scorer: {name}")
+        scorers.append((scorer, float(weight) if weight else 1.0))
+    return scorers
@@ -0,0 +1,551 @@
+"""Per-request tracing of the chat path, with in-process latency histograms.
+
+Each turn opens a root span tagged with its request_id, and every stage
+opens a child span under it:
+
+    turn / turn_stream
+      history, summary, store_user_message, memory_search
+        embed, vector_query, memory_llm          (inside Mem0)
+      agent, first_token, store_ai_message
+    memory_add                                   (background queue, same request_id)
+      embed, memory_llm, vector_query, vector_write
+
+Spans are OpenTelemetry SDK spans, created on a TracerProvider of our own.
+They carry counters for the usual causes of a tail-latency outlier,
+exported as `count.*` attributes:
+- db.new_connections:  a Postgres connection was opened (cold pool)
+- net.new_connections: an HTTP connection was opened (OpenAI, Supabase)
+- llm.retries:         the OpenAI client retried a request
+- db.seq_scans:        a slow SELECT's plan (EXPLAIN, no ANALYZE) has a
+                       sequential scan, i.e. the query missed the ANN index
+
+The HTTP counters come from an httpx request hook added to every client,
+which reads OpenAI's retry-count header and subscribes to httpcore's
+connection events for that request.
+
+A span processor records finished spans in an HDR-style histogram per span
+name and status, served in Prometheus text format at /metrics. Spans are
+also sent to the exporter chosen by TRACE_EXPORTER:
+- none (default)
+- jsonl: one JSON line per span in TRACE_FILE (the SDK's span JSON)
+- otlp:  OTLP/HTTP (OTEL_EXPORTER_OTLP_ENDPOINT, e.g. a local Jaeger:
+         docker compose --profile tracing up -d jaeger)
+
+Turns slower than TRACE_SLOW_MS are printed with their slowest spans and
+kept, as full span trees, for /api/traces.
+
+Spans opened in Mem0's own thread pools (embed and vector_query under
+memory_add and memory_search) are only attached to their parent with
+TRACE_THREAD_CONTEXT=true, which makes every ThreadPoolExecutor in the
+process run tasks in the submitter's context.
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99, 0.999]
+
+
+class Histogram:
+    """HDR-style latency histogram with bounded relative error.
+
+    Values are counted in microseconds in log-linear buckets: exact below
+    2**precision_bits, then 2**(precision_bits - 1) buckets per power of two.
+    Any percentile is reported within 1 / 2**(precision_bits - 1) of the true
+    value (1.6% with the default 7 bits), and memory grows with the log of
+    the range rather than with the number of samples.
+    """
+
+    def __init__(self, precision_bits: int = 7):
+        self.precision_bits = precision_bits
+        self._half = 1 << (precision_bits - 1)
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, micros: int) -> int:
+        shift = max(micros.bit_length() - self.precision_bits, 0)
+        return shift * self._half + (micros >> shift)
+
+    def _highest(self, index: int) -> int:
+        """Largest value (microseconds) counted in a bucket."""
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        return ((index - shift * self._half + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        index = self._index(max(int(seconds * 1_000_000), 0))
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def value_at(self, share: float) -> float:
+        """Latency (seconds) that a `share` of the recorded values do not exceed."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = max(1, math.ceil(share * self.count))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    return min(self._highest(index) / 1_000_000, self.max)
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            **{f"p{str(share * 100).rstrip('0').rstrip('.')}": self.value_at(share) for share in QUANTILES},
+            "max": self.max,
+        }
+
+
+# Context key of the Span handle, stored next to the OpenTelemetry span it wraps
+_SPAN_KEY = otel_context.create_key("mem0_span")
+COUNTER_PREFIX = "count."
+
+
+def current_span() -> Optional["Span"]:
+    return otel_context.get_value(_SPAN_KEY)
+
+
+class Span:
+    """One timed stage of a request: an SDK span plus counters, summed per span name in /metrics."""
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"] = None,
+                 request_id: Optional[str] = None, started: Optional[float] = None, **attributes):
+        self.tracer = tracer
+        self.name = name
+        self.request_id = request_id or (parent.request_id if parent else None)
+        self.started = started if started is not None else time.perf_counter()
+        self.counters: Dict[str, float] = {}
+        self.ended = False
+        context = trace.set_span_in_context(parent.otel) if parent is not None else otel_context.Context()
+        start_time = time.time_ns() - int((time.perf_counter() - self.started) * 1e9)
+        self.otel = tracer.otel.start_span(name, context=context, start_time=start_time)
+        if self.request_id:
+            self.otel.set_attribute("request.id", self.request_id)
+        for key, value in attributes.items():
+            self.set(key, value)
+
+    def set(self, key: str, value: Any):
+        self.otel.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+
+    def count(self, key: str, amount: float = 1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def end(self, status: str = "ok"):
+        if self.ended:
+            return
+        self.ended = True
+        for key, amount in self.counters.items():
+            self.otel.set_attribute(COUNTER_PREFIX + key, amount)
+        if status != "ok":
+            self.otel.set_status(Status(StatusCode.ERROR, status))
+        self.otel.end()
+
+    @contextmanager
+    def activate(self) -> Iterator["Span"]:
+        """Make this the parent of spans opened in the current context (and threads started from it)."""
+        context = otel_context.set_value(_SPAN_KEY, self, trace.set_span_in_context(self.otel))
+        token = otel_context.attach(context)
+        try:
+            yield self
+        finally:
+            otel_context.detach(token)
+
+
+def span_status(span: ReadableSpan) -> str:
+    """Our status of a finished span: "ok", or the description it failed with."""
+    if span.status.status_code is StatusCode.ERROR:
+        return span.status.description or "error"
+    return "ok"
+
+
+def span_counters(span: ReadableSpan) -> Dict[str, float]:
+    return {key[len(COUNTER_PREFIX):]: value for key, value in (span.attributes or {}).items()
+            if key.startswith(COUNTER_PREFIX)}
+
+
+def span_duration(span: ReadableSpan) -> float:
+    return (span.end_time - span.start_time) / 1e9
+
+
+def span_tree(root: ReadableSpan, spans: Sequence[ReadableSpan]) -> Dict[str, Any]:
+    """A finished root span and the spans of its trace that ended before it, as nested dicts."""
+    children: Dict[int, List[ReadableSpan]] = {}
+    for span in spans:
+        if span.parent is not None:
+            children.setdefault(span.parent.span_id, []).append(span)
+
+    def to_dict(span: ReadableSpan) -> Dict[str, Any]:
+        attributes = dict(span.attributes or {})
+        return {
+            "name": span.name,
+            "request_id": attributes.get("request.id"),
+            "offset_ms": round((span.start_time - root.start_time) / 1e6, 1),
+            "duration_ms": round(span_duration(span) * 1000, 1),
+            "status": span_status(span),
+            "attributes": {key: value for key, value in attributes.items()
+                           if key != "request.id" and not key.startswith(COUNTER_PREFIX)},
+            "counters": span_counters(span),
+            "children": [to_dict(child) for child in sorted(children.get(span.context.span_id, []),
+                                                            key=lambda child: child.start_time)],
+        }
+
+    return to_dict(root)
+
+
+def describe(root: ReadableSpan, spans: Sequence[ReadableSpan], top: int = 5) -> str:
+    """The slowest spans of a trace, with their counters."""
+    parts = []
+    for span in sorted(spans, key=lambda span: -span_duration(span))[:top]:
+        counters = " ".join(f"{key}={value:g}" for key, value in span_counters(span).items())
+        status = span_status(span)
+        parts.append(f"{span.name}={span_duration(span) * 1000:.1f}ms({status}{', ' + counters if counters else ''})")
+    return " ".join(parts)
+
+
+class SpanRecorder(SpanProcessor):
+    """Feeds finished spans to the tracer's histograms and collects the spans of open traces."""
+
+    def __init__(self, tracer: "Tracer"):
+        self.tracer = tracer
+
+    def on_start(self, span: Any, parent_context: Any = None):
+        if span.parent is None:
+            self.tracer.open_trace(span.context.trace_id)
+
+    def on_end(self, span: ReadableSpan):
+        self.tracer.finish(span)
+
+
+class Tracer:
+    """Creates spans, keeps a histogram per (span name, status) and the slowest recent turns."""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, slow_ms: float = 2000.0, keep_slow: int = 50,
+                 service_name: str = "mem0-agent", max_open_traces: int = 10_000):
+        self.slow_ms = slow_ms
+        self.max_open_traces = max_open_traces
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.events: Dict[Tuple[str, str], float] = {}
+        self.slow: "deque[Dict[str, Any]]" = deque(maxlen=keep_slow)
+        # Spans of each trace whose root is still open, for the span tree of a slow turn
+        self._open: Dict[int, List[ReadableSpan]] = {}
+        self._lock = threading.Lock()
+        self.use_provider(exporter, service_name)
+
+    def use_provider(self, exporter: Optional[SpanExporter] = None, service_name: str = "mem0-agent"):
+        """Create spans on a new provider exporting to `exporter`.
+
+        A provider of our own, so spans do not depend on whatever logfire
+        configured globally.
+        """
+        self.provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        self.provider.add_span_processor(SpanRecorder(self))
+        if exporter is not None:
+            self.provider.add_span_processor(BatchSpanProcessor(exporter))
+        self.otel = self.provider.get_tracer("mem0_agent")
+
+    def start_trace(self, name: str, request_id: Optional[str] = None, **attributes) -> Span:
+        """A root span, not parented to whatever span is current."""
+        return Span(self, name, request_id=request_id, **attributes)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, started: Optional[float] = None, **attributes) -> Span:
+        """A span under `parent`, or under the current span if none is given."""
+        return Span(self, name, parent=parent or current_span(), started=started, **attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes) -> Iterator[Span]:
+        """Time a block as a span; exceptions propagate and mark it as failed."""
+        span = self.start_span(name, parent, **attributes)
+        try:
+            with span.activate():
+                yield span
+        except BaseException:
+            span.end("error")
+            raise
+        span.end()
+
+    def traced(self, target: Any, methods: Dict[str, str]) -> "Traced":
+        return Traced(target, methods, self)
+
+    def open_trace(self, trace_id: int):
+        with self._lock:
+            if len(self._open) >= self.max_open_traces:
+                # Roots that were never ended; drop the oldest
+                self._open.pop(next(iter(self._open)))
+            self._open[trace_id] = []
+
+    def finish(self, span: ReadableSpan):
+        status = span_status(span)
+        duration = span_duration(span)
+        trace_id = span.context.trace_id
+        with self._lock:
+            histogram = self.histograms.get((span.name, status))
+            if histogram is None:
+                histogram = self.histograms[(span.name, status)] = Histogram()
+            for key, amount in span_counters(span).items():
+                self.events[(span.name, key)] = self.events.get((span.name, key), 0) + amount
+            if span.parent is not None:
+                if trace_id in self._open:
+                    self._open[trace_id].append(span)
+                spans = None
+            else:
+                spans = self._open.pop(trace_id, [])
+        histogram.record(duration)
+        if spans is not None and duration * 1000 >= self.slow_ms:
+            self.slow.append(span_tree(span, spans))
+            request_id = (span.attributes or {}).get("request.id")
+            print(f"Slow {span.name} [{request_id}]: {duration * 1000:.1f}ms {describe(span, spans)}")
+
+    def slow_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """The slowest of the recently kept slow turns, slowest first."""
+        return sorted(self.slow, key=lambda trace: -trace["duration_ms"])[:limit]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {f"{name}:{status}": histogram.stats() for (name, status), histogram in sorted(histograms.items())}
+
+    def metrics(self) -> str:
+        """Span durations (HDR quantiles) and span counters in Prometheus text format."""
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            events = sorted(self.events.items())
+        lines = [
+            "# HELP mem0_span_duration_seconds Duration of traced stages (quantiles from an HDR histogram)",
+            "# TYPE mem0_span_duration_seconds summary",
+        ]
+        for (name, status), histogram in histograms:
+            labels = f'span="{name}",status="{status}"'
+            for share in QUANTILES:
+                lines.append(f'mem0_span_duration_seconds{{{labels},quantile="{share}"}} {histogram.value_at(share):.6f}')
+            lines.append(f"mem0_span_duration_seconds_sum{{{labels}}} {histogram.total:.6f}")
+            lines.append(f"mem0_span_duration_seconds_count{{{labels}}} {histogram.count}")
+        lines += [
+            "# HELP mem0_span_duration_max_seconds Slowest recorded duration of traced stages",
+            "# TYPE mem0_span_duration_max_seconds gauge",
+        ]
+        for (name, status), histogram in histograms:
+            lines.append(f'mem0_span_duration_max_seconds{{span="{name}",status="{status}"}} {histogram.max:.6f}')
+        lines += [
+            "# HELP mem0_span_events_total Latency-relevant events seen inside traced stages",
+            "# TYPE mem0_span_events_total counter",
+        ]
+        for (name, event), amount in events:
+            lines.append(f'mem0_span_events_total{{span="{name}",event="{event}"}} {amount:g}')
+        return "\n".join(lines) + "\n"
+
+    def shutdown(self):
+        """Flush the exporter's pending spans."""
+        self.provider.shutdown()
+
+
+class Traced:
+    """Proxy opening a span around the named methods of `target` ({method: span name})."""
+
+    def __init__(self, target: Any, methods: Dict[str, str], tracer: Tracer):
+        self.target = target
+        self.methods = methods
+        self.tracer = tracer
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.target, name)
+        span_name = self.methods.get(name)
+        if span_name is None:
+            return attribute
+
+        def traced(*args, **kwargs):
+            with self.tracer.span(span_name):
+                return attribute(*args, **kwargs)
+
+        return traced
+
+
+def count_request_events(request: Any, asynchronous: bool):
+    """Count an httpx request's retries and new connections on the current span.
+
+    The OpenAI client sends x-stainless-retry-count on every attempt. New
+    connections are httpcore trace events, which httpcore reports to the
+    request's "trace" extension (awaited on async clients).
+    """
+    span = current_span()
+    if span is None:
+        return
+    if request.headers.get("x-stainless-retry-count", "0") != "0":
+        span.count("llm.retries")
+    if "trace" in request.extensions:
+        return
+
+    def on_event(name: str, info: Dict[str, Any]):
+        if name == "connection.connect_tcp.complete":
+            span.count("net.new_connections")
+
+    async def on_event_async(name: str, info: Dict[str, Any]):
+        on_event(name, info)
+
+    request.extensions["trace"] = on_event_async if asynchronous else on_event
+
+
+def _with_request_hook(init: Any, asynchronous: bool) -> Any:
+    if asynchronous:
+        async def hook(request):
+            count_request_events(request, True)
+    else:
+        def hook(request):
+            count_request_events(request, False)
+
+    def init_with_hook(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self.event_hooks = {**self.event_hooks, "request": [*self.event_hooks["request"], hook]}
+
+    init_with_hook.counts_requests = True
+    return init_with_hook
+
+
+def count_http_events():
+    """Add the counting request hook to every httpx client created from now on.
+
+    Mem0, pydantic-ai and supabase build their own clients, so the hook is
+    added in httpx.Client / httpx.AsyncClient themselves.
+    """
+    import httpx
+
+    for client_class, asynchronous in ((httpx.Client, False), (httpx.AsyncClient, True)):
+        if not getattr(client_class.__init__, "counts_requests", False):
+            client_class.__init__ = _with_request_hook(client_class.__init__, asynchronous)
+
+
+def propagate_context_to_threads():
+    """Run everything submitted to a ThreadPoolExecutor in the submitter's context.
+
+    Mem0 fans out to its own thread pools, which would otherwise lose the
+    current span (opentelemetry-instrumentation-threading does the same).
+    This patches ThreadPoolExecutor for the whole process, so it is opt-in
+    (TRACE_THREAD_CONTEXT); run_blocking propagates the context either way.
+    """
+    submit = ThreadPoolExecutor.submit
+    if getattr(submit, "propagates_context", False):
+        return
+
+    def submit_in_context(self, fn, /, *args, **kwargs):
+        return submit(self, contextvars.copy_context().run, fn, *args, **kwargs)
+
+    submit_in_context.propagates_context = True
+    ThreadPoolExecutor.submit = submit_in_context
+
+
+_instrumented_engines: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def explain(dbapi_connection: Any, statement: str, parameters: Any) -> Optional[str]:
+    """The planner's plan for a statement, inside a savepoint so a failure cannot abort the caller's transaction."""
+    try:
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute("SAVEPOINT trace_explain")
+            try:
+                cursor.execute("EXPLAIN " + statement, parameters)
+                return "\n".join(row[0] for row in cursor.fetchall())
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT trace_explain")
+                return None
+            finally:
+                cursor.execute("RELEASE SAVEPOINT trace_explain")
+    except Exception:
+        return None
+
+
+def instrument_engine(engine: Any, explain_slow_ms: float = 500.0):
+    """Count new connections and statements on the current span; EXPLAIN slow SELECTs to spot sequential scans."""
+    from sqlalchemy import event
+
+    if engine in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine)
+
+    def on_connect(dbapi_connection, connection_record):
+        span = current_span()
+        if span is not None:
+            span.count("db.new_connections")
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_statement_started"] = time.perf_counter()
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        span = current_span()
+        started = conn.info.pop("trace_statement_started", None)
+        if span is None or started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        span.count("db.statements")
+        if not explain_slow_ms or elapsed_ms < explain_slow_ms:
+            return
+        span.count("db.slow_statements")
+        if statement.lstrip().upper().startswith("SELECT"):
+            plan = explain(cursor.connection, statement, parameters)
+            if plan and "Seq Scan" in plan:
+                span.count("db.seq_scans")
+                span.set("db.slow_plan", plan[:500])
+
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "before_cursor_execute", before_execute)
+    event.listen(engine, "after_cursor_execute", after_execute)
+
+
+def exporter_from_env() -> Optional[SpanExporter]:
+    kind = os.getenv("TRACE_EXPORTER", "none")
+    if kind == "none":
+        return None
+    if kind == "jsonl":
+        return ConsoleSpanExporter(
+            out=open(os.getenv("TRACE_FILE", "traces.jsonl"), "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n"
+        )
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            raise RuntimeError("opentelemetry-exporter-otlp-proto-http is not installed; pip install opentelemetry-exporter-otlp-proto-http")
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACE_EXPORTER: {kind}")
+
+
+# Shared by the endpoint, the memory stack and the pipeline helpers
+tracer = Tracer()
+
+
+def configure_tracing() -> Tracer:
+    """Set up the shared tracer from the environment, and the hooks that attribute latency to spans."""
+    exporter = None
+    try:
+        exporter = exporter_from_env()
+    except (RuntimeError, ValueError) as e:
+        print(f"Trace export disabled: {str(e)}")
+    tracer.use_provider(exporter, os.getenv("OTEL_SERVICE_NAME", "mem0-agent"))
+    tracer.slow_ms = float(os.getenv("TRACE_SLOW_MS", "2000"))
+    tracer.slow = deque(tracer.slow, maxlen=int(os.getenv("TRACE_KEEP_SLOW", "50")))
+    if os.getenv("TRACE_THREAD_CONTEXT", "false").lower() == "true":
+        propagate_context_to_threads()
+    count_http_events()
+    return tracer
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules live flat next to this directory, as the endpoint imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import numpy as np
+
+from consolidation import duplicate_groups
+
+
+def dense_groups(vectors, threshold):
+    """Reference: connected components of the full similarity matrix."""
+    similar = vectors @ vectors.T >= threshold
+    seen, groups = set(), []
+    for start in range(len(vectors)):
+        if start in seen:
+            continue
+        group, stack = set(), [start]
+        while stack:
+            index = stack.pop()
+            if index not in group:
+                group.add(index)
+                stack.extend(int(other) for other in np.nonzero(similar[index])[0])
+        seen |= group
+        if len(group) > 1:
+            groups.append(sorted(group))
+    return groups
+
+
+def clustered(seed=0, clusters=30, per_cluster=4, noise=0.05, dimension=32):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    vectors = np.repeat(centers, per_cluster, axis=0) + noise * rng.normal(size=(clusters * per_cluster, dimension))
+    vectors = vectors[rng.permutation(len(vectors))]
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_blockwise_groups_match_the_dense_computation():
+    vectors = clustered()
+    expected = sorted(dense_groups(vectors, 0.95))
+    for block in (1, 7, 64, 1000):
+        assert sorted(duplicate_groups(vectors, 0.95, block=block)) == expected
+
+
+def test_groups_are_transitive():
+    vectors = np.array([[1.0, 0.0], [0.96, 0.28], [0.84, 0.54], [0.0, 1.0]], dtype=np.float32)
+    # 0~1 and 1~2 are above the threshold, 0~2 is not; all three still form one group
+    assert duplicate_groups(vectors, 0.95) == [[0, 1, 2]]
+
+
+def test_no_duplicates_and_empty_input():
+    assert duplicate_groups(np.eye(4, dtype=np.float32), 0.9) == []
+    assert duplicate_groups(np.zeros((0, 8), dtype=np.float32), 0.9) == []
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from memory_queue import MemoryWriteQueue
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_writes_for_a_user_are_applied_in_submission_order():
+    applied = []
+
+    async def writer(user_id, messages):
+        # Later writes finish sooner, so only the per-user ordering keeps them in order
+        await asyncio.sleep(0.01 / messages[0]["n"])
+        applied.append((user_id, messages[0]["n"]))
+
+    async def main():
+        queue = MemoryWriteQueue(writer, workers=4)
+        await queue.start()
+        for n in range(1, 11):
+            for user_id in ("alice", "bob", "carol"):
+                assert queue.submit(user_id, [{"n": n}])
+        await queue.drain()
+        return queue
+
+    queue = run(main())
+    for user_id in ("alice", "bob", "carol"):
+        assert [n for user, n in applied if user == user_id] == list(range(1, 11))
+    assert queue.processed == 30
+    assert queue.depth == 0
+
+
+def test_failed_write_is_retried_with_backoff():
+    attempts = []
+
+    async def writer(user_id, messages):
+        attempts.append(user_id)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+
+    async def main():
+        queue = MemoryWriteQueue(writer, workers=1, max_retries=3, retry_backoff=0.001)
+        await queue.start()
+        queue.submit("alice", [])
+        await queue.drain()
+        return queue
+
+    queue = run(main())
+    assert len(attempts) == 3
+    assert (queue.processed, queue.retried, queue.failed) == (1, 2, 0)
+
+
+def test_write_is_dropped_after_max_retries():
+    async def writer(user_id, messages):
+        raise ConnectionError("down")
+
+    async def main():
+        queue = MemoryWriteQueue(writer, workers=1, max_retries=2, retry_backoff=0.001)
+        await queue.start()
+        queue.submit("alice", [])
+        await queue.drain()
+        return queue
+
+    queue = run(main())
+    assert (queue.processed, queue.retried, queue.failed) == (0, 2, 1)
+
+
+def test_submit_drops_when_full_or_stopped():
+    release = None
+
+    async def writer(user_id, messages):
+        await release.wait()
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        queue = MemoryWriteQueue(writer, workers=1, maxsize=2)
+        assert not queue.submit("alice", [])
+        await queue.start()
+        results = [queue.submit("alice", []) for _ in range(3)]
+        # Once the worker has taken a job there is room for one more
+        await asyncio.sleep(0)
+        results.append(queue.submit("alice", []))
+        release.set()
+        await queue.drain()
+        return queue, results
+
+    queue, results = run(main())
+    assert results == [True, True, False, True]
+    assert queue.dropped == 2
+    assert queue.processed == 3
+
+
+def test_run_for_user_keeps_order_with_queued_writes_and_returns_result():
+    applied = []
+
+    async def writer(user_id, messages):
+        await asyncio.sleep(0.01)
+        applied.append("write")
+
+    async def call():
+        applied.append("call")
+        return 42
+
+    async def failing():
+        raise ValueError("bad record")
+
+    async def main():
+        queue = MemoryWriteQueue(writer, workers=2)
+        await queue.start()
+        queue.submit("alice", [])
+        result = await queue.run_for_user("alice", call)
+        with pytest.raises(ValueError):
+            await queue.run_for_user("alice", failing)
+        await queue.drain()
+        with pytest.raises(RuntimeError):
+            await queue.run_for_user("alice", call)
+        return result
+
+    assert run(main()) == 42
+    assert applied == ["write", "call"]
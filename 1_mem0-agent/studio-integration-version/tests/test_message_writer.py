@@ -0,0 +1,109 @@
+import asyncio
+
+from message_writer import MessageWriter
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class FakeTable:
+    """insert_many over an in-memory table with serial ids."""
+
+    def __init__(self, fail_on=None):
+        self.rows = []
+        self.calls = []
+        self.fail_on = fail_on
+
+    async def insert_many(self, rows):
+        self.calls.append(len(rows))
+        await asyncio.sleep(0)
+        if any(row["message"].get("content") == self.fail_on for row in rows):
+            raise ValueError("bad row")
+        stored = []
+        for row in rows:
+            stored.append({"id": len(self.rows) + 1, **row})
+            self.rows.append(stored[-1])
+        # The database does not promise an order for RETURNING
+        return list(reversed(stored))
+
+
+def message(content):
+    return {"type": "human", "content": content}
+
+
+def test_concurrent_writes_are_batched_and_matched_to_their_rows():
+    table = FakeTable()
+
+    async def main():
+        writer = MessageWriter(table.insert_many, max_rows=100, max_delay=0.05)
+        await writer.start()
+        rows = await asyncio.gather(*(writer.write("s1", message(str(n))) for n in range(10)))
+        await writer.drain()
+        return writer, rows
+
+    writer, rows = run(main())
+    assert table.calls == [10]
+    assert [row["message"]["content"] for row in rows] == [str(n) for n in range(10)]
+    assert [row["id"] for row in rows] == list(range(1, 11))
+    assert writer.stats()["batches"] == 1
+
+
+def test_batches_are_capped_at_max_rows():
+    table = FakeTable()
+
+    async def main():
+        writer = MessageWriter(table.insert_many, max_rows=4, max_delay=1.0)
+        await writer.start()
+        await asyncio.gather(*(writer.write("s1", message(str(n))) for n in range(10)))
+        await writer.drain()
+
+    run(main())
+    assert table.calls == [4, 4, 2]
+    assert [row["message"]["content"] for row in table.rows] == [str(n) for n in range(10)]
+
+
+def test_flush_session_waits_for_queued_rows():
+    table = FakeTable()
+
+    async def main():
+        writer = MessageWriter(table.insert_many, max_delay=10.0)
+        await writer.start()
+        pending = asyncio.ensure_future(writer.write("s1", message("hello")))
+        await asyncio.sleep(0)
+        assert not table.rows
+        await asyncio.wait_for(writer.flush_session("s1"), timeout=1.0)
+        assert len(table.rows) == 1
+        # Nothing queued for another session: returns at once
+        await asyncio.wait_for(writer.flush_session("s2"), timeout=0.1)
+        await pending
+        await writer.drain()
+
+    run(main())
+
+
+def test_failed_batch_is_retried_row_by_row():
+    table = FakeTable(fail_on="bad")
+
+    async def main():
+        writer = MessageWriter(table.insert_many, max_delay=0.05)
+        await writer.start()
+        results = await asyncio.gather(
+            *(writer.write("s1", message(content)) for content in ("a", "bad", "c")),
+            return_exceptions=True
+        )
+        await writer.drain()
+        return writer, results
+
+    writer, results = run(main())
+    assert results[0]["message"]["content"] == "a"
+    assert isinstance(results[1], ValueError)
+    assert results[2]["message"]["content"] == "c"
+    assert (writer.failed, writer.retried_batches) == (1, 1)
+
+
+def test_write_before_start_inserts_directly():
+    table = FakeTable()
+    row = run(MessageWriter(table.insert_many).write("s1", message("hi")))
+    assert row["id"] == 1
+    assert table.calls == [1]
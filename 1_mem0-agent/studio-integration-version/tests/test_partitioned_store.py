@@ -0,0 +1,32 @@
+import pytest
+
+from partitioned_store import partition_name
+
+
+def test_user_partitions_fit_a_postgres_identifier():
+    for base in ("memories", "memories_api_new", "m" * 40):
+        for user_id in ("alice", "A" * 200, "user@example.com", ""):
+            assert len(partition_name(base, user_id, "user", 64).encode("utf-8")) <= 63
+
+
+def test_long_user_ids_keep_their_checksum():
+    first = partition_name("memories_api_new", "x" * 100 + "1", "user", 64)
+    second = partition_name("memories_api_new", "x" * 100 + "2", "user", 64)
+    assert first != second
+    assert first.startswith("memories_api_new_u_xxx")
+
+
+def test_names_are_sanitized_and_stable():
+    name = partition_name("memories", "Alice.Smith@Example.com", "user", 64)
+    assert name == partition_name("memories", "Alice.Smith@Example.com", "user", 64)
+    assert name.startswith("memories_u_alice_smith_example_com_")
+
+
+def test_bucket_names():
+    names = {partition_name("memories", f"user-{n}", "bucket", 8) for n in range(200)}
+    assert names == {f"memories_b{bucket:03d}" for bucket in range(8)}
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        partition_name("memories", "alice", "shard", 8)
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from quantization import QuantizedMatrix, dequantize, quantize
+
+
+def test_quantize_round_trips_within_half_a_step():
+    rng = np.random.default_rng(0)
+    vector = rng.normal(size=256).astype(np.float32)
+    data, scale = quantize(vector.tolist())
+    assert len(data) == 256
+    assert scale == pytest.approx(np.abs(vector).max() / 127)
+    assert np.abs(dequantize(data, scale) - vector).max() <= scale / 2 + 1e-6
+
+
+def test_quantize_zero_vector():
+    data, scale = quantize([0.0, 0.0, 0.0])
+    assert scale == 1.0
+    assert dequantize(data, scale).tolist() == [0.0, 0.0, 0.0]
+
+
+def unit_vectors(seed, rows, dimension=256):
+    vectors = np.random.default_rng(seed).normal(size=(rows, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_int8_rescored_search_finds_the_exact_top_results():
+    vectors = unit_vectors(1, 2000)
+    matrix = QuantizedMatrix(vectors, "int8", full_precision=lambda rows: vectors[rows])
+    recall = []
+    for query in unit_vectors(2, 20):
+        exact = set(np.argsort(-(vectors @ query))[:10].tolist())
+        found = {row for row, _ in matrix.search(query, limit=10, candidates=40)}
+        recall.append(len(exact & found) / 10)
+    assert np.mean(recall) >= 0.99
+
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_search_finds_near_copies_with_exact_scores(mode):
+    vectors = unit_vectors(1, 2000)
+    matrix = QuantizedMatrix(vectors, mode, full_precision=lambda rows: vectors[rows])
+    queries = vectors[:50] + 0.05 * unit_vectors(3, 50)
+    for row, query in enumerate(queries):
+        (found, score), = matrix.search(query, limit=1, candidates=20)
+        assert found == row
+        assert score == pytest.approx(float(vectors[row] @ (query / np.linalg.norm(query))), abs=1e-5)
+
+
+def test_search_is_restricted_to_rows():
+    vectors = np.eye(4, dtype=np.float32)
+    matrix = QuantizedMatrix(vectors, "int8", full_precision=lambda rows: vectors[rows])
+    found = matrix.search(vectors[0] + vectors[2] * 0.5, limit=2, candidates=4, rows=np.array([1, 2]))
+    assert [row for row, _ in found] == [2, 1]
+    assert matrix.search(vectors[0], limit=2, candidates=4, rows=np.array([], dtype=np.int64)) == []
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        QuantizedMatrix(np.eye(2, dtype=np.float32), "pq", full_precision=lambda rows: rows)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from diversify import mmr
+from hybrid_search import reciprocal_rank_fusion
+
+
+def unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=-1, keepdims=True)
+
+
+def test_rrf_scores_are_summed_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60))
+    assert fused["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused["a"] == pytest.approx(1 / 61)
+    assert fused["d"] == pytest.approx(1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63)
+
+
+def test_rrf_ranks_ids_found_by_both_retrievers_first():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "e"]])
+    assert {doc_id for doc_id, _ in fused[:2]} == {"b", "c"}
+    assert [score for _, score in fused] == sorted((score for _, score in fused), reverse=True)
+
+
+def test_rrf_of_nothing_is_empty():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_mmr_with_lambda_one_is_plain_relevance_order():
+    rng = np.random.default_rng(0)
+    vectors = unit(rng.normal(size=(20, 8)))
+    query = unit(rng.normal(size=8))
+    assert mmr(query, vectors, 5, lambda_=1.0) == list(np.argsort(-(vectors @ query))[:5])
+
+
+def test_mmr_skips_near_duplicates():
+    query = unit([1.0, 0.0, 0.0])
+    vectors = unit([
+        [1.0, 0.10, 0.0],
+        [1.0, 0.11, 0.0],   # near-duplicate of row 0
+        [0.8, 0.0, 0.6],
+    ])
+    assert mmr(query, vectors, 2, lambda_=0.5) == [0, 2]
+
+
+def test_mmr_returns_each_row_at_most_once():
+    vectors = unit(np.ones((3, 4)))
+    query = unit(np.ones(4))
+    assert sorted(mmr(query, vectors, 10)) == [0, 1, 2]
+    assert mmr(query, vectors[:0], 3) == []
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from telemetry import Histogram, Tracer, current_span
+
+
+def test_histogram_percentiles_are_within_its_relative_error():
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(mean=-4, sigma=1.0, size=20_000)
+    histogram = Histogram(precision_bits=7)
+    for value in samples:
+        histogram.record(float(value))
+    for share in (0.5, 0.9, 0.99, 0.999):
+        exact = float(np.quantile(samples, share, method="inverted_cdf"))
+        assert histogram.value_at(share) == pytest.approx(exact, rel=1 / 64)
+    assert histogram.count == len(samples)
+    assert histogram.max == pytest.approx(samples.max())
+    assert histogram.stats()["mean"] == pytest.approx(samples.mean())
+
+
+def test_histogram_small_values_are_exact_and_empty_is_zero():
+    histogram = Histogram()
+    assert histogram.value_at(0.99) == 0.0
+    for micros in (3, 5, 100):
+        histogram.record(micros / 1_000_000)
+    assert histogram.value_at(0.5) == pytest.approx(5e-6)
+    assert histogram.value_at(1.0) == pytest.approx(100e-6)
+    assert set(histogram.stats()) == {"count", "mean", "p50", "p90", "p95", "p99", "p99.9", "max"}
+
+
+def test_spans_nest_count_and_feed_the_histograms():
+    tracer = Tracer(slow_ms=0)
+    root = tracer.start_trace("turn", request_id="r1")
+    with root.activate():
+        with tracer.span("memory_search") as span:
+            assert current_span() is span
+            span.count("db.new_connections")
+    with pytest.raises(KeyError):
+        with tracer.span("agent", parent=root):
+            raise KeyError("x")
+    root.end()
+    assert current_span() is None
+    stats = tracer.stats()
+    assert {"turn:ok", "memory_search:ok", "agent:error"} <= set(stats)
+    trace = tracer.slow_traces()[0]
+    assert trace["request_id"] == "r1"
+    assert [child["name"] for child in trace["children"]] == ["memory_search", "agent"]
+    assert trace["children"][0]["counters"] == {"db.new_connections": 1}
+    assert 'mem0_span_events_total{span="memory_search",event="db.new_connections"} 1' in tracer.metrics()
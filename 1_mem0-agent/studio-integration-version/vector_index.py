@@ -0,0 +1,336 @@
+"""Vector index management for the Mem0 memories collections.
+
+Two tiers:
+- pgvector indexes on the vecs collection (HNSW or IVFFlat) with tunable build
+  parameters (m, ef_construction / lists) and query parameters (ef_search / probes)
+- an optional in-process HNSW index (hnswlib) per hot user, kept in sync with
+  inserts, updates and deletes made through Mem0's vector store
+
+Usage:
+    python vector_index.py create --collection memories_api_new --method hnsw --m 16 --ef-construction 64
+    python vector_index.py rebuild --collection memories_api_new --method ivfflat --lists 200
+    python vector_index.py describe --collection memories_api_new
+"""
+import argparse
+import functools
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+import numpy as np
+
+from db_pool import ddl_collection
+
+
+@dataclass
+class IndexSettings:
+    """Build and query parameters for a pgvector index."""
+    method: str = "hnsw"
+    m: int = 16
+    ef_construction: int = 64
+    ef_search: int = 40
+    lists: int = 100
+    probes: int = 10
+
+    @classmethod
+    def from_env(cls) -> "IndexSettings":
+        return cls(
+            method=os.getenv("VECTOR_INDEX_METHOD", "hnsw"),
+            m=int(os.getenv("VECTOR_INDEX_M", "16")),
+            ef_construction=int(os.getenv("VECTOR_INDEX_EF_CONSTRUCTION", "64")),
+            ef_search=int(os.getenv("VECTOR_INDEX_EF_SEARCH", "40")),
+            lists=int(os.getenv("VECTOR_INDEX_LISTS", "100")),
+            probes=int(os.getenv("VECTOR_INDEX_PROBES", "10")),
+        )
+
+
+def create_index(collection: Any, settings: IndexSettings, replace: bool = False):
+    """Create (or with replace=True, rebuild) the collection's cosine-distance index, without a statement timeout."""
+    from vecs.collection import IndexArgsHNSW, IndexArgsIVFFlat, IndexMeasure, IndexMethod
+
+    if settings.method == "hnsw":
+        method = IndexMethod.hnsw
+        arguments = IndexArgsHNSW(m=settings.m, ef_construction=settings.ef_construction)
+    elif settings.method == "ivfflat":
+        method = IndexMethod.ivfflat
+        arguments = IndexArgsIVFFlat(n_lists=settings.lists)
+    else:
+        raise ValueError(f"Unknown index method: {settings.method}")
+    ddl_collection(collection).create_index(
+        method=method,
+        measure=IndexMeasure.cosine_distance,
+        index_arguments=arguments,
+        replace=replace
+    )
+
+
+def ensure_index(collection: Any, settings: IndexSettings):
+    """Create the index if the collection has none; an existing index is left alone."""
+    if collection.index is None:
+        print(f"Creating {settings.method} index on {collection.name}")
+        create_index(collection, settings)
+
+
+def user_collection(store: Any, user_id: str) -> Any:
+    """The vecs collection holding a user's memories behind a Mem0 vector store (partitioned or not), or None.
+
+    None also means a partitioned store has no partition for the user yet.
+    """
+    if hasattr(store, "collection_for"):
+        return store.collection_for(user_id)
+    return getattr(store, "collection", None)
+
+
+def fetch_user_records(collection: Any, user_id: str, with_vectors: bool = False,
+                       limit: Optional[int] = None) -> List[SimpleNamespace]:
+    """All of a user's records (id, payload and optionally vector), read straight from the collection's table.
+
+    Mem0's list() goes through vecs Collection.query, a zero-vector ANN scan
+    capped by ef_search (and rejected by vecs above 1000 rows) that is
+    filtered afterwards, so it silently returns only part of a user's memories.
+    """
+    from sqlalchemy import select
+
+    table = collection.table
+    columns = [table.c.id, table.c.metadata] + ([table.c.vec] if with_vectors else [])
+    statement = select(*columns).where(table.c.metadata["user_id"].astext == user_id).order_by(table.c.id)
+    if limit:
+        statement = statement.limit(limit)
+    with collection.client.Session() as session:
+        return [
+            SimpleNamespace(id=str(row.id), payload=row.metadata, vector=row.vec if with_vectors else None)
+            for row in session.execute(statement)
+        ]
+
+
+def stored_user_ids(store: Any) -> List[str]:
+    """Every user id with memories behind a Mem0 vector store, read from its vecs table(s)."""
+    from sqlalchemy import select
+
+    collections = store.collections() if hasattr(store, "collections") else [store.collection]
+    user_ids = set()
+    for collection in collections:
+        column = collection.table.c.metadata["user_id"].astext
+        with collection.client.Session() as session:
+            user_ids.update(row[0] for row in session.execute(select(column).distinct()) if row[0])
+    return sorted(user_ids)
+
+
+def apply_query_settings(collection: Any, settings: IndexSettings):
+    """Make every query on the collection use the configured ef_search and probes.
+
+    Mem0's Supabase store calls collection.query without these arguments, so
+    the defaults are bound onto the collection instance.
+    """
+    query = getattr(collection.query, "func", collection.query)
+    collection.query = functools.partial(query, ef_search=settings.ef_search, probes=settings.probes)
+
+
+class LocalHNSWTier:
+    """In-process HNSW indexes for the most frequently searched users.
+
+    A user is promoted after `promote_after` searches, at which point all of
+    their vectors are loaded from the collection. At most `max_users` users are
+    kept, evicting the least recently searched. `collection_for` maps a user to
+    the collection holding their memories when storage is partitioned (None
+    while the user has no partition).
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        max_users: int = 100,
+        promote_after: int = 3,
+        ef_search: int = 50,
+        collection_for: Optional[Callable[[str], Any]] = None,
+    ):
+        if hnswlib is None:
+            raise RuntimeError("hnswlib is not installed; pip install hnswlib to enable the local HNSW tier")
+        self.collection = collection
+        self.dimension = collection.dimension
+        self.collection_for = collection_for or (lambda user_id: collection)
+        self.max_users = max_users
+        self.promote_after = promote_after
+        self.ef_search = ef_search
+        self._users: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._searches: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, user_id: str, vector: List[float], limit: int) -> Optional[List[Any]]:
+        """Search a hot user's local index; returns None if the user is not hot yet."""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                self._searches[user_id] = self._searches.get(user_id, 0) + 1
+                if self._searches[user_id] < self.promote_after:
+                    self.misses += 1
+                    return None
+                user = self._load(user_id)
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            count = user["index"].get_current_count() - len(user["deleted"])
+            if count <= 0:
+                return []
+            labels, distances = user["index"].knn_query(np.asarray([vector], dtype=np.float32), k=min(limit, count))
+            return [
+                SimpleNamespace(id=user["ids"][label], score=float(distance), payload=user["payloads"][label])
+                for label, distance in zip(labels[0], distances[0])
+            ]
+
+    def upsert(self, user_id: str, memory_id: str, vector: List[float], payload: Dict[str, Any]):
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._add(user, memory_id, vector, payload)
+
+    def delete(self, memory_id: str):
+        with self._lock:
+            for user in self._users.values():
+                label = user["labels"].pop(memory_id, None)
+                if label is not None:
+                    user["index"].mark_deleted(label)
+                    user["deleted"].add(label)
+                    return
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop a user's index (everyone's with None); the user is reloaded once hot again."""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hot_users": len(self._users),
+            "max_users": self.max_users,
+            "vectors": sum(len(user["labels"]) for user in self._users.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _load(self, user_id: str) -> Dict[str, Any]:
+        rows = self._fetch_user(user_id)
+        user = {"index": None, "ids": {}, "labels": {}, "payloads": {}, "deleted": set()}
+        for memory_id, vector, payload in rows:
+            self._add(user, memory_id, vector, payload)
+        if user["index"] is None:
+            user["index"] = self._new_index(self.dimension, 16)
+        self._users[user_id] = user
+        self._searches.pop(user_id, None)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return user
+
+    def _fetch_user(self, user_id: str):
+        collection = self.collection_for(user_id)
+        if collection is None:
+            return []
+        records = fetch_user_records(collection, user_id, with_vectors=True)
+        return [(record.id, record.vector, record.payload) for record in records]
+
+    def _new_index(self, dimension: int, capacity: int):
+        index = hnswlib.Index(space="cosine", dim=dimension)
+        index.init_index(max_elements=capacity, ef_construction=200, M=16)
+        index.set_ef(self.ef_search)
+        return index
+
+    def _add(self, user: Dict[str, Any], memory_id: str, vector: List[float], payload: Dict[str, Any]):
+        vector = np.asarray(vector, dtype=np.float32)
+        if user["index"] is None:
+            user["index"] = self._new_index(len(vector), 16)
+        index = user["index"]
+        # An existing label is updated in place; deleted labels are never reused
+        label = user["labels"].get(memory_id)
+        if label is None:
+            label = index.get_current_count()
+            if label >= index.get_max_elements():
+                index.resize_index(index.get_max_elements() * 2)
+        index.add_items(vector[None, :], [label])
+        user["labels"][memory_id] = label
+        user["ids"][label] = memory_id
+        user["payloads"][label] = payload
+
+
+class LocalTierVectorStore:
+    """Mem0 vector store proxy that serves hot users from the local HNSW tier.
+
+    Writes go to the wrapped store and are mirrored into the tier; per-user
+    searches are answered locally once the user is hot.
+    """
+
+    def __init__(self, store: Any, tier: LocalHNSWTier):
+        self.store = store
+        self.tier = tier
+
+    def search(self, query, limit=5, filters=None, **kwargs):
+        user_id = (filters or {}).get("user_id")
+        if user_id is not None and set(filters) == {"user_id"}:
+            results = self.tier.search(user_id, query, limit)
+            if results is not None:
+                return results
+        return self.store.search(query=query, limit=limit, filters=filters, **kwargs)
+
+    def insert(self, vectors, payloads=None, ids=None, **kwargs):
+        result = self.store.insert(vectors=vectors, payloads=payloads, ids=ids, **kwargs)
+        for vector, payload, memory_id in zip(vectors, payloads or [{}] * len(vectors), ids or []):
+            if payload.get("user_id"):
+                self.tier.upsert(payload["user_id"], memory_id, vector, payload)
+        return result
+
+    def update(self, vector_id, vector=None, payload=None, **kwargs):
+        result = self.store.update(vector_id=vector_id, vector=vector, payload=payload, **kwargs)
+        if vector is not None and payload and payload.get("user_id"):
+            self.tier.upsert(payload["user_id"], vector_id, vector, payload)
+        elif vector is not None or payload is not None:
+            # A partial update cannot be mirrored; drop the local copy so it is not served stale
+            self.tier.delete(vector_id)
+        return result
+
+    def delete(self, vector_id, **kwargs):
+        result = self.store.delete(vector_id=vector_id, **kwargs)
+        self.tier.delete(vector_id)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.store, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["create", "rebuild", "describe"])
+    parser.add_argument("--collection", default="memories_api_new")
+    parser.add_argument("--dimension", type=int, default=1536)
+    defaults = IndexSettings.from_env()
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default=defaults.method)
+    parser.add_argument("--m", type=int, default=defaults.m)
+    parser.add_argument("--ef-construction", type=int, default=defaults.ef_construction)
+    parser.add_argument("--lists", type=int, default=defaults.lists)
+    args = parser.parse_args()
+
+    import vecs
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    db = vecs.create_client(os.environ["DATABASE_URL"])
+    collection = db.get_or_create_collection(name=args.collection, dimension=args.dimension)
+    settings = IndexSettings(method=args.method, m=args.m, ef_construction=args.ef_construction, lists=args.lists)
+    if args.action == "create":
+        ensure_index(collection, settings)
+    elif args.action == "rebuild":
+        create_index(collection, settings, replace=True)
+    print(f"{collection.name}: {len(collection)} vectors, index={collection.index}")
+
+
+if __name__ == "__main__":
+    main()